@@ -1,17 +1,24 @@
 
 import sys, os
 __all__ = [
-  "SQLDatabase", "SQLField", "SQLTable",
+  "SQLDatabase", "SQLField", "SQLTable", "SQLIndex",
   "SQLite3Connector", "SQLite3Operator",
+  "SQLite3ConnectionPool", "AsyncSQLite3Operator", "SQLiteDatabaseSet",
+  "PRAGMA_PROFILES", "SQLCondition", "SQLQuery",
   "ClassToSQLiteFieldDefinition",
   "ClassAndPrimaryKeyToTableInitiateDict",
 ]
 
 sys.path.append(os.path.dirname(__file__))
 
-from .sqlite_structure import SQLDatabase, SQLField, SQLTable
+from .sqlite_structure import SQLDatabase, SQLField, SQLTable, SQLIndex
 from .sqlite_connector import SQLite3Connector
+from .sqlite_pragma import PRAGMA_PROFILES
+from .sqlite_condition import SQLCondition, SQLQuery
 from .sqlite_operator import SQLite3Operator
+from .sqlite_connection_pool import SQLite3ConnectionPool
+from .sqlite_async_operator import AsyncSQLite3Operator
+from .sqlite_database_set import SQLiteDatabaseSet
 from .sqlite_func_tools import *
 
 sys.path.pop()
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+AsyncSQLite3Operator
+
+asyncio front-end of SQLite3Operator
+
+every call is shipped to one dedicated executor thread owning the
+connection, the event loop never blocks on sqlite. the methods enqueue
+their work as soon as they are called and return an awaitable, so calls
+issued back to back are pipelined in call order:
+
+  f1 = aop.InsertDictToTable(...)
+  f2 = aop.Commit()
+  await asyncio.gather(f1, f2)
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+from sqlite_operator import SQLite3Operator
+
+class AsyncSQLite3Operator:
+  def __init__(self, operator: SQLite3Operator) -> None:
+    self.operator = operator
+    self.executor = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix="AsyncSQLite3Operator")
+
+  def __repr__(self) -> str:
+    return "<AsyncSQLite3Operator: '{}' at {:016X}>".format(self.operator.connector.path, id(self))
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    await self.Close(commit=exc_type is None)
+
+  def _Submit(self, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+  def Run(self, func, *args, **kwargs):
+    """ runs any callable touching the connection on the executor thread,
+        e.g. aop.Run(connector.TableValidation) """
+    return self._Submit(func, *args, **kwargs)
+
+  # ================ connection ================
+  def Connect(self, do_check=False):
+    """ opens the connection on the executor thread, so the default
+        check_same_thread=True of sqlite3 holds """
+    return self._Submit(self.operator.connector.Connect, do_check=do_check)
+
+  async def Close(self, commit=True):
+    try:
+      await self._Submit(self.operator.connector.Close, commit)
+    finally:
+      self.executor.shutdown(wait=False)
+
+  # ================ basic op fields ================
+  def Commit(self):
+    return self._Submit(self.operator.Commit)
+
+  def InsertDictToTable(self, d, table_name, or_condition=""):
+    return self._Submit(self.operator.InsertDictToTable, d, table_name, or_condition)
+
+  def InsertDictsToTable(self, rows, table_name, or_condition="", chunk_size=None):
+    return self._Submit(self.operator.InsertDictsToTable, rows, table_name, or_condition, chunk_size)
+
+  def InsertObjects(self, objs, table_name, fields=None, or_condition="", chunk_size=None):
+    return self._Submit(self.operator.InsertObjects, objs, table_name, fields, or_condition, chunk_size)
+
+  def UpsertDictsToTable(self, rows, table_name, update_fields=None, key_fields=None, chunk_size=None):
+    return self._Submit(self.operator.UpsertDictsToTable, rows, table_name, update_fields, key_fields, chunk_size)
+
+  def InsertTuplesToTable(self, rows, table_name, fields=None, or_condition="", chunk_size=None):
+    return self._Submit(self.operator.InsertTuplesToTable, rows, table_name, fields, or_condition, chunk_size)
+
+  def DeleteFromTableByCondition(self, table_name, condition):
+    return self._Submit(self.operator.DeleteFromTableByCondition, table_name, condition)
+
+  def UpdateFieldFromTable(self, field_dict, table_name, condition):
+    return self._Submit(self.operator.UpdateFieldFromTable, field_dict, table_name, condition)
+
+  def UpdateManyByPrimaryKey(self, rows, table_name, key_fields=None, chunk_size=None):
+    return self._Submit(self.operator.UpdateManyByPrimaryKey, rows, table_name, key_fields, chunk_size)
+
+  def DeleteByPrimaryKeys(self, keys, table_name, key_fields=None, chunk_size=None):
+    return self._Submit(self.operator.DeleteByPrimaryKeys, keys, table_name, key_fields, chunk_size)
+
+  def SelectFieldFromTable(self, fields, table_name, condition=None, row_type=None):
+    return self._Submit(self.operator.SelectFieldFromTable, fields, table_name, condition, row_type)
+
+  def SelectFieldFromTableAdvanced(self, fields, table_name, sub_condition=None, row_type=None):
+    return self._Submit(self.operator.SelectFieldFromTableAdvanced, fields, table_name, sub_condition, row_type)
+
+  def SelectObjects(self, class_type, table_name, condition=None, fields=None):
+    return self._Submit(self.operator.SelectObjects, class_type, table_name, condition, fields)
+
+  def RawSelectFieldFromTable(self, fields, table_name, condition=None):
+    return self._Submit(self.operator.RawSelectFieldFromTable, fields, table_name, condition)
+
+  def GetLastInsertRowID(self):
+    return self._Submit(self.operator.GetLastInsertRowID)
+
+  def Execute(self, sql_str):
+    return self._Submit(self.operator.Execute, sql_str)
+
+  # ================ streaming select ================
+  async def IterSelectFieldFromTable(self, fields, table_name, condition=None,
+                                     batch_size=None, yield_batches=False, row_type=None):
+    """ async for row in aop.IterSelectFieldFromTable(...), one executor
+        round trip per batch """
+    generator = await self._Submit(self.operator.IterSelectFieldFromTable, fields, table_name, condition,
+                                   batch_size=batch_size, yield_batches=True, row_type=row_type)
+    async for batch in self._IterBatches(generator, yield_batches):
+      yield batch
+
+  async def IterSelectFieldFromTableAdvanced(self, fields, table_name, sub_condition=None,
+                                             batch_size=None, yield_batches=False, row_type=None):
+    generator = await self._Submit(self.operator.IterSelectFieldFromTableAdvanced, fields, table_name, sub_condition,
+                                   batch_size=batch_size, yield_batches=True, row_type=row_type)
+    async for batch in self._IterBatches(generator, yield_batches):
+      yield batch
+
+  async def Paginate(self, table_name, fields, page_size=None, condition=None, order_by=None, cursor=None,
+                     row_type=None, descending=False):
+    """ async for rows, cursor_token in aop.Paginate(...) """
+    generator = await self._Submit(self.operator.Paginate, table_name, fields, page_size, condition, order_by,
+                                   cursor, row_type, descending)
+    async for page in self._IterBatches(generator, True):
+      yield page
+
+  async def _IterBatches(self, generator, yield_batches):
+    try:
+      while True:
+        batch = await self._Submit(next, generator, None)
+        if batch is None:
+          break
+        if yield_batches:
+          yield batch
+        else:
+          for row in batch:
+            yield row
+    finally:
+      # the cursor belongs to the executor thread, close it there
+      await self._Submit(generator.close)
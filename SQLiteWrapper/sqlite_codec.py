@@ -0,0 +1,176 @@
+"""
+SQLCodec
+
+transparent compression of BLOB / TEXT columns, declared after the type
+in the field definition
+
+  "payload": "BLOB COMPRESS zlib"
+  "payload": "BLOB COMPRESS lzma LEVEL 9 THRESHOLD 256"
+  "note": "TEXT COMPRESS zlib DICT"
+
+stored format
+- BLOB: one tag byte then the payload, TAG_RAW keeps values below the
+  threshold (or that do not shrink) uncompressed
+- TEXT: short values stay plain text so they remain comparable, longer
+  ones are stored as the same tagged BLOB holding utf-8 bytes
+- DICT (zlib only): small similar payloads compress against a trained
+  dictionary, the 4 byte dictionary id follows the tag. dictionaries are
+  registered process wide by id, the operator persists them in the
+  database (see SQLite3Operator.TrainCompressionDictionary)
+
+compressed columns can not be searched or compared in sql
+"""
+
+import collections
+import lzma
+import re
+import struct
+import threading
+import zlib
+
+TAG_RAW = 0
+TAG_ZLIB = 1
+TAG_LZMA = 2
+TAG_ZLIB_DICT = 3
+
+CODEC_NAMES = ("zlib", "lzma")
+
+DEFAULT_THRESHOLD = 64
+
+_SPEC_PATTERN = re.compile(r"\bCOMPRESS\s+(\w+)((?:\s+(?:LEVEL|THRESHOLD)\s+\d+|\s+DICT\b)*)", re.IGNORECASE)
+_OPTION_PATTERN = re.compile(r"(LEVEL|THRESHOLD)\s+(\d+)|(DICT)", re.IGNORECASE)
+
+# dictionary id -> zdict bytes, shared by every codec of the process
+_dictionaries = {}
+_dictionary_lock = threading.Lock()
+
+class SQLCodec:
+  def __init__(self, name: str, level: int=None, threshold: int=DEFAULT_THRESHOLD, use_dict: bool=False) -> None:
+    name = name.lower()
+    if name not in CODEC_NAMES:
+      raise ValueError("not supported codec: {}, choose from {}".format(name, CODEC_NAMES))
+    if use_dict and name != "zlib":
+      raise ValueError("dictionary compression is only supported by zlib")
+    if level is not None and not 0 <= level <= 9:
+      raise ValueError("compression level should be in 0..9, got: {}".format(level))
+    self.name = name
+    self.level = level
+    self.threshold = threshold
+    self.use_dict = use_dict
+
+  def __repr__(self) -> str:
+    return "<SQLCodec: '{}' at {:016X}>".format(self.GetSpec(), id(self))
+
+  def GetSpec(self) -> str:
+    """ the COMPRESS clause of the field definition """
+    spec = "COMPRESS " + self.name
+    if self.level is not None:
+      spec += " LEVEL {}".format(self.level)
+    if self.threshold != DEFAULT_THRESHOLD:
+      spec += " THRESHOLD {}".format(self.threshold)
+    if self.use_dict:
+      spec += " DICT"
+    return spec
+
+  def Compress(self, data: bytes, dictionary_id: int=None) -> bytes:
+    """ tagged payload, compressed only when that makes it smaller """
+    if len(data) >= self.threshold:
+      if self.name == "lzma":
+        payload = bytes([TAG_LZMA]) + lzma.compress(data, lzma.FORMAT_RAW, filters=self._GetLzmaFilters())
+      elif dictionary_id is not None:
+        zdict = GetDictionary(dictionary_id)
+        compressor = zlib.compressobj(self._GetZlibLevel(), zlib.DEFLATED, -15, zdict=zdict)
+        payload = bytes([TAG_ZLIB_DICT]) + struct.pack(">I", dictionary_id) + compressor.compress(data) + compressor.flush()
+      else:
+        compressor = zlib.compressobj(self._GetZlibLevel(), zlib.DEFLATED, -15)
+        payload = bytes([TAG_ZLIB]) + compressor.compress(data) + compressor.flush()
+      if len(payload) < len(data) + 1:
+        return payload
+    return bytes([TAG_RAW]) + data
+
+  def Decompress(self, payload: bytes) -> bytes:
+    tag = payload[0]
+    if tag == TAG_RAW:
+      return payload[1:]
+    elif tag == TAG_ZLIB:
+      decompressor = zlib.decompressobj(-15)
+      return decompressor.decompress(payload[1:]) + decompressor.flush()
+    elif tag == TAG_LZMA:
+      return lzma.decompress(payload[1:], lzma.FORMAT_RAW, filters=self._GetLzmaFilters())
+    elif tag == TAG_ZLIB_DICT:
+      dictionary_id = struct.unpack(">I", payload[1:5])[0]
+      decompressor = zlib.decompressobj(-15, zdict=GetDictionary(dictionary_id))
+      return decompressor.decompress(payload[5:]) + decompressor.flush()
+    raise ValueError("unknown compression tag: {}".format(tag))
+
+  def _GetZlibLevel(self):
+    return zlib.Z_DEFAULT_COMPRESSION if self.level is None else self.level
+
+  def _GetLzmaFilters(self):
+    # raw lzma2 avoids the xz container header on every value, the preset
+    # only matters for compression so decoding works whatever level was used
+    return [{"id": lzma.FILTER_LZMA2, "preset": 6 if self.level is None else self.level}]
+
+  @staticmethod
+  def ExtractFromDefinition(definition: str):
+    """ returns (definition without the COMPRESS clause, SQLCodec or None) """
+    match = _SPEC_PATTERN.search(definition)
+    if match is None:
+      return definition, None
+    options = {"level": None, "threshold": DEFAULT_THRESHOLD, "use_dict": False}
+    for key, value, dict_flag in _OPTION_PATTERN.findall(match.group(2)):
+      if dict_flag:
+        options["use_dict"] = True
+      else:
+        options[key.lower()] = int(value)
+    codec = SQLCodec(match.group(1), **options)
+    return definition[:match.start()] + definition[match.end():], codec
+
+# ================ dictionaries ================
+def RegisterDictionary(data: bytes) -> int:
+  """ makes data available to Compress / Decompress, returns its id """
+  dictionary_id = zlib.crc32(data)
+  with _dictionary_lock:
+    _dictionaries[dictionary_id] = data
+  return dictionary_id
+
+def HasDictionary(dictionary_id: int) -> bool:
+  return dictionary_id in _dictionaries
+
+def GetDictionary(dictionary_id: int) -> bytes:
+  data = _dictionaries.get(dictionary_id, None)
+  if data is None:
+    raise KeyError("compression dictionary {:08X} is not registered".format(dictionary_id))
+  return data
+
+def TrainDictionary(samples, size: int=16384, segment_length: int=8) -> bytes:
+  """ builds a zlib preset dictionary from sample payloads
+
+  segments found in the most samples are kept, overlapping segments are
+  chained back into the runs they came from, and the most frequent runs
+  go last since deflate reaches the end of the dictionary with the
+  shortest distances
+  """
+  counts = collections.Counter()
+  for sample in samples:
+    if isinstance(sample, str):
+      sample = sample.encode("utf-8")
+    # each segment counts once per sample, in position order so equally
+    # frequent neighbours stay adjacent
+    counts.update(dict.fromkeys((sample[i:i + segment_length] for i in range(len(sample) - segment_length + 1)), 1))
+  runs = []
+  covered = set()
+  total = 0
+  for segment, count in counts.most_common():
+    if count < 2 or total >= size:
+      break
+    if segment in covered:
+      continue
+    if len(runs) > 0 and runs[-1][-(segment_length - 1):] == segment[:-1]:
+      runs[-1] += segment[-1:]
+      total += 1
+    else:
+      runs.append(bytearray(segment))
+      total += len(segment)
+    covered.add(bytes(runs[-1][-segment_length:]))
+  return b"".join(bytes(run) for run in reversed(runs))[-size:]
@@ -0,0 +1,91 @@
+"""
+SQLColumnBuffer
+
+typed column buffers filled straight from cursor chunks, used by
+SQLite3Operator.SelectColumns
+
+- INT / INTEGER / REAL / BOOLEAN fields go into array.array
+- TEXT / BLOB and expressions go into plain lists (object columns)
+- NULL in a typed column is stored as 0 and flagged in a mask, the mask is
+  an array.array("B") with 1 marking NULL
+- when numpy is installed the buffers are handed over as numpy arrays,
+  typed columns holding NULL become numpy.ma.MaskedArray
+"""
+
+import array
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+_TYPECODES = {int: "q", float: "d", bool: "b"}
+
+class SQLColumnBuffer:
+  def __init__(self, name: str, data_class=None) -> None:
+    self.name = name
+    self.typecode = _TYPECODES.get(data_class, None)
+    self.values = array.array(self.typecode) if self.typecode is not None else []
+    self.mask = array.array("B")
+    self.has_null = False
+    self._use_numpy = False
+
+  def __repr__(self) -> str:
+    return "<SQLColumnBuffer: '{}' ({}) at {:016X}>".format(self.name, self.typecode or "object", id(self))
+
+  def __len__(self) -> int:
+    return len(self.values)
+
+  def Extend(self, values) -> None:
+    """ values is one column of a fetched chunk """
+    raw_values = values
+    if None in values:
+      self.has_null = True
+      self.mask.extend([value is None for value in values])
+      if self.typecode is not None:
+        values = [0 if value is None else value for value in values]
+    else:
+      self.mask.frombytes(bytes(len(values)))
+    if self.typecode is None:
+      self.values.extend(values)
+      return
+    try:
+      # converted as a whole first, a failing extend would keep the
+      # values appended before the bad one
+      self.values.extend(array.array(self.typecode, values))
+    except (TypeError, OverflowError):
+      # sqlite typing is per value, a column declared INT may hold text or
+      # floats, degrade to an object column instead of failing
+      previous = self.values.tolist()
+      if self.has_null:
+        previous = [None if is_null else value for value, is_null in zip(previous, self.mask)]
+      self.values = previous
+      self.typecode = None
+      self.values.extend(raw_values)
+
+  def GetMask(self):
+    if numpy is not None and self._use_numpy:
+      return numpy.frombuffer(self.mask, dtype=numpy.uint8).astype(bool)
+    return self.mask
+
+  def Finish(self, use_numpy: bool):
+    self._use_numpy = use_numpy
+    if not use_numpy:
+      return self.values
+    if self.typecode is None:
+      column = numpy.empty(len(self.values), dtype=object)
+      column[:] = self.values
+      return column
+    column = numpy.frombuffer(self.values, dtype=self.typecode)
+    if self.typecode == "b":
+      column = column.astype(bool)
+    if self.has_null:
+      column = numpy.ma.MaskedArray(column, mask=self.GetMask())
+    return column
+
+def ResolveUseNumpy(use_numpy) -> bool:
+  if use_numpy is None:
+    return numpy is not None
+  if use_numpy and numpy is None:
+    raise ImportError("numpy is not installed, use_numpy=True can not be honored")
+  return bool(use_numpy)
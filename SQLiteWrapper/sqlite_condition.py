@@ -0,0 +1,217 @@
+"""
+SQLCondition / SQLQuery
+
+structured where clauses compiled to placeholder sql plus bound
+parameters, queries differing only in their values share one statement
+text and therefore one prepared statement in sqlite3's statement cache
+
+  C = SQLCondition
+  cond = C.Eq("code", "sh.600004") & C.Range("date", "2020-01-01", "2021-01-01")
+  op.SelectFieldFromTable("*", "CompanyDailyDetail", cond)
+  op.SelectFieldFromTable("*", "CompanyDailyDetail", SQLQuery(cond, order_by="-date", limit=10))
+"""
+
+import re
+
+_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+def _CheckField(field):
+  if not isinstance(field, str) or not _FIELD_PATTERN.match(field):
+    raise ValueError("invalid field name in condition: {!r}".format(field))
+  return field
+
+class SQLCondition:
+  """ base of every condition, Compile() returns (sql, params) """
+  def Compile(self):
+    raise NotImplementedError()
+
+  def CompileClause(self):
+    sql, params = self.Compile()
+    return " WHERE " + sql, params
+
+  def __and__(self, other):
+    return SQLCondition.And(self, other)
+
+  def __or__(self, other):
+    return SQLCondition.Or(self, other)
+
+  def __invert__(self):
+    return SQLCondition.Not(self)
+
+  def __repr__(self) -> str:
+    sql, params = self.Compile()
+    return "<SQLCondition: '{}' {}>".format(sql, params)
+
+  # ================ constructors ================
+  @staticmethod
+  def Eq(field, value):
+    if value is None:
+      return SQLCondition.IsNull(field)
+    return _Compare(field, "=", value)
+
+  @staticmethod
+  def Ne(field, value):
+    if value is None:
+      return SQLCondition.NotNull(field)
+    return _Compare(field, "!=", value)
+
+  @staticmethod
+  def Lt(field, value):
+    return _Compare(field, "<", value)
+
+  @staticmethod
+  def Le(field, value):
+    return _Compare(field, "<=", value)
+
+  @staticmethod
+  def Gt(field, value):
+    return _Compare(field, ">", value)
+
+  @staticmethod
+  def Ge(field, value):
+    return _Compare(field, ">=", value)
+
+  @staticmethod
+  def Like(field, pattern):
+    return _Compare(field, "LIKE", pattern)
+
+  @staticmethod
+  def In(field, values):
+    return _In(field, values)
+
+  @staticmethod
+  def Range(field, low=None, high=None, include_low=True, include_high=False):
+    """ low <= field < high by default, a None bound is left open """
+    conditions = []
+    if low is not None:
+      conditions.append(_Compare(field, ">=" if include_low else ">", low))
+    if high is not None:
+      conditions.append(_Compare(field, "<=" if include_high else "<", high))
+    if len(conditions) == 0:
+      raise ValueError("Range on {} needs at least one bound".format(field))
+    return conditions[0] if len(conditions) == 1 else _Junction("AND", conditions)
+
+  @staticmethod
+  def IsNull(field):
+    return _Raw("{} IS NULL".format(_CheckField(field)), ())
+
+  @staticmethod
+  def NotNull(field):
+    return _Raw("{} IS NOT NULL".format(_CheckField(field)), ())
+
+  @staticmethod
+  def And(*conditions):
+    return _Junction("AND", conditions)
+
+  @staticmethod
+  def Or(*conditions):
+    return _Junction("OR", conditions)
+
+  @staticmethod
+  def Not(condition):
+    return _Not(condition)
+
+  @staticmethod
+  def Raw(sql, params=()):
+    """ escape hatch for anything not covered, params still bound with ? """
+    return _Raw(sql, tuple(params))
+
+class _Compare(SQLCondition):
+  __slots__ = ("field", "op", "value")
+
+  def __init__(self, field, op, value) -> None:
+    self.field = _CheckField(field)
+    self.op = op
+    self.value = value
+
+  def Compile(self):
+    return "{} {} ?".format(self.field, self.op), (self.value,)
+
+class _In(SQLCondition):
+  __slots__ = ("field", "values")
+
+  def __init__(self, field, values) -> None:
+    self.field = _CheckField(field)
+    self.values = tuple(values)
+
+  def Compile(self):
+    if len(self.values) == 0:
+      return "0", ()
+    return "{} IN ({})".format(self.field, ",".join("?" * len(self.values))), self.values
+
+class _Junction(SQLCondition):
+  __slots__ = ("joiner", "conditions")
+
+  def __init__(self, joiner, conditions) -> None:
+    if len(conditions) == 0:
+      raise ValueError("{} needs at least one condition".format(joiner))
+    self.joiner = joiner
+    self.conditions = tuple(conditions)
+
+  def Compile(self):
+    sqls = []
+    params = []
+    for condition in self.conditions:
+      sql, sub_params = condition.Compile()
+      sqls.append("(" + sql + ")")
+      params.extend(sub_params)
+    return " {} ".format(self.joiner).join(sqls), tuple(params)
+
+class _Not(SQLCondition):
+  __slots__ = ("condition",)
+
+  def __init__(self, condition) -> None:
+    self.condition = condition
+
+  def Compile(self):
+    sql, params = self.condition.Compile()
+    return "NOT (" + sql + ")", params
+
+class _Raw(SQLCondition):
+  __slots__ = ("sql", "params")
+
+  def __init__(self, sql, params) -> None:
+    self.sql = sql
+    self.params = params
+
+  def Compile(self):
+    return self.sql, self.params
+
+class SQLQuery:
+  """ where + order by + limit / offset, the limit and offset are bound
+      parameters as well. order_by takes "field", "-field" (descending)
+      or a list of them """
+  def __init__(self, where: SQLCondition=None, order_by=None, limit: int=None, offset: int=None) -> None:
+    self.where = where
+    if isinstance(order_by, str):
+      order_by = [order_by]
+    self.order_by = list(order_by) if order_by is not None else []
+    for field in self.order_by:
+      _CheckField(field[1:] if field.startswith("-") else field)
+    self.limit = limit
+    self.offset = offset
+
+  def __repr__(self) -> str:
+    sql, params = self.CompileClause()
+    return "<SQLQuery: '{}' {}>".format(sql.strip(), params)
+
+  def HasOrderOrLimit(self) -> bool:
+    return len(self.order_by) > 0 or self.limit is not None or self.offset is not None
+
+  def CompileClause(self):
+    sql = ""
+    params = []
+    if self.where is not None:
+      where_sql, where_params = self.where.CompileClause()
+      sql += where_sql
+      params.extend(where_params)
+    if len(self.order_by) > 0:
+      sql += " ORDER BY " + ",".join(field[1:] + " DESC" if field.startswith("-") else field
+                                     for field in self.order_by)
+    if self.limit is not None or self.offset is not None:
+      sql += " LIMIT ?"
+      params.append(-1 if self.limit is None else self.limit)
+      if self.offset is not None:
+        sql += " OFFSET ?"
+        params.append(self.offset)
+    return sql, tuple(params)
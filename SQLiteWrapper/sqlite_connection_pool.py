@@ -0,0 +1,224 @@
+"""
+SQLite3ConnectionPool
+
+one writer, many readers on top of a SQLite3Connector
+
+- the connector's own connection becomes the single writer, every write
+  is serialized through Writer()
+- readers are extra WAL-mode connections to the same file, either one per
+  thread or a bounded pool shared by all threads
+- Reader() / Writer() hand out SQLite3Operator instances bound to the
+  checked out connection, so the operator api is unchanged
+"""
+
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from sqlite_connector import SQLite3Connector
+from sqlite_operator import SQLite3Operator
+
+class SQLite3ConnectionPool:
+  def __init__(self, connector: SQLite3Connector, max_readers: int=4, per_thread: bool=False,
+               timeout: float=None) -> None:
+    if connector.path == ":memory:":
+      raise ValueError("connection pool needs a database file, :memory: is private to one connection")
+    if connector.in_memory:
+      raise ValueError("connection pool can not share the in memory working copy of {}".format(connector.path))
+    self.connector = connector
+    self.max_readers = max_readers
+    self.per_thread = per_thread
+    self.timeout = timeout
+    self.logger = logging.getLogger("SQLite3ConnectionPool")
+
+    self._cond = threading.Condition()
+    self._writer_lock = threading.Lock()
+    self._idle_readers = []
+    self._all_readers = []
+    self._local = threading.local()
+    self._operators = {}    # id(conn) -> SQLite3Operator bound to that connection
+    self._reader_acquire_times = {}   # id(conn) -> perf_counter at checkout
+    self._closed = False
+
+    # stats
+    self._created_time = time.perf_counter()
+    self._reader_in_use = 0
+    self._reader_acquire_count = 0
+    self._reader_wait_time = 0.0
+    self._reader_max_wait_time = 0.0
+    self._reader_busy_time = 0.0
+    self._writer_acquire_count = 0
+    self._writer_wait_time = 0.0
+    self._writer_max_wait_time = 0.0
+    self._writer_busy_time = 0.0
+
+  def __repr__(self) -> str:
+    return "<SQLite3ConnectionPool: '{}' at {:016X}>".format(self.connector.path, id(self))
+
+  def Open(self) -> None:
+    """ connects the writer (the connector itself) and switches the file to
+        WAL, a connection bound to its thread is reopened for the pool """
+    if self.connector.conn is not None and self.connector.check_same_thread:
+      if self.connector.conn.in_transaction:
+        raise RuntimeError("commit the pending work of {} before opening the pool".format(self.connector.path))
+      self.connector.Close(commit=False)
+    if self.connector.conn is None:
+      self.connector.Connect(do_check=False, check_same_thread=False)
+    journal_mode = self.connector.conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if journal_mode.lower() != "wal":
+      self.logger.warning("{} could not switch to WAL, journal_mode is {}".format(self.connector.path, journal_mode))
+
+  def Close(self) -> None:
+    with self._cond:
+      self._closed = True
+      readers = self._all_readers
+      self._all_readers = []
+      self._idle_readers = []
+      self._operators.clear()
+      self._cond.notify_all()
+    for conn in readers:
+      conn.close()
+
+  # ================ reader ================
+  def AcquireReader(self, timeout=None):
+    if timeout is None:
+      timeout = self.timeout
+    start_time = time.perf_counter()
+    if self.per_thread:
+      conn = getattr(self._local, "reader", None)
+      if conn is None:
+        conn = self._OpenReader()
+        self._local.reader = conn
+    else:
+      conn = self._TakeIdleReader(start_time, timeout)
+    wait_time = time.perf_counter() - start_time
+    with self._cond:
+      self._reader_in_use += 1
+      self._reader_acquire_count += 1
+      self._reader_wait_time += wait_time
+      self._reader_max_wait_time = max(self._reader_max_wait_time, wait_time)
+    self._reader_acquire_times[id(conn)] = time.perf_counter()
+    return conn
+
+  def ReleaseReader(self, conn) -> None:
+    if conn.in_transaction:
+      conn.rollback()
+    busy_time = time.perf_counter() - self._reader_acquire_times.pop(id(conn), time.perf_counter())
+    with self._cond:
+      self._reader_in_use -= 1
+      self._reader_busy_time += busy_time
+      if not self.per_thread and not self._closed:
+        self._idle_readers.append(conn)
+        self._cond.notify()
+
+  @contextlib.contextmanager
+  def Reader(self, timeout=None):
+    """ with pool.Reader() as op: op.SelectFieldFromTable(...) """
+    conn = self.AcquireReader(timeout)
+    try:
+      yield self._GetOperator(conn)
+    finally:
+      self.ReleaseReader(conn)
+
+  def _TakeIdleReader(self, start_time, timeout):
+    with self._cond:
+      while True:
+        if self._closed:
+          raise RuntimeError("connection pool of {} is closed".format(self.connector.path))
+        if len(self._idle_readers) > 0:
+          return self._idle_readers.pop()
+        if len(self._all_readers) < self.max_readers:
+          # reserve the slot, the connection itself is opened outside the lock
+          self._all_readers.append(None)
+          break
+        remaining = None if timeout is None else timeout - (time.perf_counter() - start_time)
+        if remaining is not None and remaining <= 0:
+          raise TimeoutError("no reader connection available for {} after {}s".format(self.connector.path, timeout))
+        self._cond.wait(remaining)
+    try:
+      return self._OpenReader()
+    finally:
+      with self._cond:
+        self._all_readers.remove(None)
+
+  def _OpenReader(self):
+    conn = sqlite3.connect(self.connector.path, check_same_thread=False)
+    conn.execute("PRAGMA query_only=1")
+    with self._cond:
+      self._all_readers.append(conn)
+    return conn
+
+  # ================ writer ================
+  def AcquireWriter(self, timeout=None):
+    if timeout is None:
+      timeout = self.timeout
+    start_time = time.perf_counter()
+    if not self._writer_lock.acquire(timeout=-1 if timeout is None else timeout):
+      raise TimeoutError("writer connection of {} busy for {}s".format(self.connector.path, timeout))
+    wait_time = time.perf_counter() - start_time
+    self._writer_acquire_count += 1
+    self._writer_wait_time += wait_time
+    self._writer_max_wait_time = max(self._writer_max_wait_time, wait_time)
+    self._writer_acquire_time = time.perf_counter()
+    return self.connector.conn
+
+  def ReleaseWriter(self, commit=True) -> None:
+    try:
+      if commit:
+        self.connector.conn.commit()
+      elif self.connector.conn.in_transaction:
+        self.connector.conn.rollback()
+    finally:
+      self._writer_busy_time += time.perf_counter() - self._writer_acquire_time
+      self._writer_lock.release()
+
+  @contextlib.contextmanager
+  def Writer(self, timeout=None):
+    """ with pool.Writer() as op: op.InsertDictToTable(...)
+        commits on success, rolls back on exception """
+    conn = self.AcquireWriter(timeout)
+    commit = False
+    try:
+      yield self._GetOperator(conn)
+      commit = True
+    finally:
+      self.ReleaseWriter(commit)
+
+  # ================ operator ================
+  def _GetOperator(self, conn):
+    op = self._operators.get(id(conn))
+    if op is None:
+      if conn is self.connector.conn:
+        op = SQLite3Operator(self.connector)
+      else:
+        view = SQLite3Connector(self.connector.path, None, commit_when_leave=False)
+        view.conn = conn
+        op = SQLite3Operator(view)
+      self._operators[id(conn)] = op
+    if op.connector is not self.connector:
+      # follow schema changes made through the writer connector
+      op.connector.structure = self.connector.structure
+      op.connector.schema_generation = self.connector.schema_generation
+    return op
+
+  # ================ stats ================
+  def GetStats(self) -> dict:
+    with self._cond:
+      elapsed = time.perf_counter() - self._created_time
+      reader_capacity = len(self._all_readers) if self.per_thread else self.max_readers
+      return {
+        "reader_count": len(self._all_readers),
+        "reader_idle": len(self._idle_readers),
+        "reader_in_use": self._reader_in_use,
+        "reader_acquire_count": self._reader_acquire_count,
+        "reader_wait_time": self._reader_wait_time,
+        "reader_max_wait_time": self._reader_max_wait_time,
+        "reader_avg_wait_time": self._reader_wait_time / self._reader_acquire_count if self._reader_acquire_count else 0.0,
+        "reader_utilization": self._reader_busy_time / (elapsed * reader_capacity) if reader_capacity and elapsed > 0 else 0.0,
+        "writer_acquire_count": self._writer_acquire_count,
+        "writer_wait_time": self._writer_wait_time,
+        "writer_max_wait_time": self._writer_max_wait_time,
+        "writer_avg_wait_time": self._writer_wait_time / self._writer_acquire_count if self._writer_acquire_count else 0.0,
+        "writer_utilization": self._writer_busy_time / elapsed if elapsed > 0 else 0.0,
+      }
@@ -1,33 +1,105 @@
 
-from sqlite_structure import SQLDatabase, SQLTable, SQLField
+from sqlite_structure import SQLDatabase, SQLTable, SQLField, SQLIndex
+from sqlite_pragma import ResolvePragmaProfile, ApplyPragmas, ReadPragma, BULK_LOAD_PRAGMAS
 import sqlite3
 import os
 import copy
+import hashlib
+import contextlib
+import json
 import logging
+import threading
+import time
+
+# process wide schema cache shared by every connector
+# (realpath, schema_version, schema digest) -> SQLDatabase loaded from that file
+_loaded_structure_cache = {}
+# (realpath, schema_version, schema digest, structure fingerprint) already validated
+_validated_structure_cache = set()
+_schema_cache_lock = threading.Lock()
+
+class _FlushAborted(Exception):
+  pass
 
 class SQLite3Connector:
-  def __init__(self, path: str, structure: SQLDatabase, commit_when_leave: bool=True, verbose_level=10) -> None:
-    self.structure = copy.deepcopy(structure)
+  SCHEMA_SIDECAR_SUFFIX = ".schema.json"
+
+  def __init__(self, path: str, structure: SQLDatabase, commit_when_leave: bool=True, verbose_level=10,
+               pragma_profile=None, use_schema_cache: bool=True, schema_sidecar: bool=False,
+               in_memory: bool=False, flush_interval: float=None, flush_pages: int=256,
+               flush_sleep: float=0.0, flush_on_commit: bool=True) -> None:
+    # structures are read only once loaded, so they are shared between
+    # connectors and copied only before this connector changes its own
+    self.structure = structure
+    self._owns_structure = False
     self.path = path
     self.conn = None
+    # whether self.conn may only be used by the thread that opened it
+    self.check_same_thread = True
     self.commit_when_leave = commit_when_leave
     self.logger = logging.getLogger("SQLConnector")
     self.verbose_level = verbose_level
+    # name of a PRAGMA_PROFILES entry or a custom {pragma: value} dict
+    self.pragma_profile = pragma_profile
+    ResolvePragmaProfile(pragma_profile)
+    self.applied_pragmas = {}
+    # bumped whenever the structure may have changed, operators compare it
+    # against their own copy to drop compiled statements
+    self.schema_generation = 0
+    # skip LoadStructureFromDatabase / TableValidation introspection when
+    # PRAGMA schema_version and the digest of the schema sql match a cached
+    # result, the sidecar file keeps
+    # that result next to the database across processes
+    self.use_schema_cache = use_schema_cache
+    self.schema_sidecar = schema_sidecar
+    # working copy: the file is loaded into a :memory: connection on
+    # Connect and written back with the backup api, every flush_interval
+    # seconds in a background thread and / or on Commit and Close
+    self.in_memory = in_memory and path != ":memory:"
+    self.flush_interval = flush_interval
+    self.flush_pages = flush_pages
+    self.flush_sleep = flush_sleep
+    self.flush_on_commit = flush_on_commit
+    self.flush_count = 0
+    self.last_flush_time = None
+    self._disk_conn = None
+    self._flush_lock = threading.Lock()
+    self._flush_stop = None
+    self._flush_thread = None
 
   def __getstate__(self):
     return {
       "structure": self.structure,
       "path": self.path,
-      "commit_when_leave": self.commit_when_leave
+      "commit_when_leave": self.commit_when_leave,
+      "verbose_level": self.verbose_level,
+      "pragma_profile": self.pragma_profile,
+      "use_schema_cache": self.use_schema_cache,
+      "schema_sidecar": self.schema_sidecar
     }
 
   def __setstate__(self, state):
     self.structure = state["structure"]
     self.path = state["path"]
     self.commit_when_leave = state["commit_when_leave"]
+    self.verbose_level = state.get("verbose_level", 10)
+    self.pragma_profile = state.get("pragma_profile", None)
+    self.use_schema_cache = state.get("use_schema_cache", True)
+    self.schema_sidecar = state.get("schema_sidecar", False)
+    # a working copy is private to its process, a copy reads the file
+    self.in_memory = False
+    self.flush_interval = None
+    self.flush_on_commit = False
+    self._disk_conn = None
+    self._flush_stop = None
+    self._flush_thread = None
+    self._owns_structure = False
+    self.applied_pragmas = {}
+    self.schema_generation = 0
     self.logger = logging.getLogger("SQLConnector")
+    self.check_same_thread = True
     self.conn = sqlite3.connect(self.path)
-    pass
+    self.ApplyPragmaProfile(self.pragma_profile)
 
   def Connect(self, do_check=True, check_same_thread=True) -> None:
     if self.path != ":memory:" and not os.path.exists(self.path):
@@ -35,18 +107,193 @@ class SQLite3Connector:
         if SQLite3Connector._ui_interactive_check(
             "No SQL file at database_path: {}, Do you want to create one?".format(self.path),
             "creating: " + self.path):
-          self.conn = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+          self._OpenConnection(check_same_thread)
       else:
         if self.verbose_level >= 10:
           print("creating new sqlite file at path: {}".format(self.path))
-        self.conn = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+        self._OpenConnection(check_same_thread)
     else:
+      self._OpenConnection(check_same_thread)
+    if self.conn != None and self.pragma_profile is not None:
+      self.ApplyPragmaProfile(self.pragma_profile)
+
+  def _OpenConnection(self, check_same_thread) -> None:
+    # the flush thread shares both connections, sqlite serializes the calls
+    if self.in_memory and self.flush_interval is not None:
+      check_same_thread = False
+    self.check_same_thread = check_same_thread
+    if not self.in_memory:
       self.conn = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+      return
+    self._disk_conn = sqlite3.connect(self.path, check_same_thread=False)
+    if self.pragma_profile is not None:
+      ApplyPragmas(self._disk_conn, ResolvePragmaProfile(self.pragma_profile))
+    self.conn = sqlite3.connect(":memory:", check_same_thread=check_same_thread)
+    self._disk_conn.backup(self.conn)
+    if self.verbose_level >= 10:
+      print("loaded {} into memory".format(self.path))
+    if self.flush_interval is not None:
+      self._flush_stop = threading.Event()
+      self._flush_thread = threading.Thread(target=self._FlushLoop, name="SQLite3ConnectorFlush", daemon=True)
+      self._flush_thread.start()
+
+  # ================ working copy ================
+  def IsWorkingCopy(self) -> bool:
+    return self.in_memory and self._disk_conn is not None
+
+  def FlushToDisk(self, pages: int=None) -> bool:
+    """ copies the in memory database back to the file
+
+    the copy goes pages at a time, writers on the memory connection can
+    run between the steps and a step that sees their change restarts the
+    copy. the file is replaced as a whole, so it always holds a committed
+    state. needs the memory connection outside of a transaction
+    """
+    if not self.IsWorkingCopy():
+      return False
+    if self.conn.in_transaction:
+      raise RuntimeError("FlushToDisk needs the pending transaction of {} committed".format(self.path))
+    return self._Flush(pages)
+
+  def _Flush(self, pages: int=None, progress=None) -> bool:
+    with self._flush_lock:
+      start_time = time.perf_counter()
+      # an unfinished backup leaves the file as it was
+      self.conn.backup(self._disk_conn, pages=self.flush_pages if pages is None else pages,
+                       progress=progress, sleep=self.flush_sleep)
+      self.flush_count += 1
+      self.last_flush_time = time.time()
+    if self.verbose_level >= 20:
+      self.logger.info("{} flushed in {:.3f}s".format(self.path, time.perf_counter() - start_time))
+    return True
+
+  def _FlushLoop(self) -> None:
+    stop = self._flush_stop
+    while not stop.wait(self.flush_interval):
+      conn = self.conn
+      # an open transaction would stall the backup until it ends, wait
+      # for the next round instead
+      if conn is None or conn.in_transaction:
+        continue
+      try:
+        self._Flush(progress=self._CheckPeriodicFlush)
+      except _FlushAborted:
+        self.logger.debug("{} periodic flush interrupted, retry next round".format(self.path))
+      except sqlite3.Error as e:
+        self.logger.warning("{} periodic flush failed: {}".format(self.path, e))
+
+  def _CheckPeriodicFlush(self, status, remaining, total) -> None:
+    # a write that lands during the copy keeps the source locked until its
+    # transaction ends, give up instead of spinning and let Close proceed
+    if self._flush_stop.is_set() or self.conn.in_transaction or \
+        status in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+      raise _FlushAborted()
+
+  def _StopFlushThread(self) -> None:
+    if self._flush_thread is not None:
+      self._flush_stop.set()
+      self._flush_thread.join()
+      self._flush_thread = None
+
+  def Commit(self) -> None:
+    if self.conn == None:
+      return
+    self.conn.commit()
+    self.OnCommitted()
+
+  def OnCommitted(self) -> None:
+    """ called after a commit on self.conn, writes a working copy through """
+    if self.flush_on_commit and self.IsWorkingCopy():
+      self.FlushToDisk()
+
+  def Close(self, commit: bool=None) -> None:
+    """ commits (default: commit_when_leave), flushes a working copy and
+        closes the connections """
+    if self._flush_stop is not None:
+      self._flush_stop.set()
+    if self.conn == None:
+      self._StopFlushThread()
+      return
+    if commit is None:
+      commit = self.commit_when_leave
+    # end the transaction before joining, a running flush may wait on it
+    if commit:
+      self.conn.commit()
+    elif self.conn.in_transaction:
+      self.conn.rollback()
+    self._StopFlushThread()
+    if self.IsWorkingCopy():
+      self.FlushToDisk()
+      self._disk_conn.close()
+      self._disk_conn = None
+    self.conn.close()
+    self.conn = None
+    if self.verbose_level >= 1:
+      self.logger.info("{} closed".format(self.path))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Close(commit=self.commit_when_leave and exc_type is None)
+
+  def ApplyPragmaProfile(self, profile) -> dict:
+    """ applies a named or custom pragma profile and returns the values
+        read back from the database """
+    if self.conn == None or profile is None:
+      return {}
+    self.applied_pragmas.update(ApplyPragmas(self.conn, ResolvePragmaProfile(profile), self._IsMemory()))
+    return self.applied_pragmas
+
+  @contextlib.contextmanager
+  def BulkLoadMode(self):
+    """ with connector.BulkLoadMode(): ... relaxes durability for an import
+
+    synchronous goes OFF, the page cache grows and temp tables stay in
+    memory, a rollback journal is also moved to memory. every value is
+    restored on exit, work left pending by the block is committed first,
+    or rolled back when the block raised. entered with a transaction
+    already open, synchronous and the journal are left alone (sqlite
+    does not change them inside a transaction) and the transaction is
+    left to the caller
+    """
+    if self.conn == None:
+      raise RuntimeError("BulkLoadMode needs a connected database")
+    own_transaction = not self.conn.in_transaction
+    pragmas = dict(BULK_LOAD_PRAGMAS)
+    if not own_transaction:
+      del pragmas["synchronous"]
+    saved = {name: ReadPragma(self.conn, name) for name in pragmas}
+    journal_mode = ReadPragma(self.conn, "journal_mode")
+    switch_journal = own_transaction and journal_mode.lower() not in ("wal", "memory", "off")
+    ApplyPragmas(self.conn, pragmas, self._IsMemory())
+    if switch_journal:
+      ApplyPragmas(self.conn, {"journal_mode": "MEMORY"})
+    try:
+      yield self
+    except BaseException:
+      if own_transaction and self.conn.in_transaction:
+        self.conn.rollback()
+      raise
+    finally:
+      if own_transaction and self.conn.in_transaction:
+        self.conn.commit()
+      if switch_journal:
+        ApplyPragmas(self.conn, {"journal_mode": journal_mode})
+      ApplyPragmas(self.conn, saved, self._IsMemory())
 
   def LoadStructureFromDatabase(self) -> None:
     if self.conn == None:
       self.logger.warning("[LoadStructureFromDatabase] self.conn is None")
       return
+    cache_key = self._GetSchemaCacheKey()
+    if cache_key is not None:
+      cached = self._GetCachedStructure(cache_key)
+      if cached is not None:
+        self.structure = cached
+        self._owns_structure = False
+        self.schema_generation += 1
+        return
     # get all current table's name
     cursor = self.conn.cursor()
     cursor.execute("select name from sqlite_master where type='table' order by name")
@@ -54,6 +301,8 @@ class SQLite3Connector:
     current_table_names = [k for i in names for k in i]
 
     self.structure = SQLDatabase()
+    self._owns_structure = True
+    self.schema_generation += 1
     for table_name in current_table_names:
       if table_name == "sqlite_sequence":
         continue
@@ -61,24 +310,39 @@ class SQLite3Connector:
       table = SQLTable(table_name)
       table.fields = list(field_name_dict.values())
       table.field_name_dict = field_name_dict
+      table.primary_keys = self._GetPrimaryKeysForTable(table_name)
+      for index in self._GetIndexesForTable(table_name):
+        table.AddIndex(index)
       self.structure.tables.append(table)
       self.structure.table_name_dict[table.name] = table
+    if cache_key is not None:
+      self._PutCachedStructure(cache_key, self.structure)
+      # published, other connectors may hold it from now on
+      self._owns_structure = False
 
   def TableValidation(self) -> None:
     if self.conn == None:
       self.logger.warning("[TableValidation] self.conn is None")
       return
+    cache_key = self._GetSchemaCacheKey()
+    if cache_key is not None and self._IsValidatedStructure(cache_key, self.structure):
+      return
     # get all current table's name
     cursor = self.conn.cursor()
     cursor.execute("select name from sqlite_master where type='table' order by name")
     names = cursor.fetchall()
     current_table_names = [k for i in names for k in i]
+    self.schema_generation += 1
     # loop required table_names
     for table_name in self.structure.table_name_dict.keys():
       if table_name in current_table_names:
         self._CheckAndAddTableFields(table_name)
+        self._CheckAndAddTableIndexes(table_name)
       else:
         self._CreateTable(table_name)
+    if cache_key is not None:
+      # the validation itself may have changed the schema
+      self._PutValidatedStructure(self._GetSchemaCacheKey(), self.structure)
 
   def AddTable(self, table: SQLTable) -> None:
     if self.conn == None:
@@ -86,10 +350,152 @@ class SQLite3Connector:
       return
     if table.name in self.structure.table_name_dict:
       raise RuntimeError("trying to add exist table: {}".format(table.name))
+    self._EnsureOwnStructure()
     self.structure.table_name_dict[table.name] = table
     self.structure.tables.append(table)
+    self.schema_generation += 1
     self._CreateTable(table.name)
 
+  def AddIndex(self, index: SQLIndex) -> None:
+    if self.conn == None:
+      self.logger.warning("[AddIndex] self.conn is None")
+      return
+    self._EnsureOwnStructure(index.table_name)
+    self.structure.table_name_dict[index.table_name].AddIndex(index)
+    self.schema_generation += 1
+    self.conn.execute(index.GetCreateStr())
+
+  def DropTableIndexes(self, table_name: str) -> list:
+    """ drops the declared indexes of a table, e.g. before a bulk load,
+        returns the dropped SQLIndex list """
+    dropped = []
+    exist_names = set(self._GetExistIndexNameForTable(table_name))
+    for index in self.structure.table_name_dict[table_name].indexes:
+      if index.name in exist_names:
+        self.conn.execute("DROP INDEX {}".format(index.name))
+        dropped.append(index)
+    return dropped
+
+  def CreateTableIndexes(self, table_name: str) -> None:
+    for index in self.structure.table_name_dict[table_name].indexes:
+      self.conn.execute(index.GetCreateStr())
+
+  # ================ schema cache ================
+  def GetSchemaVersion(self) -> int:
+    return self.conn.execute("PRAGMA schema_version").fetchone()[0]
+
+  def _IsMemory(self) -> bool:
+    return self.path == ":memory:" or self.in_memory
+
+  def GetSchemaDigest(self) -> str:
+    """ digest of the schema sql, schema_version alone counts again from
+        1 in a recreated or restored file """
+    digest = hashlib.sha1()
+    for row in self.conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name"):
+      digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+  def _GetSchemaCacheKey(self):
+    """ (realpath, schema_version, schema digest) or None when caching
+        does not apply """
+    # a working copy diverges from its file between flushes
+    if not self.use_schema_cache or self._IsMemory():
+      return None
+    return (os.path.realpath(self.path), self.GetSchemaVersion(), self.GetSchemaDigest())
+
+  def _EnsureOwnStructure(self, table_name: str=None) -> None:
+    """ copy-on-write, shallow copies the shared structure (and the table
+        about to change) before this connector modifies it """
+    if self.structure is None:
+      self.structure = SQLDatabase()
+      self._owns_structure = True
+    if not self._owns_structure:
+      shared = self.structure
+      self.structure = SQLDatabase()
+      self.structure.tables = list(shared.tables)
+      self.structure.table_name_dict = dict(shared.table_name_dict)
+      self._owns_structure = True
+    self.structure.__dict__.pop("_fingerprint", None)
+    if table_name is not None:
+      table = copy.copy(self.structure.table_name_dict[table_name])
+      table.indexes = list(table.indexes)
+      table.index_name_dict = dict(table.index_name_dict)
+      self.structure.table_name_dict[table_name] = table
+      self.structure.tables = [table if t.name == table_name else t for t in self.structure.tables]
+
+  def _GetCachedStructure(self, cache_key):
+    with _schema_cache_lock:
+      cached = _loaded_structure_cache.get(cache_key, None)
+    if cached is None and self.schema_sidecar:
+      sidecar = self._ReadSchemaSidecar(cache_key)
+      if sidecar is not None and "structure" in sidecar:
+        cached = SQLDatabase.CreateFromDict(sidecar["structure"])
+        with _schema_cache_lock:
+          _loaded_structure_cache[cache_key] = cached
+    return cached
+
+  def _PutCachedStructure(self, cache_key, structure) -> None:
+    with _schema_cache_lock:
+      _loaded_structure_cache[cache_key] = structure
+    # a loaded structure always matches its own database
+    self._PutValidatedStructure(cache_key, structure)
+
+  def _IsValidatedStructure(self, cache_key, structure) -> bool:
+    if structure is None:
+      return False
+    validated_key = cache_key + (structure.GetFingerprint(),)
+    with _schema_cache_lock:
+      if validated_key in _validated_structure_cache:
+        return True
+    if self.schema_sidecar:
+      sidecar = self._ReadSchemaSidecar(cache_key)
+      if sidecar is not None and validated_key[-1] in sidecar.get("validated", []):
+        with _schema_cache_lock:
+          _validated_structure_cache.add(validated_key)
+        return True
+    return False
+
+  def _PutValidatedStructure(self, cache_key, structure) -> None:
+    if structure is None:
+      return
+    with _schema_cache_lock:
+      _validated_structure_cache.add(cache_key + (structure.GetFingerprint(),))
+    if self.schema_sidecar:
+      sidecar = self._ReadSchemaSidecar(cache_key) or {"schema_version": cache_key[1], "schema_digest": cache_key[2],
+                                                       "validated": []}
+      if structure.GetFingerprint() not in sidecar["validated"]:
+        sidecar["validated"].append(structure.GetFingerprint())
+      if "structure" not in sidecar and cache_key in _loaded_structure_cache:
+        sidecar["structure"] = _loaded_structure_cache[cache_key].ToDict()
+      self._WriteSchemaSidecar(sidecar)
+
+  def _ReadSchemaSidecar(self, cache_key):
+    """ sidecar content when it was written for the current schema """
+    try:
+      with open(self.path + SQLite3Connector.SCHEMA_SIDECAR_SUFFIX, "r", encoding="utf-8") as f:
+        sidecar = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if sidecar.get("schema_version", None) != cache_key[1] or sidecar.get("schema_digest", None) != cache_key[2]:
+      return None
+    return sidecar
+
+  def _WriteSchemaSidecar(self, sidecar) -> None:
+    sidecar_path = self.path + SQLite3Connector.SCHEMA_SIDECAR_SUFFIX
+    try:
+      with open(sidecar_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sidecar, f)
+      os.replace(sidecar_path + ".tmp", sidecar_path)
+    except OSError as e:
+      self.logger.warning("can not write schema sidecar {}: {}".format(sidecar_path, e))
+
+  def _CheckAndAddTableIndexes(self, table_name: str) -> None:
+    exist_names = set(self._GetExistIndexNameForTable(table_name))
+    for index in self.structure.table_name_dict[table_name].indexes:
+      if index.name not in exist_names:
+        self.logger.warning("index {} not found in {}, creating..".format(index.name, table_name))
+        self.conn.execute(index.GetCreateStr())
+
   def _CheckAndAddTableFields(self, table_name: str) -> None:
     exist_names = set(self._GetExistFieldNameForTable(table_name))
     for field in self.structure.table_name_dict[table_name].fields:
@@ -109,6 +515,8 @@ class SQLite3Connector:
     create_sql = create_sql[:-2]
     create_sql += "\n);"
     self.conn.execute(create_sql)
+    for index in self.structure.table_name_dict[table_name].indexes:
+      self.conn.execute(index.GetCreateStr())
 
   def _GetFieldsWithIndexForTable(self, table_name: str) -> dict:
     raise ValueError("should not use this function")
@@ -133,6 +541,40 @@ class SQLite3Connector:
       result_list.append(field_name)
     return result_list
 
+  def _GetPrimaryKeysForTable(self, table_name: str) -> list:
+    cursor = self.conn.cursor()
+    cursor.execute("PRAGMA table_info(%s)" % (table_name))
+    # pk column is the 1-based position inside the primary key, 0 otherwise
+    return [p[1] for p in sorted(cursor.fetchall(), key=lambda p: p[5]) if p[5] > 0]
+
+  def _GetExistIndexNameForTable(self, table_name: str) -> list:
+    cursor = self.conn.cursor()
+    cursor.execute("PRAGMA index_list(%s)" % (table_name))
+    return [p[1] for p in cursor.fetchall()]
+
+  def _GetIndexesForTable(self, table_name: str) -> list:
+    # automatic indexes (primary key / unique constraints) have no sql
+    cursor = self.conn.cursor()
+    cursor.execute("select name, sql from sqlite_master where type='index' and tbl_name=? "
+                   "and sql is not null order by name", (table_name,))
+    index_sqls = cursor.fetchall()
+    cursor.execute("PRAGMA index_list(%s)" % (table_name))
+    unique_dict = {p[1]: bool(p[2]) for p in cursor.fetchall()}
+    result_list = []
+    for index_name, index_sql in index_sqls:
+      cursor.execute("PRAGMA index_info(%s)" % (index_name))
+      fields = [p[2] for p in sorted(cursor.fetchall())]
+      if None in fields:
+        self.logger.debug("skip expression index {} of {}".format(index_name, table_name))
+        continue
+      where = None
+      columns_end = index_sql.find(")", index_sql.find("("))
+      where_idx = index_sql.upper().find(" WHERE ", columns_end)
+      if where_idx >= 0:
+        where = index_sql[where_idx + len(" WHERE "):].strip()
+      result_list.append(SQLIndex(index_name, table_name, fields, unique_dict.get(index_name, False), where))
+    return result_list
+
   def _GetFieldsDetailForTable(self, table_name: str) -> dict:
     cursor = self.conn.cursor()
     cursor.execute("PRAGMA table_info(%s)" % (table_name))
@@ -164,11 +606,9 @@ class SQLite3Connector:
       return True
 
   def __del__(self):
-    if self.commit_when_leave and self.conn != None:
-      self.conn.commit()
-      self.conn.close()
-      if self.verbose_level >= 1:
-        self.logger.info("{} commit and exit success".format(self.path))
+    # fallback only, Close() is the deterministic path
+    if self.commit_when_leave and getattr(self, "conn", None) != None:
+      self.Close(commit=True)
 
 if __name__ == "__main__":
   table_name_initiate_dict = {
@@ -0,0 +1,264 @@
+"""
+SQLiteDatabaseSet
+
+a directory of same schema database files, one per entity, behind a
+bounded LRU of open handles
+
+- Handle(name) checks out a SQLite3Operator for <directory>/<name><suffix>,
+  at most max_open files are open at once, the least recently used idle
+  handle is committed and closed to make room
+- Map(func) / Select(...) run over every file or a chosen subset in a
+  thread pool, sqlite releases the GIL while a statement runs
+- AttachedQuery(sql_template) ATTACHes files in batches to one in-memory
+  connection and runs the template once per batch as a UNION ALL, so a
+  cross file query costs one statement per batch instead of per file
+
+every handle shares the set's SQLDatabase, when none is given it is
+loaded from the first file opened
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from sqlite_structure import SQLDatabase
+from sqlite_connector import SQLite3Connector
+from sqlite_operator import SQLite3Operator
+
+class _DatabaseHandle:
+  __slots__ = ("name", "operator", "pins", "lock")
+
+  def __init__(self, name) -> None:
+    self.name = name
+    self.operator = None
+    self.pins = 0
+    self.lock = threading.Lock()    # one thread per connection at a time
+
+class SQLiteDatabaseSet:
+  def __init__(self, directory: str, structure: SQLDatabase=None, suffix: str=".db", max_open: int=64,
+               workers: int=4, pragma_profile=None, validate: bool=False) -> None:
+    if max_open <= 0:
+      raise ValueError("max_open should be positive, got: {}".format(max_open))
+    self.directory = directory
+    self.structure = structure
+    self.suffix = suffix
+    self.max_open = max_open
+    self.workers = workers
+    self.pragma_profile = pragma_profile
+    # run TableValidation when a handle is opened, creates missing tables
+    self.validate = validate
+    self.logger = logging.getLogger("SQLiteDatabaseSet")
+
+    self._cond = threading.Condition()
+    self._handles = collections.OrderedDict()   # name -> _DatabaseHandle, least recent first
+    self._names = None
+    self._closed = False
+
+    # stats
+    self._hit_count = 0
+    self._open_count = 0
+    self._eviction_count = 0
+    self._max_open_seen = 0
+
+  def __repr__(self) -> str:
+    return "<SQLiteDatabaseSet: '{}' at {:016X}>".format(self.directory, id(self))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Close()
+
+  # ================ names ================
+  def ListNames(self, refresh: bool=False) -> list:
+    """ sorted names of the database files in the directory """
+    if self._names is None or refresh:
+      paths = glob.glob(os.path.join(glob.escape(self.directory), "*" + glob.escape(self.suffix)))
+      self._names = sorted(os.path.basename(path)[:-len(self.suffix)] for path in paths)
+    return list(self._names)
+
+  def GetPath(self, name: str) -> str:
+    return os.path.join(self.directory, name + self.suffix)
+
+  # ================ handles ================
+  @contextlib.contextmanager
+  def Handle(self, name: str, create: bool=False):
+    """ with dbs.Handle("sh.600004") as op: op.SelectFieldFromTable(...)
+
+    create makes the file and its tables when it does not exist yet.
+    do not nest Handle calls of one thread beyond max_open, the extra
+    checkout waits for a handle that thread itself holds
+    """
+    entry = self._Pin(name)
+    try:
+      with entry.lock:
+        if entry.operator is None:
+          entry.operator = self._OpenOperator(name, create)
+        yield entry.operator
+    finally:
+      self._Unpin(entry)
+
+  def _Pin(self, name):
+    evicted = None
+    with self._cond:
+      while True:
+        if self._closed:
+          raise RuntimeError("database set {} is closed".format(self.directory))
+        entry = self._handles.get(name, None)
+        if entry is not None:
+          self._handles.move_to_end(name)
+          self._hit_count += 1
+          break
+        if len(self._handles) >= self.max_open:
+          evicted = self._EvictIdle()
+        if len(self._handles) < self.max_open:
+          entry = self._handles[name] = _DatabaseHandle(name)
+          self._max_open_seen = max(self._max_open_seen, len(self._handles))
+          break
+        # every open handle is checked out, wait for one to come back
+        self._cond.wait()
+      entry.pins += 1
+    # commit and close of the evicted handle stay out of the set wide lock
+    if evicted is not None:
+      try:
+        self._CloseOperator(evicted.operator)
+      except sqlite3.Error as e:
+        self.logger.error("closing evicted database {} failed: {}".format(evicted.name, e))
+    return entry
+
+  def _Unpin(self, entry) -> None:
+    with self._cond:
+      entry.pins -= 1
+      if entry.operator is None and entry.pins == 0 and self._handles.get(entry.name, None) is entry:
+        # opening failed, do not keep the empty slot
+        del self._handles[entry.name]
+      self._cond.notify_all()
+
+  def _EvictIdle(self):
+    """ removes the least recently used handle nobody holds and returns
+        it for closing, called with _cond held """
+    for name, entry in self._handles.items():
+      if entry.pins == 0:
+        del self._handles[name]
+        self._eviction_count += 1
+        return entry
+    return None
+
+  def _OpenOperator(self, name, create):
+    path = self.GetPath(name)
+    if not create and not os.path.exists(path):
+      raise KeyError("no database {} in {}".format(name, self.directory))
+    connector = SQLite3Connector(path, self.structure, verbose_level=0, pragma_profile=self.pragma_profile)
+    connector.Connect(do_check=False, check_same_thread=False)
+    if self.structure is None:
+      connector.LoadStructureFromDatabase()
+      # same schema files, the first structure loaded serves the rest
+      self.structure = connector.structure
+    elif self.validate or create:
+      connector.TableValidation()
+    with self._cond:
+      self._open_count += 1
+    if create and self._names is not None and name not in self._names:
+      self._names = sorted(self._names + [name])
+    return SQLite3Operator(connector)
+
+  @staticmethod
+  def _CloseOperator(operator) -> None:
+    if operator is None or operator.connector.conn is None:
+      return
+    operator.Commit()
+    operator.connector.Close(commit=False)
+
+  def Close(self) -> None:
+    """ commits and closes every open handle """
+    with self._cond:
+      self._closed = True
+      entries = list(self._handles.values())
+      self._handles.clear()
+      self._cond.notify_all()
+    for entry in entries:
+      with entry.lock:
+        self._CloseOperator(entry.operator)
+
+  def GetStats(self) -> dict:
+    with self._cond:
+      return {
+        "open": len(self._handles),
+        "max_open": self.max_open,
+        "max_open_seen": self._max_open_seen,
+        "hits": self._hit_count,
+        "opens": self._open_count,
+        "evictions": self._eviction_count,
+      }
+
+  # ================ queries ================
+  def Map(self, func, names=None, workers: int=None) -> dict:
+    """ {name: func(name, operator)} over names (every file by default),
+        run in a thread pool, the dict follows the order of names """
+    names = self.ListNames() if names is None else list(names)
+
+    def Run(name):
+      with self.Handle(name) as op:
+        return func(name, op)
+
+    workers = workers or self.workers
+    if workers <= 1 or len(names) <= 1:
+      return {name: Run(name) for name in names}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(names))) as executor:
+      return dict(zip(names, executor.map(Run, names)))
+
+  def Select(self, fields, table_name, condition=None, names=None, row_type=None,
+             source_field: str=None, workers: int=None) -> list:
+    """ SelectFieldFromTable on every file, the rows concatenated in name
+        order. source_field adds the file name to every (dict) row """
+    if source_field is not None:
+      row_type = "dict"
+
+    def SelectOne(name, op):
+      rows = op.SelectFieldFromTable(fields, table_name, condition, row_type)
+      if source_field is not None:
+        for row in rows:
+          row[source_field] = name
+      return rows
+
+    results = []
+    for rows in self.Map(SelectOne, names, workers).values():
+      results.extend(rows)
+    return results
+
+  def AttachedQuery(self, sql_template: str, names=None, params=(), batch_size: int=None) -> list:
+    """ runs sql_template over the files batch by batch through ATTACH
+
+    the template is formatted once per file with {schema} (the attached
+    schema name) and {source} (the file name as a quoted SQL literal),
+    the parts of a batch are joined with UNION ALL and params is bound
+    once per part, e.g.
+      "SELECT {source}, code, close FROM {schema}.DailyTable WHERE date = ?"
+    """
+    names = self.ListNames() if names is None else list(names)
+    conn = sqlite3.connect(":memory:")
+    try:
+      # SQLITE_LIMIT_ATTACHED, 10 unless sqlite was compiled otherwise
+      limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+      batch_size = min(batch_size or limit, limit)
+      results = []
+      for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        parts = []
+        for i, name in enumerate(batch):
+          if not os.path.exists(self.GetPath(name)):
+            raise KeyError("no database {} in {}".format(name, self.directory))
+          conn.execute("ATTACH DATABASE ? AS db_{}".format(i), (self.GetPath(name),))
+          parts.append(sql_template.format(schema="db_{}".format(i), source="'{}'".format(name.replace("'", "''"))))
+        try:
+          results.extend(conn.execute(" UNION ALL ".join(parts), tuple(params) * len(batch)).fetchall())
+        finally:
+          for i in range(len(batch)):
+            conn.execute("DETACH DATABASE db_{}".format(i))
+      return results
+    finally:
+      conn.close()
@@ -1,19 +1,25 @@
-
 __all__ = [
   "ClassToSQLiteFieldDefinition",
   "ClassAndPrimaryKeyToTableInitiateDict",
 ]
 
+import dataclasses
+import operator
 from sqlite_structure import SQLField
 
 def ClassToSQLiteFieldDefinition(class_type):
-  """ this function will initiate this class, use at your own risk """
+  """ a dataclass gives its defaults directly, any other class is
+      initiated to read them, use at your own risk """
   field_definition_dict = {}
-  temp_obj = class_type()
+  if dataclasses.is_dataclass(class_type):
+    defaults = {f.name: f.default for f in dataclasses.fields(class_type) if f.default is not dataclasses.MISSING}
+  else:
+    temp_obj = class_type()
+    defaults = {name: getattr(temp_obj, name, None) for name in class_type.__annotations__}
   for name, python_type in class_type.__annotations__.items():
     field_str = SQLField.GetSQLTypeFromPythonType(python_type)
-    if isinstance(getattr(temp_obj, name, None), python_type) and python_type != str:   # string is not enabled
-      field_str += " DEFAULT {}".format(getattr(temp_obj, name))
+    if isinstance(defaults.get(name, None), python_type) and python_type != str:   # string is not enabled
+      field_str += " DEFAULT {}".format(defaults[name])
     field_definition_dict[name] = field_str
   return field_definition_dict
 
@@ -22,4 +28,63 @@ def ClassAndPrimaryKeyToTableInitiateDict(class_type, table_name, primary_keys=N
   db_initiate_dict[table_name]["field_definition"] = ClassToSQLiteFieldDefinition(class_type)
   if primary_keys is not None:
     db_initiate_dict[table_name]["primary_keys"] = primary_keys
-  return db_initiate_dict
\ No newline at end of file
+  return db_initiate_dict
+
+def GetClassFieldNames(class_type) -> list:
+  """ dataclass fields, else annotations along the mro then __slots__ """
+  if dataclasses.is_dataclass(class_type):
+    return [f.name for f in dataclasses.fields(class_type)]
+  names = []
+  for klass in reversed(class_type.__mro__):
+    for name in list(getattr(klass, "__annotations__", {})) + list(_GetSlots(klass)):
+      if name not in names and not name.startswith("__"):
+        names.append(name)
+  return names
+
+def _GetSlots(klass):
+  slots = klass.__dict__.get("__slots__", ())
+  return (slots,) if isinstance(slots, str) else slots
+
+def CreateObjectGetter(fields):
+  """ obj -> tuple of the fields, an attrgetter built once """
+  getter = operator.attrgetter(*fields)
+  if len(fields) == 1:
+    return lambda obj: (getter(obj),)
+  return getter
+
+def CreateObjectFactory(class_type, column_names):
+  """ returns rows -> [class_type objects] for rows holding column_names
+
+  a dataclass whose required init fields are all selected is built
+  through its constructor with keywords, anything else is created
+  without __init__ and gets one assignment per column. either way the
+  per row code is generated once, there is no setattr loop
+  """
+  for name in column_names:
+    if not name.isidentifier():
+      raise ValueError("column {!r} can not map to an attribute of {}".format(name, class_type.__name__))
+  namespace = {"_cls": class_type, "_new": object.__new__, "_set": object.__setattr__}
+  if _CanUseConstructor(class_type, column_names):
+    args = ", ".join("{}=r[{}]".format(name, idx) for idx, name in enumerate(column_names))
+    source = "def _Make(rows):\n  return [_cls({}) for r in rows]".format(args)
+  else:
+    frozen = dataclasses.is_dataclass(class_type) and class_type.__dataclass_params__.frozen
+    if frozen:
+      assign = "".join("\n    _set(o, {!r}, r[{}])".format(name, idx) for idx, name in enumerate(column_names))
+    else:
+      assign = "".join("\n    o.{} = r[{}]".format(name, idx) for idx, name in enumerate(column_names))
+    source = ("def _Make(rows):\n  result = []\n  append = result.append\n  for r in rows:"
+              "\n    o = _new(_cls){}\n    append(o)\n  return result".format(assign))
+  exec(source, namespace)
+  return namespace["_Make"]
+
+def _CanUseConstructor(class_type, column_names):
+  if not dataclasses.is_dataclass(class_type) or not class_type.__dataclass_params__.init:
+    return False
+  init_fields = {f.name: f for f in dataclasses.fields(class_type) if f.init}
+  if any(name not in init_fields for name in column_names):
+    return False
+  for name, f in init_fields.items():
+    if name not in column_names and f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING:
+      return False
+  return True
@@ -1,7 +1,23 @@
 
+import base64
+import contextlib
+import csv
+import itertools
+import json
 import logging
 import sqlite3
+import time
 from sqlite_connector import SQLite3Connector
+from sqlite_statement_cache import SQLStatementCache
+from sqlite_row_factory import SQLRowFactory
+from sqlite_write_behind import SQLWriteBehindQueue
+from sqlite_columnar import SQLColumnBuffer, ResolveUseNumpy
+from sqlite_row_cache import SQLRowCache
+from sqlite_condition import SQLCondition
+from sqlite_profiler import SQLProfiler
+from sqlite_parallel import RunParallelScan
+from sqlite_func_tools import GetClassFieldNames, CreateObjectGetter, CreateObjectFactory
+from sqlite_codec import TrainDictionary, RegisterDictionary
 
 class SQLite3Operator:
   def __init__(self, sqlite_connector: SQLite3Connector) -> None:
@@ -9,6 +25,28 @@ class SQLite3Operator:
     self.auto_save = False
     self.auto_save_interval = 10
     self.auto_save_counter = 0
+    self._auto_save_suspended = 0
+    self.bulk_chunk_size = 1000
+    self.select_batch_size = 1000
+    self.statement_cache = SQLStatementCache()
+    self.table_encoders = {}    # table_name -> {field_name: encoder or None}
+    self.table_decoders = {}    # table_name -> {field_name: decoder}, compressed fields only
+    self.row_factory = SQLRowFactory()
+    self.object_factories = {}    # (class, column names) -> rows -> objects
+    self.write_behind = None
+    self.row_caches = {}    # table_name -> SQLRowCache
+    self.profiler = None
+    # INSERT ... ON CONFLICT DO UPDATE needs sqlite 3.24
+    self.native_upsert = sqlite3.sqlite_version_info >= (3, 24, 0)
+    self.busy_retries = 0
+    self.busy_retry_delay = 0.05
+    self._transaction_depth = 0
+    self._savepoint_counter = 0
+    self.query_plan_audit = False
+    self.audit_large_table_rows = 10000
+    self._audited_sqls = set()
+    self._table_row_estimates = {}
+    self._cache_generation = self.connector.schema_generation
     self.logger = logging.getLogger("SQLite3Operator")
 
   def SetAutoSave(self, auto_save):
@@ -17,136 +55,1306 @@ class SQLite3Operator:
   def SetAutoSaveInterval(self, interval):
     self.auto_save_interval = interval
 
+  def SetBulkChunkSize(self, chunk_size):
+    if chunk_size <= 0:
+      raise ValueError("bulk chunk size should be positive, got: {}".format(chunk_size))
+    self.bulk_chunk_size = chunk_size
+
+  def SetSelectBatchSize(self, batch_size):
+    if batch_size <= 0:
+      raise ValueError("select batch size should be positive, got: {}".format(batch_size))
+    self.select_batch_size = batch_size
+
+  def SetRowType(self, row_type):
+    """ default row representation of the select functions, one of
+        "dict", "tuple", "namedtuple", "slots" or "row" (sqlite3.Row) """
+    SQLRowFactory.CheckRowType(row_type)
+    self.row_factory.default_row_type = row_type
+
+  def SetStatementCacheSize(self, max_size):
+    self.statement_cache.max_size = max_size
+
+  def GetStatementCacheStats(self):
+    return self.statement_cache.GetStats()
+
+  def SetQueryPlanAudit(self, enabled=True, large_table_rows=10000):
+    """ run EXPLAIN QUERY PLAN once per generated select and log a warning
+        when it scans a table holding at least large_table_rows rows """
+    self.query_plan_audit = enabled
+    self.audit_large_table_rows = large_table_rows
+    self._audited_sqls.clear()
+    self._table_row_estimates.clear()
+
+  # ================ profiling ================
+  def EnableProfiling(self, slow_query_threshold=None, trace=True, max_samples=1024):
+    """ record per statement shape latency and row counts, statements
+        slower than slow_query_threshold seconds are logged with their
+        query plan, trace also counts every statement sqlite runs """
+    self.profiler = SQLProfiler(slow_query_threshold, self.ExplainQueryPlan, max_samples)
+    if trace and self.connector.conn != None:
+      self.connector.conn.set_trace_callback(self.profiler.RecordTrace)
+    return self.profiler
+
+  def DisableProfiling(self):
+    if self.profiler is not None and self.connector.conn != None:
+      self.connector.conn.set_trace_callback(None)
+    self.profiler = None
+
+  def GetProfileSnapshot(self):
+    return self.profiler.Snapshot() if self.profiler is not None else None
+
   # ================ auto save ====================
-  def CheckAutoSave(self):
+  def CheckAutoSave(self, count=1):
     if self.connector.conn != None:
-      self.auto_save_counter += 1
-      if self.auto_save and self.auto_save_counter > self.auto_save_interval:
+      self.auto_save_counter += count
+      if self.auto_save and self._auto_save_suspended == 0 and \
+         self.auto_save_counter > self.auto_save_interval:
         self.logger.debug("database {} begin auto save".format(self.connector.path))
         self.Commit()
 
+  # ================ write behind ================
+  def EnableWriteBehind(self, max_queue_size=10000, max_batch_size=1000, max_delay=0.05, put_timeout=None):
+    """ queue writes into a background thread committing them in groups,
+        write functions then return concurrent.futures.Future objects """
+    if self.write_behind is not None:
+      return
+    self.write_behind = SQLWriteBehindQueue(self, max_queue_size, max_batch_size, max_delay, put_timeout)
+    self.write_behind.Start()
+
+  def DisableWriteBehind(self, flush=True):
+    if self.write_behind is None:
+      return
+    self.write_behind.Stop(flush)
+    self.write_behind = None
+
+  def Flush(self, timeout=None):
+    if self.write_behind is not None:
+      self.write_behind.Flush(timeout)
+
+  def _IsDeferred(self):
+    return self.write_behind is not None and not self.write_behind.IsWorkerThread()
+
+  # ================ transaction ================
+  def SetBusyTimeout(self, timeout_ms):
+    """ let sqlite wait up to timeout_ms for a lock before SQLITE_BUSY """
+    if self.connector.conn != None:
+      self.connector.conn.execute("PRAGMA busy_timeout={}".format(int(timeout_ms)))
+
+  def SetBusyRetry(self, retries, delay=0.05):
+    """ retry BEGIN / COMMIT of Transaction on SQLITE_BUSY, the wait
+        doubles after every attempt starting from delay seconds """
+    self.busy_retries = retries
+    self.busy_retry_delay = delay
+
+  @contextlib.contextmanager
+  def Transaction(self, mode="deferred"):
+    """ with op.Transaction("immediate"): ...
+
+    commits on success and rolls back on exception, auto save is
+    suspended inside. a nested Transaction becomes a Savepoint. pending
+    implicit work is committed before the explicit BEGIN
+    """
+    mode = mode.upper()
+    if mode not in ("DEFERRED", "IMMEDIATE", "EXCLUSIVE"):
+      raise ValueError("not supported transaction mode: {}".format(mode))
+    if self._IsDeferred():
+      raise RuntimeError("Transaction can not be used while write-behind is enabled")
+    if self._transaction_depth > 0:
+      with self.Savepoint():
+        yield self
+      return
+    conn = self.connector.conn
+    if conn.in_transaction:
+      self.Commit()
+    self._RetryOnBusy(conn.execute, "BEGIN {}".format(mode))
+    self._transaction_depth += 1
+    self._auto_save_suspended += 1
+    try:
+      try:
+        yield self
+      except BaseException:
+        self._RollbackConnection()
+        raise
+      try:
+        self._RetryOnBusy(conn.commit)
+      except BaseException:
+        self._RollbackConnection()
+        raise
+      self.auto_save_counter = 0
+      self.connector.OnCommitted()
+    finally:
+      self._transaction_depth -= 1
+      self._auto_save_suspended -= 1
+
+  def _AtomicWrite(self, mode="deferred"):
+    """ a Transaction, or a Savepoint when work is already pending so it
+        is neither committed nor lost """
+    if self.connector.conn.in_transaction:
+      return self.Savepoint()
+    return self.Transaction(mode)
+
+  @contextlib.contextmanager
+  def Savepoint(self, name=None):
+    """ with op.Savepoint(): ..., rolls back to the savepoint on exception
+        and keeps the outer transaction going """
+    if self._IsDeferred():
+      raise RuntimeError("Savepoint can not be used while write-behind is enabled")
+    if name is None:
+      self._savepoint_counter += 1
+      name = "sp_{}".format(self._savepoint_counter)
+    conn = self.connector.conn
+    conn.execute("SAVEPOINT {}".format(name))
+    self._transaction_depth += 1
+    self._auto_save_suspended += 1
+    try:
+      try:
+        yield self
+      except BaseException:
+        conn.execute("ROLLBACK TO {}".format(name))
+        conn.execute("RELEASE {}".format(name))
+        self._FlushRowCaches()
+        raise
+      conn.execute("RELEASE {}".format(name))
+    finally:
+      self._transaction_depth -= 1
+      self._auto_save_suspended -= 1
+
+  def Rollback(self):
+    """ rolls back the pending implicit transaction """
+    if self.connector.conn != None:
+      self._RollbackConnection()
+      self.auto_save_counter = 0
+
+  def _RollbackConnection(self):
+    self.connector.conn.rollback()
+    # rows read inside the transaction may not exist anymore
+    self._FlushRowCaches()
+
+  def _RetryOnBusy(self, func, *args):
+    delay = self.busy_retry_delay
+    attempt = 0
+    while True:
+      try:
+        return func(*args)
+      except sqlite3.OperationalError as e:
+        if attempt >= self.busy_retries or not SQLite3Operator._IsBusyError(e):
+          raise
+        attempt += 1
+        self.logger.debug("database {} busy, retry {} in {}s".format(self.connector.path, attempt, delay))
+        time.sleep(delay)
+        delay *= 2
+
+  @staticmethod
+  def _IsBusyError(error):
+    # sqlite_errorcode exists since python 3.11
+    error_code = getattr(error, "sqlite_errorcode", None)
+    if error_code is not None:
+      return error_code & 0xff in (5, 6)   # SQLITE_BUSY, SQLITE_LOCKED
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
   # ================ basic op fields ================
   # add delete modify query
   def Commit(self):
+    if self._IsDeferred():
+      self.write_behind.Flush()
+      return
     if self.connector.conn != None:
-      self.connector.conn.commit()
+      self.connector.Commit()
       self.auto_save_counter = 0
   
   def InsertDictToTable(self, d, table_name, or_condition=""):
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.InsertDictToTable, d, table_name, or_condition)
     if self.connector.conn == None:
       return
+    insert_sql, encoders = self._GetCompiledStatement("insert", table_name, tuple(d), or_condition)
+    self._ExecuteWrite(insert_sql, self._EncodeRow(encoders, d.values()))
+    if len(self.row_caches) > 0:
+      self._InvalidateRowCacheForInsert(table_name, or_condition, d)
+    self.CheckAutoSave()
+
+  def InsertDictsToTable(self, rows, table_name, or_condition="", chunk_size=None):
+    """ insert an iterable of dicts through executemany
+
+    rows sharing the same column set are grouped together, each group is
+    flushed every chunk_size rows, no commit is issued in between so the
+    whole call stays in one transaction. returns the inserted row count
+    """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.InsertDictsToTable, rows, table_name, or_condition, chunk_size)
+    if self.connector.conn == None:
+      return 0
+    if chunk_size is None:
+      chunk_size = self.bulk_chunk_size
+    groups = {}   # column tuple -> (insert_sql, encoders, pending rows)
+    inserted = 0
+    for d in rows:
+      columns = tuple(d)
+      group = groups.get(columns)
+      if group is None:
+        insert_sql, encoders = self._GetCompiledStatement("insert", table_name, columns, or_condition)
+        group = groups[columns] = (insert_sql, encoders, [])
+      insert_sql, encoders, pending = group
+      pending.append(self._EncodeRow(encoders, d.values()))
+      if len(pending) >= chunk_size:
+        inserted += self._ExecuteWriteMany(insert_sql, pending).rowcount
+        pending.clear()
+    for insert_sql, encoders, pending in groups.values():
+      if len(pending) > 0:
+        inserted += self._ExecuteWriteMany(insert_sql, pending).rowcount
+    if len(self.row_caches) > 0:
+      self._InvalidateRowCacheForInsert(table_name, or_condition)
+    self.CheckAutoSave(inserted)
+    return inserted
+
+  def InsertObjects(self, objs, table_name, fields=None, or_condition="", chunk_size=None):
+    """ insert an iterable of objects of one class through executemany
+
+    fields defaults to the table fields the class declares (dataclass
+    fields, annotations or __slots__), values are read with an attrgetter
+    compiled once. returns the inserted row count
+    """
+    obj_iter = iter(objs)
+    first = next(obj_iter, None)
+    if first is None:
+      return 0
+    if fields is None:
+      class_fields = GetClassFieldNames(type(first))
+      fields = [field.name for field in self.connector.structure.table_name_dict[table_name].fields
+                if field.name in class_fields]
+    SQLite3Operator._CheckObjectFields(type(first), table_name, fields)
+    getter = CreateObjectGetter(fields)
+    return self.InsertTuplesToTable(map(getter, itertools.chain((first,), obj_iter)), table_name, fields,
+                                    or_condition, chunk_size)
+
+  @staticmethod
+  def _CheckObjectFields(class_type, table_name, fields):
+    if len(fields) == 0:
+      raise ValueError("{} declares none of the fields of {} (no dataclass fields, annotations or __slots__), "
+                       "pass fields= explicitly".format(class_type.__name__, table_name))
+
+  def UpsertDictsToTable(self, rows, table_name, update_fields=None, key_fields=None, chunk_size=None):
+    """ insert an iterable of dicts, a row whose key already exists gets
+    update_fields overwritten with its new values instead
+
+    key_fields defaults to the table's primary key, update_fields to every
+    non key column of the row, an empty update_fields leaves existing rows
+    untouched. unlike OR REPLACE the other columns keep their values. on
+    sqlite older than 3.24 every row runs as an UPDATE followed by an
+    INSERT guarded by NOT EXISTS. returns the written row count
+    """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.UpsertDictsToTable, rows, table_name, update_fields, key_fields, chunk_size)
+    if self.connector.conn == None:
+      return 0
+    if chunk_size is None:
+      chunk_size = self.bulk_chunk_size
+    key_fields = self._GetKeyFields(table_name, key_fields)
+    cache = self.row_caches.get(table_name, None)
+    changed_keys = []
+    groups = {}   # column tuple -> (statements, pending rows)
+    written = 0
+    for d in rows:
+      columns = tuple(d)
+      group = groups.get(columns)
+      if group is None:
+        group = groups[columns] = (self._GetUpsertStatements(table_name, columns, key_fields, update_fields), [])
+      statements, pending = group
+      pending.append(d)
+      if cache is not None:
+        changed_keys.append(tuple(d.get(k) for k in cache.key_fields))
+      if len(pending) >= chunk_size:
+        written += self._ExecuteUpsert(statements, pending)
+        pending.clear()
+    for statements, pending in groups.values():
+      if len(pending) > 0:
+        written += self._ExecuteUpsert(statements, pending)
+    if cache is not None:
+      self._InvalidateRowCacheForKeys(cache, key_fields, changed_keys)
+    self.CheckAutoSave(written)
+    return written
+
+  def _GetUpsertStatements(self, table_name, columns, key_fields, update_fields):
+    """ [(sql, encoders, fields taken from the row dict)] run in order """
+    missing = [k for k in key_fields if k not in columns]
+    if len(missing) > 0:
+      raise ValueError("upsert rows of {} need the key fields {}".format(table_name, missing))
+    if update_fields is None:
+      update_fields = tuple(k for k in columns if k not in key_fields)
+    else:
+      update_fields = tuple(update_fields)
+      missing = [k for k in update_fields if k not in columns]
+      if len(missing) > 0:
+        raise ValueError("update fields {} are not in the upsert rows of {}".format(missing, table_name))
+    conflict = (key_fields, update_fields)
+    if self.native_upsert:
+      sql, encoders = self._GetCompiledStatement("upsert", table_name, columns, conflict=conflict)
+      return [(sql, encoders, columns)]
+    statements = []
+    if len(update_fields) > 0:
+      sql, encoders = self._GetCompiledStatement("update_by_key", table_name, update_fields + key_fields, conflict=conflict)
+      statements.append((sql, encoders, update_fields + key_fields))
+    sql, encoders = self._GetCompiledStatement("insert_if_absent", table_name, columns + key_fields, conflict=conflict)
+    statements.append((sql, encoders, columns + key_fields))
+    return statements
+
+  def _ExecuteUpsert(self, statements, pending):
+    if len(statements) == 1 and self.native_upsert:
+      sql, encoders, fields = statements[0]
+      return self._ExecuteWriteMany(sql, [self._EncodeRow(encoders, [d[k] for k in fields]) for d in pending]).rowcount
+    # the fallback statements run row by row, so a key repeated in the
+    # chunk ends like the native upsert with its last row
+    written = 0
+    for d in pending:
+      for sql, encoders, fields in statements:
+        written += self._ExecuteWrite(sql, self._EncodeRow(encoders, [d[k] for k in fields])).rowcount
+    return written
+
+  def InsertTuplesToTable(self, rows, table_name, fields=None, or_condition="", chunk_size=None):
+    """ insert an iterable of sequences through executemany
+
+    fields gives the column order of every row, defaults to the order of
+    the table definition. returns the inserted row count
+    """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.InsertTuplesToTable, rows, table_name, fields, or_condition, chunk_size)
+    if self.connector.conn == None:
+      return 0
+    if chunk_size is None:
+      chunk_size = self.bulk_chunk_size
+    if fields is None:
+      fields = [field.name for field in self.connector.structure.table_name_dict[table_name].fields]
+    insert_sql, encoders = self._GetCompiledStatement("insert", table_name, tuple(fields), or_condition)
+    inserted = 0
+    row_iter = iter(rows)
+    while True:
+      chunk = itertools.islice(row_iter, chunk_size)
+      if encoders is None:
+        chunk = list(chunk)
+      else:
+        chunk = [self._EncodeRow(encoders, row) for row in chunk]
+      if len(chunk) == 0:
+        break
+      inserted += self._ExecuteWriteMany(insert_sql, chunk).rowcount
+    if len(self.row_caches) > 0:
+      self._InvalidateRowCacheForInsert(table_name, or_condition)
+    self.CheckAutoSave(inserted)
+    return inserted
+
+  # ================ import ================
+  def ImportFromIterable(self, rows, table_name, fields=None, or_condition="", chunk_size=None,
+                         coerce=True, drop_indexes=False, bulk_load=True,
+                         progress_callback=None, progress_interval=100000):
+    """ streaming bulk import of dicts or sequences
+
+    rows are read lazily, coerced with SQLField.CoerceValue and inserted in
+    executemany chunks inside one immediate transaction. fields defaults to
+    the keys of the first dict or to the table definition order for
+    sequences, every dict has to carry all of fields (exactly those keys
+    when they come from the first dict). or_condition is the conflict policy ("OR IGNORE",
+    "OR REPLACE"). bulk_load wraps the import in connector.BulkLoadMode
+    when no transaction is open, inside one the import becomes a savepoint
+    of it and keeps the current pragmas. drop_indexes drops the declared indexes first and rebuilds them
+    after the load. progress_callback(rows_done, elapsed_seconds,
+    rows_per_second) is called about every progress_interval rows.
+    returns the import statistics as a dict
+    """
+    if self.connector.conn == None:
+      return None
+    if chunk_size is None:
+      chunk_size = max(self.bulk_chunk_size, 10000)
+    table = self.connector.structure.table_name_dict[table_name]
+    row_iter = iter(rows)
+    first_row = next(row_iter, None)
+    if first_row is None:
+      return {"rows": 0, "inserted": 0, "seconds": 0.0, "rows_per_second": 0.0}
+    row_iter = itertools.chain([first_row], row_iter)
+    if isinstance(first_row, dict):
+      exact = fields is None
+      if fields is None:
+        fields = list(first_row)
+      row_iter = SQLite3Operator._DictRowsToTuples(row_iter, tuple(fields), table_name, exact)
+    elif fields is None:
+      fields = [field.name for field in table.fields]
+    fields = tuple(fields)
+    if coerce:
+      coercers = [table.field_name_dict[k].CoerceValue for k in fields]
+      row_iter = ([coerce_value(v) for coerce_value, v in zip(coercers, row)] for row in row_iter)
+
+    stats = {"rows": 0, "inserted": 0}
+    start_time = time.perf_counter()
+    next_progress = progress_interval
+    # synchronous can not change inside a transaction
+    use_bulk_load = bulk_load and not self.connector.conn.in_transaction
+    bulk_context = self.connector.BulkLoadMode() if use_bulk_load else contextlib.nullcontext()
+    insert_sql, encoders = self._GetCompiledStatement("insert", table_name, fields, or_condition)
+    with bulk_context, self._AtomicWrite("immediate"):
+      if drop_indexes:
+        self.connector.DropTableIndexes(table_name)
+      while True:
+        chunk = [self._EncodeRow(encoders, row) for row in itertools.islice(row_iter, chunk_size)]
+        if len(chunk) == 0:
+          break
+        stats["inserted"] += self._ExecuteWriteMany(insert_sql, chunk).rowcount
+        stats["rows"] += len(chunk)
+        if progress_callback is not None and stats["rows"] >= next_progress:
+          elapsed = time.perf_counter() - start_time
+          progress_callback(stats["rows"], elapsed, stats["rows"] / elapsed if elapsed > 0 else 0.0)
+          next_progress = stats["rows"] + progress_interval
+      if drop_indexes:
+        self.connector.CreateTableIndexes(table_name)
+      if len(self.row_caches) > 0:
+        self._InvalidateRowCacheForInsert(table_name, or_condition)
+    stats["seconds"] = time.perf_counter() - start_time
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    self.logger.info("imported {} rows ({} inserted) into {} in {:.3f}s, {:.0f} rows/s".format(
+                     stats["rows"], stats["inserted"], table_name, stats["seconds"], stats["rows_per_second"]))
+    return stats
+
+  @staticmethod
+  def _DictRowsToTuples(row_iter, fields, table_name, exact):
+    # a missing key would turn into NULL instead of the column DEFAULT and
+    # an extra one would be dropped without notice
+    for d in row_iter:
+      try:
+        row = tuple([d[k] for k in fields])
+      except KeyError:
+        row = None
+      if row is None or (exact and len(d) != len(fields)):
+        raise ValueError("import row {} of {} does not match the fields {}".format(d, table_name, list(fields)))
+      yield row
+
+  def ImportFromCSV(self, csv_file, table_name, fields=None, header=True, delimiter=",", encoding="utf-8", **kwargs):
+    """ ImportFromIterable over a csv path or an open text file, with a
+        header the columns are matched by name and fields selects a
+        subset, other keyword arguments go to ImportFromIterable """
+    if isinstance(csv_file, str):
+      with open(csv_file, "r", newline="", encoding=encoding) as f:
+        return self.ImportFromCSV(f, table_name, fields, header, delimiter, encoding, **kwargs)
+    reader = csv.reader(csv_file, delimiter=delimiter)
+    rows = (row for row in reader if len(row) > 0)
+    if header:
+      header_names = next(rows, None)
+      if header_names is None:
+        return self.ImportFromIterable([], table_name, fields, **kwargs)
+      header_names = [name.strip() for name in header_names]
+      if fields is None:
+        fields = header_names
+      else:
+        positions = [header_names.index(k) for k in fields]
+        rows = ([row[i] for i in positions] for row in rows)
+    return self.ImportFromIterable(rows, table_name, fields, **kwargs)
+
+  # ================ compiled statements ================
+  def _GetCompiledStatement(self, operation, table_name, columns, or_condition="", conflict=None):
+    """ returns (sql, encoders) for the given statement shape, encoders is
+        None when every column passes its value through unchanged.
+        conflict is (key_fields, update_fields) of the upsert operations """
+    if self._cache_generation != self.connector.schema_generation:
+      self.InvalidateStatementCache()
+    key = (operation, table_name, columns, or_condition, conflict)
+    compiled = self.statement_cache.Get(key)
+    if compiled is not None:
+      return compiled
+    table_encoders = self._GetTableEncoders(table_name)
+    encoders = tuple(table_encoders[k] for k in columns)
+    if all(encoder is None for encoder in encoders):
+      encoders = None
+    if operation == "insert":
+      sql = self._BuildInsertSQL(table_name, columns, or_condition)
+    elif operation == "update":
+      sql = "UPDATE {} SET ".format(table_name) + ",".join(map(lambda x: "{}=?".format(x), columns))
+    elif operation == "upsert":
+      key_fields, update_fields = conflict
+      sql = self._BuildInsertSQL(table_name, columns)[:-1]
+      if len(update_fields) > 0:
+        sql += "\nON CONFLICT({}) DO UPDATE SET ".format(",".join(key_fields))
+        sql += ",".join(map(lambda x: "{0}=excluded.{0}".format(x), update_fields)) + ";"
+      else:
+        sql += "\nON CONFLICT({}) DO NOTHING;".format(",".join(key_fields))
+    elif operation == "update_by_key":
+      # columns are the update fields followed by the key fields
+      key_fields, update_fields = conflict
+      sql = "UPDATE {} SET ".format(table_name) + ",".join(map(lambda x: "{}=?".format(x), update_fields))
+      sql += " WHERE " + " AND ".join(map(lambda x: "{} = ?".format(x), key_fields)) + ";"
+    elif operation == "insert_if_absent":
+      # columns are the inserted columns followed by the key fields
+      key_fields, _ = conflict
+      inserted = columns[:len(columns) - len(key_fields)]
+      sql = "INSERT INTO {} (".format(table_name) + ",".join(inserted) + ")\nSELECT "
+      sql += ",".join(["?" for _ in range(len(inserted))])
+      sql += " WHERE NOT EXISTS (SELECT 1 FROM {} WHERE ".format(table_name)
+      sql += " AND ".join(map(lambda x: "{} = ?".format(x), key_fields)) + ");"
+    else:
+      raise ValueError("unknown statement operation: {}".format(operation))
+    compiled = (sql, encoders)
+    self.statement_cache.Put(key, compiled)
+    return compiled
+
+  def _GetTableEncoders(self, table_name):
+    table_encoders = self.table_encoders.get(table_name)
+    if table_encoders is None:
+      fields = self.connector.structure.table_name_dict[table_name].fields
+      table_encoders = {}
+      for field in fields:
+        dictionary_id = None
+        if field.codec is not None and field.codec.use_dict:
+          dictionary_id = self._GetCompressionDictionaryId(table_name, field.name)
+        table_encoders[field.name] = field.GetEncoder(dictionary_id)
+      self.table_encoders[table_name] = table_encoders
+    return table_encoders
+
+  def _GetTableDecoders(self, table_name):
+    """ {field_name: decoder} of the compressed fields, None for a table
+        (or view, join...) the structure does not know """
+    table_decoders = self.table_decoders.get(table_name)
+    if table_decoders is None:
+      table = self.connector.structure.table_name_dict.get(table_name, None) \
+        if self.connector.structure is not None else None
+      if table is None:
+        return None
+      table_decoders = {field.name: field.GetDecoder() for field in table.fields if field.codec is not None}
+      if any(field.codec.use_dict for field in table.fields if field.codec is not None):
+        self._LoadCompressionDictionaries()
+      self.table_decoders[table_name] = table_decoders
+    return table_decoders
+
+  def InvalidateStatementCache(self):
+    self.statement_cache.Clear()
+    self.table_encoders.clear()
+    self.table_decoders.clear()
+    self.row_factory.Clear()
+    self._FlushRowCaches()
+    self._cache_generation = self.connector.schema_generation
+
+  def _ExecuteWrite(self, sql, params=()):
+    if self.profiler is None:
+      return self.connector.conn.execute(sql, params)
+    start_time = time.perf_counter()
+    cursor = self.connector.conn.execute(sql, params)
+    self.profiler.Record(sql, time.perf_counter() - start_time, rows_affected=cursor.rowcount, params=params)
+    return cursor
+
+  def _ExecuteWriteMany(self, sql, rows):
+    if self.profiler is None:
+      return self.connector.conn.executemany(sql, rows)
+    start_time = time.perf_counter()
+    cursor = self.connector.conn.executemany(sql, rows)
+    self.profiler.Record(sql, time.perf_counter() - start_time, rows_affected=cursor.rowcount)
+    return cursor
+
+  @staticmethod
+  def _EncodeRow(encoders, values):
+    if encoders is None:
+      return tuple(values)
+    return tuple([v if encoder is None else encoder(v) for encoder, v in zip(encoders, values)])
+
+  def _BuildInsertSQL(self, table_name, columns, or_condition=""):
     insert_sql = "INSERT {} INTO {} (".format(or_condition, table_name)
-    insert_col = []
-    insert_data = []
-    field_name_dict = self.connector.structure.table_name_dict[table_name].field_name_dict
-    for k, v in d.items():
-      field_instance = field_name_dict[k]
-      insert_col.append(k)
-      insert_data.append(field_instance.ParseToSQLTextData(v))
-    insert_sql += ",".join(insert_col)
+    insert_sql += ",".join(columns)
     insert_sql += ")\nVALUES ("
-    insert_sql += ",".join(["?" for _ in range(len(insert_data))])
+    insert_sql += ",".join(["?" for _ in range(len(columns))])
     insert_sql += ");"
-    self.connector.conn.execute(insert_sql, insert_data)
-    self.CheckAutoSave()
+    return insert_sql
 
   def DeleteFromTableByCondition(self, table_name, condition):
+    """ condition is a raw where string or an SQLCondition """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.DeleteFromTableByCondition, table_name, condition)
     if self.connector.conn == None:
       return
-    delete_sql = "DELETE FROM {}".format(table_name)
-    if condition is not None:
-      delete_sql += " WHERE {}".format(condition)
-    delete_sql += ";"
-    self.connector.conn.execute(delete_sql)
+    where_sql, params = self._CompileCondition(condition, allow_order=False)
+    delete_sql = "DELETE FROM {}{};".format(table_name, where_sql)
+    self._ExecuteWrite(delete_sql, params)
+    if len(self.row_caches) > 0:
+      self._InvalidateRowCacheForCondition(table_name, condition)
     self.CheckAutoSave()
 
   def UpdateFieldFromTable(self, field_dict, table_name, condition):
+    """ condition is a raw where string or an SQLCondition """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.UpdateFieldFromTable, field_dict, table_name, condition)
     if self.connector.conn == None:
       return
-    update_sql = "UPDATE {} SET ".format(table_name)
-    field_names = []
-    field_datas = []
-    field_name_dict = self.connector.structure.table_name_dict[table_name].field_name_dict
-    for key, value in field_dict.items():
-      field_instance = field_name_dict[key]
-      field_names.append(key)
-      field_datas.append(field_instance.ParseToSQLTextData(value))
-    update_sql += ",".join(map(lambda x: "{}=?".format(x), field_names))
-    if condition is not None:
-      update_sql += " WHERE {}".format(condition)
-    update_sql += ";"
-    self.connector.conn.execute(update_sql, field_datas)
+    update_sql, encoders = self._GetCompiledStatement("update", table_name, tuple(field_dict))
+    where_sql, params = self._CompileCondition(condition, allow_order=False)
+    update_sql += where_sql + ";"
+    self._ExecuteWrite(update_sql, self._EncodeRow(encoders, field_dict.values()) + params)
+    if len(self.row_caches) > 0:
+      self._InvalidateRowCacheForCondition(table_name, condition)
     self.CheckAutoSave()
 
-  def SelectFieldFromTable(self, fields, table_name, condition=None):
-    if isinstance(fields, (list, tuple)):
-      fields = ",".join(fields)
-    select_sql = "SELECT {} FROM {}".format(fields, table_name)
+  def UpdateManyByPrimaryKey(self, rows, table_name, key_fields=None, chunk_size=None):
+    """ update an iterable of dicts, each one holds the key fields of the
+    row to change plus the new values of the other fields it carries
 
-    if condition is not None:
-      select_sql += " WHERE {}".format(condition)
-    select_sql += ";"
-    cursor = self.connector.conn.cursor()
-    cursor.execute(select_sql)
-    description = cursor.description
-    return_field_names = list(map(lambda x: x[0], description))
-    result_list = cursor.fetchall()
-    final_result = []
-    for p in result_list:
-      record_result = {}
-      for field_idx, field_name in enumerate(return_field_names):
-        record_result[field_name] = p[field_idx]
-      final_result.append(record_result)
-    return final_result
+    rows sharing the same column set run through one executemany, the
+    whole call is atomic. returns the updated row count
+    """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.UpdateManyByPrimaryKey, rows, table_name, key_fields, chunk_size)
+    if self.connector.conn == None:
+      return 0
+    if chunk_size is None:
+      chunk_size = self.bulk_chunk_size
+    key_fields = self._GetKeyFields(table_name, key_fields)
+    cache = self.row_caches.get(table_name, None)
+    changed_keys = []
+    groups = {}   # column tuple -> (update_sql, encoders, fields, pending rows)
+    updated = 0
+    with self._AtomicWrite():
+      for d in rows:
+        columns = tuple(d)
+        group = groups.get(columns)
+        if group is None:
+          if any(k not in d for k in key_fields):
+            raise ValueError("update rows of {} need the key fields {}".format(table_name, list(key_fields)))
+          update_fields = tuple(k for k in columns if k not in key_fields)
+          if len(update_fields) == 0:
+            raise ValueError("update rows of {} carry no field to update".format(table_name))
+          fields = update_fields + key_fields
+          update_sql, encoders = self._GetCompiledStatement("update_by_key", table_name, fields,
+                                                            conflict=(key_fields, update_fields))
+          group = groups[columns] = (update_sql, encoders, fields, [])
+        update_sql, encoders, fields, pending = group
+        pending.append(self._EncodeRow(encoders, [d[k] for k in fields]))
+        if cache is not None:
+          changed_keys.append(tuple(d.get(k) for k in cache.key_fields))
+        if len(pending) >= chunk_size:
+          updated += self._ExecuteWriteMany(update_sql, pending).rowcount
+          pending.clear()
+      for update_sql, encoders, fields, pending in groups.values():
+        if len(pending) > 0:
+          updated += self._ExecuteWriteMany(update_sql, pending).rowcount
+    if cache is not None:
+      self._InvalidateRowCacheForKeys(cache, key_fields, changed_keys)
+    return updated
+
+  def DeleteByPrimaryKeys(self, keys, table_name, key_fields=None, chunk_size=None):
+    """ delete the rows whose key is in keys, plain values for a single
+    column key and tuples for a composite one
+
+    a single column key is deleted through chunked IN lists, a composite
+    key through a join against a temp table holding the keys, the whole
+    call is atomic. returns the deleted row count
+    """
+    if self._IsDeferred():
+      return self.write_behind.Submit(self.DeleteByPrimaryKeys, keys, table_name, key_fields, chunk_size)
+    if self.connector.conn == None:
+      return 0
+    if chunk_size is None:
+      chunk_size = self.bulk_chunk_size
+    key_fields = self._GetKeyFields(table_name, key_fields)
+    if len(key_fields) == 1:
+      keys = [k[0] if isinstance(k, (tuple, list)) else k for k in keys]
+      # every IN list value is a bound parameter
+      chunk_size = min(chunk_size, self._GetVariableLimit())
+    else:
+      keys = [tuple(k) for k in keys]
+      if any(len(k) != len(key_fields) for k in keys):
+        raise ValueError("keys of {} should be tuples of {}".format(table_name, list(key_fields)))
+    deleted = 0
+    with self._AtomicWrite():
+      if len(key_fields) == 1:
+        for start in range(0, len(keys), chunk_size):
+          chunk = keys[start:start + chunk_size]
+          delete_sql = "DELETE FROM {} WHERE {} IN ({});".format(table_name, key_fields[0], ",".join("?" * len(chunk)))
+          deleted += self._ExecuteWrite(delete_sql, chunk).rowcount
+      elif len(keys) > 0:
+        deleted = self._DeleteByKeyTable(table_name, key_fields, keys)
+    cache = self.row_caches.get(table_name, None)
+    if cache is not None:
+      self._InvalidateRowCacheForKeys(cache, key_fields, [k if isinstance(k, tuple) else (k,) for k in keys])
+    return deleted
+
+  def _DeleteByKeyTable(self, table_name, key_fields, keys):
+    key_table = "temp._delete_keys"
+    conn = self.connector.conn
+    conn.execute("DROP TABLE IF EXISTS {};".format(key_table))
+    conn.execute("CREATE TABLE {} ({});".format(key_table, ",".join(key_fields)))
+    try:
+      self._ExecuteWriteMany("INSERT INTO {} VALUES ({});".format(key_table, ",".join("?" * len(key_fields))), keys)
+      if sqlite3.sqlite_version_info >= (3, 15, 0):
+        # a row value IN (subquery) still searches through the primary key index
+        delete_sql = "DELETE FROM {0} WHERE ({1}) IN (SELECT {1} FROM {2});".format(table_name, ",".join(key_fields), key_table)
+      else:
+        delete_sql = "DELETE FROM {0} WHERE EXISTS (SELECT 1 FROM {1} WHERE {2});".format(
+          table_name, key_table, " AND ".join("{1}.{0} = {2}.{0}".format(k, key_table, table_name) for k in key_fields))
+      return self._ExecuteWrite(delete_sql).rowcount
+    finally:
+      conn.execute("DROP TABLE IF EXISTS {};".format(key_table))
+
+  def _GetKeyFields(self, table_name, key_fields):
+    if key_fields is None:
+      key_fields = self.connector.structure.table_name_dict[table_name].GetPrimaryKeyFields()
+    key_fields = tuple(key_fields)
+    if len(key_fields) == 0:
+      raise ValueError("table {} has no primary key, pass key_fields".format(table_name))
+    return key_fields
+
+  def _GetVariableLimit(self):
+    # SQLITE_LIMIT_VARIABLE_NUMBER, 999 before sqlite 3.32
+    if hasattr(self.connector.conn, "getlimit"):
+      return self.connector.conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return 999 if sqlite3.sqlite_version_info < (3, 32, 0) else 32766
+
+  @staticmethod
+  def _InvalidateRowCacheForKeys(cache, key_fields, keys):
+    if tuple(cache.key_fields) == tuple(key_fields):
+      cache.Invalidate(keys)
+    else:
+      cache.Clear()
+
+  def SelectFieldFromTable(self, fields, table_name, condition=None, row_type=None):
+    select_sql, params = self._BuildSelectSQL(fields, table_name, condition)
+    return self._SelectAll(select_sql, params, table_name, row_type)
   
-  def SelectFieldFromTableAdvanced(self, fields, table_name, sub_condition=None):
-    if isinstance(fields, (list, tuple)):
-      fields = ",".join(fields)
-    select_sql = "SELECT {} FROM {}".format(fields, table_name)
-    if sub_condition is not None:
-      select_sql += sub_condition
-    select_sql += ";"
-    cursor = self.connector.conn.cursor()
-    cursor.execute(select_sql)
-    description = cursor.description
-    return_field_names = list(map(lambda x: x[0], description))
-    result_list = cursor.fetchall()
-    final_result = []
-    for p in result_list:
-      record_result = {}
-      for field_idx, field_name in enumerate(return_field_names):
-        record_result[field_name] = p[field_idx]
-      final_result.append(record_result)
-    return final_result
+  def SelectFieldFromTableAdvanced(self, fields, table_name, sub_condition=None, row_type=None):
+    select_sql, params = self._BuildSelectSQLAdvanced(fields, table_name, sub_condition)
+    return self._SelectAll(select_sql, params, table_name, row_type)
 
-  def RawSelectFieldFromTable(self, fields, table_name, condition=None):
-    if isinstance(fields, (list, tuple)):
-      fields = ",".join(fields)
-    
-    select_sql = "SELECT {} FROM {}".format(fields, table_name)
-    if condition is not None:
-      select_sql += " WHERE {}".format(condition)
-    select_sql += ";"
+  def SelectObjects(self, class_type, table_name, condition=None, fields=None):
+    """ select rows as class_type objects, fields defaults to the table
+        fields the class declares. see CreateObjectFactory for how the
+        objects are built """
+    if fields is None:
+      table_fields = self.connector.structure.table_name_dict[table_name].field_name_dict
+      fields = [name for name in GetClassFieldNames(class_type) if name in table_fields]
+    SQLite3Operator._CheckObjectFields(class_type, table_name, fields)
+    fields = tuple(fields)
+    factory = self.object_factories.get((class_type, fields))
+    if factory is None:
+      factory = self.object_factories[(class_type, fields)] = CreateObjectFactory(class_type, fields)
+    return factory(self.SelectFieldFromTable(list(fields), table_name, condition, row_type="tuple"))
+
+  def _SelectAll(self, select_sql, params, table_name, row_type):
+    if self._cache_generation != self.connector.schema_generation:
+      self.InvalidateStatementCache()
+    if self.query_plan_audit:
+      self._AuditQueryPlan(select_sql, params)
+    if self.profiler is not None:
+      start_time = time.perf_counter()
     cursor = self.connector.conn.cursor()
-    cursor.execute(select_sql)
-    result_list = cursor.fetchall()
+    row_type = self.row_factory.PrepareCursor(cursor, row_type)
+    cursor.execute(select_sql, params)
+    converter = self.row_factory.GetConverter(cursor, table_name, row_type, self._GetTableDecoders(table_name))
+    result_list = converter(cursor.fetchall())
+    if self.profiler is not None:
+      self.profiler.Record(select_sql, time.perf_counter() - start_time, len(result_list), params=params)
     return result_list
+
+  # the Raw* selects return plain tuples, compressed columns are decoded
+  # like in every other select
+  def RawSelectFieldFromTable(self, fields, table_name, condition=None):
+    return self._RawSelect(fields, table_name, condition)[0]
   
   def RawSelectFieldFromTableWithReturnFieldName(self, fields, table_name, condition=None):
+    return self._RawSelect(fields, table_name, condition)
+
+  def _RawSelect(self, fields, table_name, condition):
+    select_sql, params = self._BuildSelectSQL(fields, table_name, condition)
+    if self._cache_generation != self.connector.schema_generation:
+      self.InvalidateStatementCache()
+    if self.profiler is not None:
+      start_time = time.perf_counter()
+    cursor = self.connector.conn.cursor()
+    cursor.execute(select_sql, params)
+    return_field_names = list(map(lambda x: x[0], cursor.description))
+    converter = self.row_factory.GetConverterForColumns(tuple(return_field_names), table_name, "tuple",
+                                                        self._GetTableDecoders(table_name))
+    result_list = converter(cursor.fetchall())
+    if self.profiler is not None:
+      self.profiler.Record(select_sql, time.perf_counter() - start_time, len(result_list), params=params)
+    return result_list, return_field_names
+
+  # ================ streaming select ================
+  # the Iter* variants are generators pulling rows with fetchmany, so peak
+  # memory is bounded by batch_size instead of the size of the result set
+  def IterSelectFieldFromTable(self, fields, table_name, condition=None,
+                               batch_size=None, yield_batches=False, row_type=None):
+    select_sql, params = self._BuildSelectSQL(fields, table_name, condition)
+    return self._IterSelect(select_sql, params, table_name, batch_size, yield_batches, row_type)
+
+  def IterSelectFieldFromTableAdvanced(self, fields, table_name, sub_condition=None,
+                                       batch_size=None, yield_batches=False, row_type=None):
+    select_sql, params = self._BuildSelectSQLAdvanced(fields, table_name, sub_condition)
+    return self._IterSelect(select_sql, params, table_name, batch_size, yield_batches, row_type)
+
+  def IterRawSelectFieldFromTable(self, fields, table_name, condition=None,
+                                  batch_size=None, yield_batches=False):
+    select_sql, params = self._BuildSelectSQL(fields, table_name, condition)
+    return self._IterSelect(select_sql, params, table_name, batch_size, yield_batches, "tuple")
+
+  def _IterSelect(self, select_sql, params, table_name, batch_size, yield_batches, row_type):
+    if batch_size is None:
+      batch_size = self.select_batch_size
+    if self._cache_generation != self.connector.schema_generation:
+      self.InvalidateStatementCache()
+    if self.query_plan_audit:
+      self._AuditQueryPlan(select_sql, params)
+    cursor = self.connector.conn.cursor()
+    # profiled time covers sqlite only, not the consumer of the rows
+    elapsed = 0.0
+    row_count = 0
+    try:
+      if self.profiler is not None:
+        start_time = time.perf_counter()
+      row_type = self.row_factory.PrepareCursor(cursor, row_type)
+      cursor.execute(select_sql, params)
+      converter = self.row_factory.GetConverter(cursor, table_name, row_type, self._GetTableDecoders(table_name))
+      while True:
+        result_list = cursor.fetchmany(batch_size)
+        if self.profiler is not None:
+          elapsed += time.perf_counter() - start_time
+          row_count += len(result_list)
+        if len(result_list) == 0:
+          break
+        result_list = converter(result_list)
+        if yield_batches:
+          yield result_list
+        else:
+          yield from result_list
+        if self.profiler is not None:
+          start_time = time.perf_counter()
+    finally:
+      cursor.close()
+      if self.profiler is not None:
+        self.profiler.Record(select_sql, elapsed, row_count, params=params)
+
+  # ================ keyset pagination ================
+  def Paginate(self, table_name, fields, page_size=None, condition=None, order_by=None, cursor=None,
+               row_type=None, descending=False):
+    """ yields (rows, cursor_token) pages of table_name in key order
+
+    every page seeks past the last key of the previous one instead of
+    using OFFSET, so walking the whole table stays linear. order_by has
+    to be unique, it defaults to the primary key or rowid. NULL keys sort
+    first, or last when descending. passing a cursor_token back as cursor
+    resumes right after that page
+    """
+    if page_size is None:
+      page_size = self.select_batch_size
+    if page_size <= 0:
+      raise ValueError("page size should be positive, got: {}".format(page_size))
+    if order_by is None:
+      table = self.connector.structure.table_name_dict.get(table_name, None)
+      order_by = (table.GetPrimaryKeyFields() if table is not None else None) or ["rowid"]
+    key_fields = (order_by,) if isinstance(order_by, str) else tuple(order_by)
+    after = self._DecodePageCursor(cursor, key_fields) if cursor is not None else None
+    nullable_keys = self._GetNullableKeys(table_name, key_fields)
+    field_list = [fields] if isinstance(fields, str) else list(fields)
+    # key columns not asked for are selected too and cut off again, a
+    # string like "*" may expand to anything so every key is appended
+    hidden_fields = [k for k in key_fields if isinstance(fields, str) or k not in field_list]
+    resolved_row_type = self.row_factory.default_row_type if row_type is None else row_type
+    SQLRowFactory.CheckRowType(resolved_row_type)
+    if resolved_row_type == "row":
+      raise ValueError("Paginate does not support the row type 'row'")
+    where_sql, where_params = self._CompileCondition(condition, allow_order=False)
+    order_sql = ",".join("{} {}".format(k, "DESC" if descending else "ASC") for k in key_fields)
+    converter = None
+    while True:
+      if self._cache_generation != self.connector.schema_generation:
+        self.InvalidateStatementCache()
+      clauses = [where_sql[len(" WHERE "):]] if where_sql else []
+      params = list(where_params)
+      if after is not None:
+        seek_sql, seek_params = self._BuildSeekCondition(key_fields, after, descending, nullable_keys)
+        clauses.append(seek_sql)
+        params.extend(seek_params)
+      select_sql = "SELECT {} FROM {}{} ORDER BY {} LIMIT ?;".format(
+        ",".join(field_list + hidden_fields), table_name,
+        " WHERE " + " AND ".join("({})".format(c) for c in clauses) if len(clauses) > 0 else "", order_sql)
+      params.append(page_size)
+      if self.profiler is not None:
+        start_time = time.perf_counter()
+      cursor = self.connector.conn.execute(select_sql, params)
+      result_list = cursor.fetchall()
+      if self.profiler is not None:
+        self.profiler.Record(select_sql, time.perf_counter() - start_time, len(result_list), params=params)
+      if len(result_list) == 0:
+        return
+      if converter is None:
+        column_names = tuple(x[0] for x in cursor.description)
+        visible_count = len(column_names) - len(hidden_fields)
+        key_positions = [visible_count + hidden_fields.index(k) if k in hidden_fields else field_list.index(k)
+                         for k in key_fields]
+        converter = self.row_factory.GetConverterForColumns(column_names[:visible_count], table_name, resolved_row_type,
+                                                            self._GetTableDecoders(table_name))
+      after = [result_list[-1][p] for p in key_positions]
+      if len(hidden_fields) > 0:
+        result_list = [row[:visible_count] for row in result_list]
+      yield converter(result_list), json.dumps({"order_by": list(key_fields),
+                                                 "after": [SQLite3Operator._EncodeCursorValue(v) for v in after]})
+      if len(result_list) < page_size:
+        return
+
+  def _GetNullableKeys(self, table_name, key_fields):
+    """ key fields that may hold NULL, expressions count as nullable """
+    table = self.connector.structure.table_name_dict.get(table_name, None)
+    if table is None:
+      return set(k for k in key_fields if k.lower() not in ("rowid", "oid", "_rowid_"))
+    primary_keys = table.GetPrimaryKeyFields()
+    nullable = set()
+    for k in key_fields:
+      if k.lower() in ("rowid", "oid", "_rowid_"):
+        continue
+      field = table.field_name_dict.get(k, None)
+      if field is not None:
+        if field.not_null or field.auto_increment:
+          continue
+        # INTEGER PRIMARY KEY is the rowid
+        if primary_keys == [k] and field.data_type_str.upper() == "INTEGER":
+          continue
+      nullable.add(k)
+    return nullable
+
+  @staticmethod
+  def _BuildSeekCondition(key_fields, after, descending, nullable_keys=()):
+    """ rows strictly after the key values in the given order """
+    op = "<" if descending else ">"
+    if None in after or (descending and any(k in nullable_keys for k in key_fields)):
+      return SQLite3Operator._BuildNullableSeekCondition(key_fields, after, descending, nullable_keys)
+    if len(key_fields) == 1:
+      return "{} {} ?".format(key_fields[0], op), [after[0]]
+    if sqlite3.sqlite_version_info >= (3, 15, 0):
+      return "({}) {} ({})".format(",".join(key_fields), op, ",".join("?" * len(key_fields))), list(after)
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y)
+    terms = []
+    params = []
+    for i in range(len(key_fields)):
+      terms.append(" AND ".join(["{} = ?".format(k) for k in key_fields[:i]] + ["{} {} ?".format(key_fields[i], op)]))
+      params.extend(after[:i + 1])
+    return " OR ".join("({})".format(t) for t in terms), params
+
+  @staticmethod
+  def _BuildNullableSeekCondition(key_fields, after, descending, nullable_keys):
+    # NULL sorts before every value, so it is passed first ascending and
+    # reached last descending, comparisons with NULL need IS / IS NOT
+    terms = []
+    params = []
+    for i, (k, v) in enumerate(zip(key_fields, after)):
+      if v is None:
+        if descending:
+          continue
+        term, term_params = "{} IS NOT NULL".format(k), []
+      elif descending and k in nullable_keys:
+        term, term_params = "({0} < ? OR {0} IS NULL)".format(k), [v]
+      else:
+        term, term_params = "{} {} ?".format(k, "<" if descending else ">"), [v]
+      equal_terms = ["{} IS NULL".format(e) if ev is None else "{} = ?".format(e)
+                     for e, ev in zip(key_fields[:i], after[:i])]
+      terms.append(" AND ".join(equal_terms + [term]))
+      params.extend([ev for ev in after[:i] if ev is not None] + term_params)
+    if len(terms) == 0:
+      return "0", []
+    return " OR ".join("({})".format(t) for t in terms), params
+
+  @staticmethod
+  def _EncodeCursorValue(value):
+    if isinstance(value, bytes):
+      return {"blob": base64.b64encode(value).decode("ascii")}
+    return value
+
+  @staticmethod
+  def _DecodeCursorValue(value):
+    if isinstance(value, dict):
+      return base64.b64decode(value["blob"])
+    return value
+
+  @staticmethod
+  def _DecodePageCursor(cursor, key_fields):
+    try:
+      state = json.loads(cursor)
+      after = [SQLite3Operator._DecodeCursorValue(v) for v in state["after"]]
+      order_by = tuple(state["order_by"])
+    except (ValueError, TypeError, KeyError):
+      raise ValueError("invalid page cursor: {!r}".format(cursor))
+    if order_by != key_fields or len(after) != len(key_fields):
+      raise ValueError("page cursor ordered by {} does not match {}".format(list(order_by), list(key_fields)))
+    return after
+
+  # ================ row cache ================
+  def EnableRowCache(self, table_name, max_size=1024, ttl=None):
+    """ read-through cache of SelectByPrimaryKey, kept coherent with the
+        writes issued through this operator only """
+    key_fields = self.connector.structure.table_name_dict[table_name].GetPrimaryKeyFields()
+    if len(key_fields) == 0:
+      raise ValueError("row cache needs a primary key, table: {}".format(table_name))
+    self.row_caches[table_name] = SQLRowCache(table_name, key_fields, max_size, ttl)
+
+  def DisableRowCache(self, table_name):
+    self.row_caches.pop(table_name, None)
+
+  def GetRowCacheStats(self):
+    return {table_name: cache.GetStats() for table_name, cache in self.row_caches.items()}
+
+  def SelectByPrimaryKey(self, table_name, key):
+    """ returns the row dict whose primary key equals key (a value, or a
+        tuple for composite keys) or None, served from the row cache when
+        it is enabled for the table """
+    if not isinstance(key, tuple):
+      key = (key,)
+    cache = self.row_caches.get(table_name, None)
+    if cache is not None:
+      row = cache.Get(key)
+      if row is not SQLRowCache.MISS:
+        return dict(row)
+      key_fields = cache.key_fields
+    else:
+      key_fields = self.connector.structure.table_name_dict[table_name].GetPrimaryKeyFields()
+    if len(key_fields) != len(key):
+      raise ValueError("primary key of {} is {}, got: {}".format(table_name, key_fields, key))
+    condition = SQLCondition.And(*[SQLCondition.Eq(k, v) for k, v in zip(key_fields, key)])
+    rows = self.SelectFieldFromTable("*", table_name, condition, row_type="dict")
+    if len(rows) == 0:
+      return None
+    if cache is not None:
+      cache.Put(key, rows[0])
+      return dict(rows[0])
+    return rows[0]
+
+  def _FlushRowCaches(self):
+    for cache in self.row_caches.values():
+      cache.Clear()
+
+  def _InvalidateRowCacheForInsert(self, table_name, or_condition, d=None):
+    cache = self.row_caches.get(table_name, None)
+    if cache is None or "REPLACE" not in or_condition.upper():
+      # without REPLACE an insert never changes an existing row
+      return
+    table = self.connector.structure.table_name_dict[table_name]
+    has_other_unique = any(field.unique for field in table.fields) or any(index.unique for index in table.indexes)
+    if d is not None and not has_other_unique and all(k in d for k in cache.key_fields):
+      cache.Invalidate([tuple(d[k] for k in cache.key_fields)])
+    else:
+      cache.Clear()
+
+  def _InvalidateRowCacheForCondition(self, table_name, condition):
+    cache = self.row_caches.get(table_name, None)
+    if cache is None:
+      return
+    keys = SQLite3Operator._ExtractKeysFromCondition(condition, cache.key_fields)
+    if keys is None:
+      cache.Clear()
+    else:
+      cache.Invalidate(keys)
+
+  @staticmethod
+  def _ExtractKeysFromCondition(condition, key_fields):
+    """ list of key tuples touched by an SQLCondition made of primary key
+        equalities (Eq / In / And of them), None when it can not tell """
+    equalities = {}
+    pending = [condition]
+    while len(pending) > 0:
+      item = pending.pop()
+      if getattr(item, "joiner", None) == "AND":
+        pending.extend(item.conditions)
+      elif getattr(item, "op", None) == "=":
+        equalities.setdefault(item.field, []).append((item.value,))
+      elif getattr(item, "values", None) is not None and hasattr(item, "field"):
+        equalities.setdefault(item.field, []).append(item.values)
+    if any(k not in equalities or len(equalities[k]) != 1 for k in key_fields):
+      return None
+    return list(itertools.product(*[equalities[k][0] for k in key_fields]))
+
+  # ================ compression dictionaries ================
+  CODEC_DICTIONARY_TABLE = "_codec_dictionaries"
+
+  def TrainCompressionDictionary(self, table_name, field_name, samples=None, size=16384, sample_count=1000):
+    """ trains a zlib dictionary for a "COMPRESS zlib DICT" field from
+    samples, or from up to sample_count values already stored
+
+    the dictionary is kept in the database so later connections decode
+    with it, values written afterwards are compressed against it. returns
+    the dictionary id or None when the samples share nothing
+    """
+    field = self.connector.structure.table_name_dict[table_name].field_name_dict[field_name]
+    if field.codec is None or not field.codec.use_dict:
+      raise ValueError("{}.{} is not declared with COMPRESS zlib DICT".format(table_name, field_name))
+    if samples is None:
+      self._LoadCompressionDictionaries()
+      cursor = self.connector.conn.execute("SELECT {0} FROM {1} WHERE {0} IS NOT NULL ORDER BY random() LIMIT ?".format(
+        field_name, table_name), (sample_count,))
+      samples = [field.ParseFromSQLTextData(row[0]) for row in cursor.fetchall()]
+    data = TrainDictionary(samples, size)
+    if len(data) == 0:
+      return None
+    dictionary_id = RegisterDictionary(data)
+    self._CreateCompressionDictionaryTable()
+    self.connector.conn.execute("INSERT INTO {} (dictionary_id, table_name, field_name, data) VALUES (?,?,?,?)".format(
+      SQLite3Operator.CODEC_DICTIONARY_TABLE), (dictionary_id, table_name, field_name, data))
+    # compiled statements hold the old encoders
+    self.InvalidateStatementCache()
+    return dictionary_id
+
+  def _CreateCompressionDictionaryTable(self):
+    self.connector.conn.execute("CREATE TABLE IF NOT EXISTS {} (dictionary_id INTEGER, table_name TEXT, "
+                                "field_name TEXT, data BLOB)".format(SQLite3Operator.CODEC_DICTIONARY_TABLE))
+
+  def _HasCompressionDictionaryTable(self):
+    return self.connector.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                                       (SQLite3Operator.CODEC_DICTIONARY_TABLE,)).fetchone() is not None
+
+  def _GetCompressionDictionaryId(self, table_name, field_name):
+    """ the most recent dictionary trained for the field, None before any """
+    if self.connector.conn == None or not self._HasCompressionDictionaryTable():
+      return None
+    row = self.connector.conn.execute(
+      "SELECT data FROM {} WHERE table_name = ? AND field_name = ? ORDER BY rowid DESC LIMIT 1".format(
+        SQLite3Operator.CODEC_DICTIONARY_TABLE), (table_name, field_name)).fetchone()
+    if row is None:
+      return None
+    return RegisterDictionary(row[0])
+
+  def _LoadCompressionDictionaries(self):
+    """ registers every dictionary stored in the database for decoding """
+    if self.connector.conn == None or not self._HasCompressionDictionaryTable():
+      return
+    for (data,) in self.connector.conn.execute("SELECT data FROM {}".format(SQLite3Operator.CODEC_DICTIONARY_TABLE)):
+      RegisterDictionary(data)
+
+  # ================ parallel scan ================
+  def ParallelScan(self, table_name, fields, func, reduce_func=None, initial=None, workers=None,
+                   partitions=None, key_field=None, row_type=None, batch_size=None, commit=False):
+    """ splits table_name into key ranges and runs func(rows) on each one
+        in a worker process with its own connection, the partial results
+        are folded with reduce_func(accumulated, partial) in partition
+        order, or returned as a list when reduce_func is None. workers only
+        see committed rows, pending implicit work raises unless commit is
+        True, an explicit Transaction / Savepoint always raises """
+    if self._transaction_depth > 0:
+      raise RuntimeError("ParallelScan can not run inside a Transaction or Savepoint, workers only see committed rows")
+    if self._IsDeferred():
+      self.write_behind.Flush()
+    elif self.connector.conn != None and self.connector.conn.in_transaction:
+      if not commit:
+        raise RuntimeError("ParallelScan workers do not see the pending writes on {}, commit first "
+                           "or pass commit=True".format(self.connector.path))
+      self.Commit()
+    return RunParallelScan(type(self), self.connector, table_name, fields, func, reduce_func, initial,
+                           workers, partitions, key_field, row_type or self.row_factory.default_row_type,
+                           batch_size or self.select_batch_size)
+
+  # ================ columnar select ================
+  def SelectColumns(self, fields, table_name, condition=None, chunk_size=None, use_numpy=None, return_masks=False):
+    """ select into typed column buffers, returns {field_name: column}
+
+    buffer types follow SQLField.data_class: array.array for numbers and
+    booleans, lists for TEXT / BLOB / expressions, numpy arrays instead
+    when numpy is installed (use_numpy=None) or requested. NULL in a typed
+    column is stored as 0, with return_masks=True the call returns
+    (columns, masks) where masks holds one mask per column containing NULL
+    """
+    use_numpy = ResolveUseNumpy(use_numpy)
+    if chunk_size is None:
+      chunk_size = self.select_batch_size
+    select_sql, params = self._BuildSelectSQL(fields, table_name, condition)
+    if self.query_plan_audit:
+      self._AuditQueryPlan(select_sql, params)
+    field_name_dict = self.connector.structure.table_name_dict[table_name].field_name_dict
+    if self.profiler is not None:
+      start_time = time.perf_counter()
+    cursor = self.connector.conn.cursor()
+    try:
+      cursor.execute(select_sql, params)
+      buffers = []
+      decoders = []
+      for description in cursor.description:
+        field = field_name_dict.get(description[0], None)
+        buffers.append(SQLColumnBuffer(description[0], field.data_class if field is not None else None))
+        decoders.append(field.GetDecoder() if field is not None else None)
+      if any(decoder is not None for decoder in decoders):
+        self._GetTableDecoders(table_name)    # loads trained dictionaries
+      while True:
+        result_list = cursor.fetchmany(chunk_size)
+        if len(result_list) == 0:
+          break
+        for buffer, decoder, values in zip(buffers, decoders, zip(*result_list)):
+          buffer.Extend(values if decoder is None else [decoder(v) for v in values])
+    finally:
+      cursor.close()
+    if self.profiler is not None:
+      self.profiler.Record(select_sql, time.perf_counter() - start_time,
+                           len(buffers[0]) if len(buffers) > 0 else 0, params=params)
+    columns = {buffer.name: buffer.Finish(use_numpy) for buffer in buffers}
+    if not return_masks:
+      return columns
+    masks = {buffer.name: buffer.GetMask() for buffer in buffers if buffer.has_null}
+    return columns, masks
+
+  # ================ query plan ================
+  def ExplainQueryPlan(self, sql, params=()):
+    """ returns the detail strings of EXPLAIN QUERY PLAN """
+    cursor = self.connector.conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [p[-1] for p in cursor.fetchall()]
+
+  def _AuditQueryPlan(self, sql, params=()):
+    if sql in self._audited_sqls:
+      return
+    if len(self._audited_sqls) >= 10000:
+      self._audited_sqls.clear()
+    self._audited_sqls.add(sql)
+    for detail in self.ExplainQueryPlan(sql, params):
+      tokens = detail.split()
+      if len(tokens) < 2 or tokens[0] != "SCAN":
+        continue
+      # "SCAN t", "SCAN TABLE t" on sqlite before 3.36
+      table_name = tokens[2] if tokens[1] == "TABLE" and len(tokens) > 2 else tokens[1]
+      row_count = self._EstimateTableRows(table_name)
+      if row_count is not None and row_count >= self.audit_large_table_rows:
+        self.logger.warning("full scan of {} (~{} rows) in {}: {}".format(
+                            table_name, row_count, self.connector.path, sql))
+
+  def _EstimateTableRows(self, table_name):
+    if table_name not in self.connector.structure.table_name_dict:
+      return None
+    row_count = self._table_row_estimates.get(table_name)
+    if row_count is None:
+      # max(rowid) is a single b-tree seek, close enough for the audit
+      try:
+        row_count = self.connector.conn.execute("SELECT max(rowid) FROM {}".format(table_name)).fetchone()[0]
+      except sqlite3.OperationalError:
+        row_count = self.connector.conn.execute("SELECT count(*) FROM {}".format(table_name)).fetchone()[0]
+      row_count = row_count or 0
+      self._table_row_estimates[table_name] = row_count
+    return row_count
+
+  def _BuildSelectSQL(self, fields, table_name, condition=None):
+    """ returns (select_sql, params), condition is a raw where string, an
+        SQLCondition or an SQLQuery """
+    if isinstance(fields, (list, tuple)):
+      fields = ",".join(fields)
+    where_sql, params = self._CompileCondition(condition)
+    select_sql = "SELECT {} FROM {}{};".format(fields, table_name, where_sql)
+    return select_sql, params
+
+  def _BuildSelectSQLAdvanced(self, fields, table_name, sub_condition=None):
+    """ sub_condition is a raw sql suffix or an SQLQuery """
     if isinstance(fields, (list, tuple)):
       fields = ",".join(fields)
-    
     select_sql = "SELECT {} FROM {}".format(fields, table_name)
-    if condition is not None:
-      select_sql += " WHERE {}".format(condition)
+    params = ()
+    if isinstance(sub_condition, str):
+      select_sql += sub_condition
+    elif sub_condition is not None:
+      sub_sql, params = sub_condition.CompileClause()
+      select_sql += sub_sql
     select_sql += ";"
-    cursor = self.connector.conn.cursor()
-    cursor.execute(select_sql)
-    result_list = cursor.fetchall()
-    
-    description = cursor.description
-    return_field_names = list(map(lambda x: x[0], description))
-    return result_list, return_field_names
+    return select_sql, params
+
+  @staticmethod
+  def _CompileCondition(condition, allow_order=True):
+    """ returns (" WHERE ...", params) for None, a raw where string, an
+        SQLCondition or an SQLQuery """
+    if condition is None:
+      return "", ()
+    if isinstance(condition, str):
+      return " WHERE {}".format(condition), ()
+    if not allow_order and getattr(condition, "HasOrderOrLimit", None) is not None and condition.HasOrderOrLimit():
+      raise ValueError("order by / limit is only supported by select")
+    return condition.CompileClause()
 
   def GetLastInsertRowID(self):
     cursor = self.connector.conn.cursor()
@@ -159,6 +1367,8 @@ class SQLite3Operator:
     
   def Execute(self, sql_str):
     self.connector.conn.execute(sql_str)
+    # raw sql may touch any table
+    self._FlushRowCaches()
 
 if __name__ == "__main__":
   from sqlite_structure import *
@@ -0,0 +1,120 @@
+"""
+SQLParallel
+
+partitioned table scans spread over a process pool
+
+- the table is split into key ranges: an INTEGER PRIMARY KEY or rowid is
+  split arithmetically between its min and max, any other single column
+  key is split at evenly spaced ORDER BY offsets. rows whose key is NULL
+  are scanned as a partition of their own
+- every worker unpickles the connector, which reconnects to the same
+  file (SQLite3Connector.__setstate__), and scans one range at a time.
+  an in memory working copy is flushed to its file first
+- func(rows) runs in the worker on an iterator over one partition and
+  its return value is sent back, reduce_func(accumulated, partial)
+  folds them in partition order in the calling process
+
+func has to be picklable, i.e. a module level function
+"""
+
+import concurrent.futures
+import importlib
+import os
+from sqlite_condition import SQLCondition
+
+def GetDefaultPartitionKey(connector, table_name: str) -> str:
+  """ the single column primary key of the table, rowid otherwise """
+  table = connector.structure.table_name_dict.get(table_name, None) if connector.structure is not None else None
+  if table is not None:
+    key_fields = table.GetPrimaryKeyFields()
+    if len(key_fields) == 1:
+      return key_fields[0]
+  return "rowid"
+
+def GetPartitionRanges(conn, table_name: str, key_field: str, partitions: int) -> list:
+  """ returns [(low, high)] covering the table, low inclusive, high
+      exclusive, None leaves that side open. a None entry instead of a
+      range stands for the rows whose key is NULL """
+  low, high, count, total = conn.execute("SELECT min({0}), max({0}), count({0}), count(*) FROM {1}".format(
+    key_field, table_name)).fetchone()
+  if total == 0:
+    return []
+  # (None, None) scans the whole table, NULL keys included
+  if count == 0 or partitions <= 1:
+    return [(None, None)]
+  partitions = max(1, min(partitions, count))
+  if isinstance(low, int) and isinstance(high, int):
+    step = (high - low + 1) / partitions
+    bounds = sorted(set(low + int(step * i) for i in range(1, partitions)))
+  else:
+    bounds = []
+    for i in range(1, partitions):
+      row = conn.execute("SELECT {0} FROM {1} WHERE {0} IS NOT NULL ORDER BY {0} LIMIT 1 OFFSET ?".format(
+        key_field, table_name), (count * i // partitions,)).fetchone()
+      if row is not None and (len(bounds) == 0 or row[0] > bounds[-1]):
+        bounds.append(row[0])
+  if len(bounds) == 0:
+    return [(None, None)]
+  edges = [None] + bounds + [None]
+  ranges = [(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+  # a range never matches NULL, not even an open one
+  if count < total:
+    ranges.append(None)
+  return ranges
+
+def _ScanPartition(operator_class, connector, table_name, fields, key_field, key_range, func, row_type, batch_size):
+  # runs in a worker process, the connector reconnected while unpickling
+  operator = operator_class(connector)
+  try:
+    if key_range is None:
+      condition = SQLCondition.IsNull(key_field)
+    elif key_range == (None, None):
+      condition = None
+    else:
+      condition = SQLCondition.Range(key_field, *key_range)
+    rows = operator.IterSelectFieldFromTable(fields, table_name, condition,
+                                             batch_size=batch_size, row_type=row_type)
+    return func(rows)
+  finally:
+    connector.conn.close()
+    connector.conn = None
+
+def RunParallelScan(operator_class, connector, table_name: str, fields, func, reduce_func=None, initial=None,
+                    workers: int=None, partitions: int=None, key_field: str=None,
+                    row_type=None, batch_size: int=1000):
+  if connector.path == ":memory:":
+    raise ValueError("ParallelScan needs a database file, :memory: is private to one connection")
+  if connector.conn is None:
+    raise RuntimeError("ParallelScan needs a connected database")
+  # workers read the file, an in memory working copy writes it through first
+  connector.FlushToDisk()
+  workers = workers or os.cpu_count() or 1
+  # a few partitions per worker so a skewed range does not stall the pool
+  partitions = partitions or workers * 4
+  key_field = key_field or GetDefaultPartitionKey(connector, table_name)
+  ranges = GetPartitionRanges(connector.conn, table_name, key_field, partitions)
+
+  accumulated = initial
+  partials = []
+  if len(ranges) == 0:
+    return accumulated if reduce_func is not None else partials
+  first = initial is None
+  # importing the package in a fresh worker registers the flat module
+  # names (sqlite_structure, ...) the pickled structure refers to
+  with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                              initializer=importlib.import_module,
+                                              initargs=("SQLiteWrapper",)) as executor:
+    futures = [executor.submit(_ScanPartition, operator_class, connector, table_name, fields, key_field, key_range,
+                               func, row_type, batch_size)
+               for key_range in ranges]
+    for future in futures:
+      partial = future.result()
+      if reduce_func is None:
+        partials.append(partial)
+      elif first:
+        # like functools.reduce without an initial value
+        accumulated = partial
+        first = False
+      else:
+        accumulated = reduce_func(accumulated, partial)
+  return accumulated if reduce_func is not None else partials
@@ -0,0 +1,113 @@
+"""
+SQLPragma
+
+named PRAGMA tuning profiles applied by SQLite3Connector at connect time
+
+a profile is either one of the names in PRAGMA_PROFILES or a custom dict
+{pragma_name: value}, a custom dict may also carry "base": profile_name
+to override a few values of a named profile
+"""
+
+import logging
+
+# applied in this order, page_size has to come before journal_mode=WAL
+PRAGMA_ORDER = ("page_size", "journal_mode", "synchronous", "cache_size",
+                "mmap_size", "temp_store", "busy_timeout")
+
+PRAGMA_PROFILES = {
+  "durable": {
+    "journal_mode": "WAL",
+    "synchronous": "FULL",
+    "cache_size": -8000,          # negative means KiB, 8MB
+    "mmap_size": 0,
+    "temp_store": "DEFAULT",
+    "busy_timeout": 5000,
+  },
+  "balanced": {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,
+    "mmap_size": 268435456,       # 256MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+  },
+  "bulk-load": {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -256000,
+    "mmap_size": 0,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+  },
+  "read-heavy": {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -128000,
+    "mmap_size": 1073741824,      # 1GB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+  },
+}
+
+# values used by BulkLoadMode, journal_mode is handled separately
+BULK_LOAD_PRAGMAS = {
+  "synchronous": "OFF",
+  "cache_size": -256000,
+  "temp_store": "MEMORY",
+}
+
+_SYMBOLIC_VALUES = {
+  "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+  "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+}
+
+logger = logging.getLogger("SQLPragma")
+
+def ResolvePragmaProfile(profile) -> dict:
+  """ returns {pragma_name: value} ordered by PRAGMA_ORDER """
+  if profile is None:
+    return {}
+  if isinstance(profile, str):
+    if profile not in PRAGMA_PROFILES:
+      raise ValueError("unknown pragma profile: {}, choose from {}".format(profile, list(PRAGMA_PROFILES)))
+    pragmas = dict(PRAGMA_PROFILES[profile])
+  elif isinstance(profile, dict):
+    pragmas = dict(ResolvePragmaProfile(profile["base"])) if "base" in profile else {}
+    pragmas.update({k: v for k, v in profile.items() if k != "base"})
+  else:
+    raise ValueError("pragma profile should be a name or a dict, got: {}".format(type(profile)))
+  for name in pragmas:
+    if name not in PRAGMA_ORDER:
+      raise ValueError("not supported pragma in profile: {}".format(name))
+  return {name: pragmas[name] for name in PRAGMA_ORDER if name in pragmas}
+
+def ReadPragma(conn, name):
+  row = conn.execute("PRAGMA {}".format(name)).fetchone()
+  return None if row is None else row[0]
+
+def ApplyPragmas(conn, pragmas: dict, is_memory: bool=False) -> dict:
+  """ sets every pragma then reads it back, a value that did not take
+      effect is logged. returns {pragma_name: value read back} """
+  applied = {}
+  for name, value in pragmas.items():
+    if isinstance(value, str):
+      value = value.upper()
+    conn.execute("PRAGMA {}={}".format(name, value))
+    actual = ReadPragma(conn, name)
+    applied[name] = actual
+    if not PragmaValueMatches(name, value, actual):
+      if is_memory and name in ("journal_mode", "mmap_size"):
+        logger.debug("pragma {} not applicable to :memory:, got {}".format(name, actual))
+      elif name == "page_size":
+        logger.info("pragma page_size={} only applies to a new database or after VACUUM, got {}".format(value, actual))
+      else:
+        logger.warning("pragma {}={} did not take effect, got {}".format(name, value, actual))
+  return applied
+
+def PragmaValueMatches(name, expected, actual) -> bool:
+  if isinstance(expected, str):
+    expected = expected.upper()
+    expected = _SYMBOLIC_VALUES.get(name, {}).get(expected, expected)
+  if isinstance(actual, str):
+    actual = actual.upper()
+  return expected == actual
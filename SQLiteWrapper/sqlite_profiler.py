@@ -0,0 +1,171 @@
+"""
+SQLProfiler
+
+per statement shape metrics of an SQLite3Operator
+
+- shape: the sql text with literals replaced by ?, so raw string
+  conditions with different values fold into one entry
+- count, total / max latency and p50 / p90 / p99 from a bounded sample
+  reservoir, rows returned and rows affected
+- statements seen by sqlite itself through set_trace_callback
+- slow query log with the EXPLAIN QUERY PLAN of the statement
+
+Snapshot() returns plain dicts, ToPrometheusText() the text exposition
+format. the operator only calls into the profiler when one is enabled
+"""
+
+import logging
+import random
+import re
+import threading
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![A-Za-z0-9_.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+class _ShapeStats:
+  __slots__ = ("count", "total_time", "max_time", "rows_returned", "rows_affected", "samples")
+
+  def __init__(self) -> None:
+    self.count = 0
+    self.total_time = 0.0
+    self.max_time = 0.0
+    self.rows_returned = 0
+    self.rows_affected = 0
+    self.samples = []
+
+class SQLProfiler:
+  def __init__(self, slow_query_threshold: float=None, explain_func=None,
+               max_samples: int=1024, max_shapes: int=4096) -> None:
+    self.slow_query_threshold = slow_query_threshold
+    self.explain_func = explain_func
+    self.max_samples = max_samples
+    self.max_shapes = max_shapes
+    self.shapes = {}          # shape -> _ShapeStats
+    self.traced = {}          # shape -> count, from set_trace_callback
+    self.slow_queries = []    # most recent slow queries, bounded
+    self._shape_of_sql = {}   # sql text -> shape, avoids running the regexes per call
+    self._lock = threading.Lock()
+    self.logger = logging.getLogger("SQLProfiler")
+
+  def __repr__(self) -> str:
+    return "<SQLProfiler: {} shapes at {:016X}>".format(len(self.shapes), id(self))
+
+  def GetShape(self, sql: str) -> str:
+    shape = self._shape_of_sql.get(sql, None)
+    if shape is None:
+      shape = _STRING_LITERAL.sub("?", sql)
+      shape = _NUMBER_LITERAL.sub("?", shape)
+      shape = _WHITESPACE.sub(" ", shape).strip()
+      if len(self._shape_of_sql) >= self.max_shapes * 4:
+        self._shape_of_sql.clear()
+      self._shape_of_sql[sql] = shape
+    return shape
+
+  def Record(self, sql: str, seconds: float, rows_returned: int=0, rows_affected: int=0, params=None) -> None:
+    shape = self.GetShape(sql)
+    with self._lock:
+      stats = self.shapes.get(shape, None)
+      if stats is None:
+        if len(self.shapes) >= self.max_shapes:
+          shape = "<other>"
+          stats = self.shapes.setdefault(shape, _ShapeStats())
+        else:
+          stats = self.shapes[shape] = _ShapeStats()
+      stats.count += 1
+      stats.total_time += seconds
+      stats.max_time = max(stats.max_time, seconds)
+      stats.rows_returned += rows_returned
+      if rows_affected > 0:
+        stats.rows_affected += rows_affected
+      if len(stats.samples) < self.max_samples:
+        stats.samples.append(seconds)
+      else:
+        # reservoir sampling keeps the percentiles unbiased
+        slot = random.randrange(stats.count)
+        if slot < self.max_samples:
+          stats.samples[slot] = seconds
+    if self.slow_query_threshold is not None and seconds >= self.slow_query_threshold:
+      self._LogSlowQuery(sql, seconds, params)
+
+  def RecordTrace(self, sql: str) -> None:
+    """ set_trace_callback target """
+    shape = self.GetShape(sql)
+    with self._lock:
+      self.traced[shape] = self.traced.get(shape, 0) + 1
+
+  def _LogSlowQuery(self, sql, seconds, params) -> None:
+    plan = []
+    if self.explain_func is not None and params is not None:
+      try:
+        plan = self.explain_func(sql, params)
+      except Exception as e:
+        plan = ["<explain failed: {}>".format(e)]
+    with self._lock:
+      self.slow_queries.append({"sql": sql, "seconds": seconds, "plan": plan})
+      del self.slow_queries[:-100]
+    self.logger.warning("slow query {:.3f}ms: {}\n  plan: {}".format(seconds * 1000, sql, " | ".join(plan)))
+
+  def Reset(self) -> None:
+    with self._lock:
+      self.shapes.clear()
+      self.traced.clear()
+      self.slow_queries.clear()
+
+  @staticmethod
+  def _Percentile(sorted_samples, ratio):
+    if len(sorted_samples) == 0:
+      return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(ratio * len(sorted_samples)))]
+
+  def Snapshot(self) -> dict:
+    with self._lock:
+      statements = {}
+      for shape, stats in self.shapes.items():
+        samples = sorted(stats.samples)
+        statements[shape] = {
+          "count": stats.count,
+          "total_time": stats.total_time,
+          "mean_time": stats.total_time / stats.count if stats.count > 0 else 0.0,
+          "max_time": stats.max_time,
+          "p50_time": SQLProfiler._Percentile(samples, 0.5),
+          "p90_time": SQLProfiler._Percentile(samples, 0.9),
+          "p99_time": SQLProfiler._Percentile(samples, 0.99),
+          "rows_returned": stats.rows_returned,
+          "rows_affected": stats.rows_affected,
+        }
+      return {
+        "statements": statements,
+        "traced": dict(self.traced),
+        "slow_queries": list(self.slow_queries),
+      }
+
+  def ToPrometheusText(self, prefix: str="sqlite_wrapper") -> str:
+    snapshot = self.Snapshot()
+    lines = []
+
+    def Escape(text):
+      return text.replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+    metrics = (
+      ("statements_total", "counter", "count", "statements executed through the operator"),
+      ("statement_seconds_total", "counter", "total_time", "time spent in statements"),
+      ("statement_rows_returned_total", "counter", "rows_returned", "rows returned by statements"),
+      ("statement_rows_affected_total", "counter", "rows_affected", "rows changed by statements"),
+    )
+    for name, metric_type, key, help_text in metrics:
+      lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+      lines.append("# TYPE {}_{} {}".format(prefix, name, metric_type))
+      for shape, stats in snapshot["statements"].items():
+        lines.append('{}_{}{{statement="{}"}} {}'.format(prefix, name, Escape(shape), stats[key]))
+    lines.append("# HELP {}_statement_seconds statement latency quantiles".format(prefix))
+    lines.append("# TYPE {}_statement_seconds summary".format(prefix))
+    for shape, stats in snapshot["statements"].items():
+      for quantile, key in (("0.5", "p50_time"), ("0.9", "p90_time"), ("0.99", "p99_time")):
+        lines.append('{}_statement_seconds{{statement="{}",quantile="{}"}} {}'.format(
+                     prefix, Escape(shape), quantile, stats[key]))
+    lines.append("# HELP {}_traced_statements_total statements seen by the sqlite trace callback".format(prefix))
+    lines.append("# TYPE {}_traced_statements_total counter".format(prefix))
+    for shape, count in snapshot["traced"].items():
+      lines.append('{}_traced_statements_total{{statement="{}"}} {}'.format(prefix, Escape(shape), count))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,86 @@
+"""
+SQLRowCache
+
+read-through LRU cache of whole rows keyed by the primary key columns of
+one table, with optional ttl. SQLite3Operator keeps it coherent with its
+own writes: key based writes drop single keys, anything it can not map to
+keys flushes the table cache
+"""
+
+import collections
+import threading
+import time
+
+class SQLRowCache:
+  MISS = object()
+
+  def __init__(self, table_name: str, key_fields: list, max_size: int=1024, ttl: float=None) -> None:
+    self.table_name = table_name
+    self.key_fields = tuple(key_fields)
+    self.max_size = max_size
+    self.ttl = ttl
+    self.entries = collections.OrderedDict()   # key tuple -> (row, expire_time)
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+    self.invalidations = 0
+    self.flushes = 0
+
+  def __repr__(self) -> str:
+    return "<SQLRowCache: '{}' {}/{} at {:016X}>".format(self.table_name, len(self.entries), self.max_size, id(self))
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def Get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return SQLRowCache.MISS
+      row, expire_time = entry
+      if expire_time is not None and time.monotonic() >= expire_time:
+        del self.entries[key]
+        self.expirations += 1
+        self.misses += 1
+        return SQLRowCache.MISS
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return row
+
+  def Put(self, key, row) -> None:
+    expire_time = time.monotonic() + self.ttl if self.ttl is not None else None
+    with self.lock:
+      self.entries[key] = (row, expire_time)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_size:
+        self.entries.popitem(last=False)
+        self.evictions += 1
+
+  def Invalidate(self, keys) -> None:
+    with self.lock:
+      for key in keys:
+        if self.entries.pop(key, None) is not None:
+          self.invalidations += 1
+
+  def Clear(self) -> None:
+    with self.lock:
+      if len(self.entries) > 0:
+        self.entries.clear()
+      self.flushes += 1
+
+  def GetStats(self) -> dict:
+    total = self.hits + self.misses
+    return {
+      "size": len(self.entries),
+      "max_size": self.max_size,
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_rate": self.hits / total if total > 0 else 0.0,
+      "evictions": self.evictions,
+      "expirations": self.expirations,
+      "invalidations": self.invalidations,
+      "flushes": self.flushes,
+    }
@@ -0,0 +1,151 @@
+"""
+SQLRowFactory
+
+turns the raw tuples of a cursor into the row representation asked by the
+caller, every converter is built once per query from cursor.description
+
+supported row types
+- "dict": {field_name: value}, the historical default
+- "tuple": the raw tuples returned by sqlite3
+- "namedtuple": collections.namedtuple generated per table and column set
+- "slots": plain class with __slots__ generated per table and column set
+- "row": sqlite3.Row, set as the cursor row_factory before execution
+"""
+
+import collections
+import keyword
+import sqlite3
+
+ROW_TYPES = ("dict", "tuple", "namedtuple", "slots", "row")
+
+class SQLRowFactory:
+  def __init__(self, default_row_type: str="dict") -> None:
+    SQLRowFactory.CheckRowType(default_row_type)
+    self.default_row_type = default_row_type
+    self.class_cache = {}   # (row_type, table_name, column_names) -> class
+
+  def __repr__(self) -> str:
+    return "<SQLRowFactory: '{}' at {:016X}>".format(self.default_row_type, id(self))
+
+  def PrepareCursor(self, cursor, row_type=None):
+    """ should be called before execute, returns the resolved row type """
+    if row_type is None:
+      row_type = self.default_row_type
+    else:
+      SQLRowFactory.CheckRowType(row_type)
+    if row_type == "row":
+      cursor.row_factory = sqlite3.Row
+    return row_type
+
+  def GetConverter(self, cursor, table_name, row_type, decoders=None):
+    """ returns a function mapping a list of fetched rows to a list of
+        row_type objects, should be called after execute. decoders is
+        {column_name: SQLField.GetDecoder()} of the columns to decode """
+    column_names = tuple(x[0] for x in cursor.description)
+    if row_type == "row":
+      if decoders and any(name in decoders for name in column_names):
+        raise ValueError("row type 'row' can not decode the compressed columns of {}".format(table_name))
+      return SQLRowFactory._Identity
+    return self.GetConverterForColumns(column_names, table_name, row_type, decoders)
+
+  def GetConverterForColumns(self, column_names, table_name, row_type, decoders=None):
+    """ same as GetConverter for rows of plain tuples holding column_names """
+    if row_type == "row":
+      raise ValueError("sqlite3.Row needs the cursor, use GetConverter")
+    converter = self._GetRowConverter(column_names, table_name, row_type)
+    decode_columns = [(idx, decoders[name]) for idx, name in enumerate(column_names)
+                      if decoders and name in decoders]
+    if len(decode_columns) == 0:
+      return converter
+
+    def DecodeAndConvert(rows):
+      decoded = []
+      for row in rows:
+        row = list(row)
+        for idx, decoder in decode_columns:
+          row[idx] = decoder(row[idx])
+        decoded.append(tuple(row))
+      return converter(decoded)
+    return DecodeAndConvert
+
+  def _GetRowConverter(self, column_names, table_name, row_type):
+    if row_type == "tuple":
+      return SQLRowFactory._Identity
+    if row_type == "dict":
+      return lambda rows: [dict(zip(column_names, p)) for p in rows]
+    row_class = self.GetRowClass(row_type, table_name, column_names)
+    if row_type == "namedtuple":
+      return lambda rows: list(map(row_class._make, rows))
+    return lambda rows: [row_class(*p) for p in rows]
+
+  def GetRowClass(self, row_type, table_name, column_names):
+    key = (row_type, table_name, column_names)
+    row_class = self.class_cache.get(key)
+    if row_class is None:
+      class_name = SQLRowFactory._SafeName(table_name, "Table") + "Row"
+      attr_names = [SQLRowFactory._SafeName(name, "_{}".format(idx)) for idx, name in enumerate(column_names)]
+      if row_type == "namedtuple":
+        row_class = collections.namedtuple(class_name, attr_names, rename=True)
+      elif row_type == "slots":
+        row_class = SQLRowFactory._CreateSlotsClass(class_name, attr_names)
+      else:
+        raise ValueError("no row class for row type: {}".format(row_type))
+      self.class_cache[key] = row_class
+    return row_class
+
+  def Clear(self) -> None:
+    self.class_cache.clear()
+
+  @staticmethod
+  def CheckRowType(row_type) -> None:
+    if row_type not in ROW_TYPES:
+      raise ValueError("not supported row type: {}, choose from {}".format(row_type, ROW_TYPES))
+
+  @staticmethod
+  def _Identity(rows):
+    return rows
+
+  @staticmethod
+  def _SafeName(name, fallback):
+    if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("__"):
+      return fallback
+    return name
+
+  @staticmethod
+  def _CreateSlotsClass(class_name, attr_names):
+    # a repeated or underscore led column name (e.g. _fields) is renamed to
+    # its position, like namedtuple(rename=True)
+    unique_names = []
+    for idx, name in enumerate(attr_names):
+      unique_names.append("_{}".format(idx) if name in unique_names or name.startswith("_") else name)
+    attr_names = unique_names
+    # no column is named _row after the renaming, unlike self
+    args = "".join(", " + name for name in attr_names)
+    body = "".join("\n  _row.{0} = {0}".format(name) for name in attr_names) or "\n  pass"
+    namespace = {}
+    exec("def __init__(_row{}):{}".format(args, body), namespace)
+
+    def __repr__(self):
+      return "{}({})".format(class_name, ", ".join("{}={!r}".format(k, getattr(self, k)) for k in attr_names))
+
+    def __eq__(self, other):
+      if type(other) is not type(self):
+        return NotImplemented
+      return all(getattr(self, k) == getattr(other, k) for k in attr_names)
+
+    def __iter__(self):
+      return (getattr(self, k) for k in attr_names)
+
+    def _asdict(self):
+      return {k: getattr(self, k) for k in attr_names}
+
+    return type(class_name, (object,), {
+      "__slots__": tuple(attr_names),
+      "_fields": tuple(attr_names),
+      "__init__": namespace["__init__"],
+      "__repr__": __repr__,
+      "__eq__": __eq__,
+      "__hash__": None,
+      "__iter__": __iter__,
+      "_asdict": _asdict,
+    })
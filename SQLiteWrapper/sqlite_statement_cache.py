@@ -0,0 +1,50 @@
+import collections
+
+class SQLStatementCache:
+  """ LRU cache of generated sql text
+
+  keys are tuples like (operation, table_name, columns, or_condition),
+  values are whatever the operator compiled for that shape
+  """
+  def __init__(self, max_size: int=256) -> None:
+    self.max_size = max_size
+    self.entries = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def __repr__(self) -> str:
+    return "<SQLStatementCache: {}/{} at {:016X}>".format(len(self.entries), self.max_size, id(self))
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def Get(self, key):
+    entry = self.entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries.move_to_end(key)
+    return entry
+
+  def Put(self, key, value) -> None:
+    self.entries[key] = value
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.max_size:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def Clear(self) -> None:
+    self.entries.clear()
+
+  def GetStats(self) -> dict:
+    total = self.hits + self.misses
+    return {
+      "size": len(self.entries),
+      "max_size": self.max_size,
+      "hits": self.hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "hit_rate": self.hits / total if total > 0 else 0.0,
+    }
@@ -13,7 +13,10 @@ the SQL structure should be constructed on program loading,
 when it should be read only during whole program process
 """
 
+import hashlib
+import json
 import typing
+from sqlite_codec import SQLCodec, TAG_RAW
 
 class DefaultNone:
   pass
@@ -31,7 +34,8 @@ class SQLField:
                unique: bool = False,
                not_null: bool = False,
                auto_increment: bool = False,
-               default: typing.Any=None) -> None:
+               default: typing.Any=None,
+               codec: SQLCodec=None) -> None:
     self.name = name
     self.data_type_str = data_type_str
     self.data_class = SQLField.GetClass(self.data_type_str)
@@ -39,6 +43,9 @@ class SQLField:
     self.not_null = not_null
     self.auto_increment = auto_increment
     self.default = default
+    if codec is not None and self.data_class not in (str, bytes):
+      raise ValueError("compression needs a TEXT or BLOB field, {} is {}".format(name, data_type_str))
+    self.codec = codec
 
   def __repr__(self) -> str:
     return "<SQLField: '{}' at {:016X}>".format(self.name, id(self))
@@ -59,9 +66,17 @@ class SQLField:
       s += " " + " ".join(subs)
     return s
 
-  def ParseToSQLTextData(self, value):
+  def GetDefinitionStr(self):
+    """ GetCreateStr plus the options sqlite does not know about """
+    if self.codec is None:
+      return self.GetCreateStr()
+    return self.GetCreateStr() + " " + self.codec.GetSpec()
+
+  def ParseToSQLTextData(self, value, dictionary_id=None):
     if value is None:
       return None  # since we use ?
+    elif self.codec is not None:
+      return self._Compress(value, dictionary_id)
     elif self.data_class == str:
       return value
     elif self.data_class in (int, float):
@@ -76,7 +91,64 @@ class SQLField:
       raise ValueError("not supported data type: {}".format(self.data_class))
   
   def ParseFromSQLTextData(self, value):
-    return value
+    if value is None or self.codec is None:
+      return value
+    if self.data_class == str:
+      # short text is stored as is
+      return value if isinstance(value, str) else self.codec.Decompress(value).decode("utf-8")
+    return self.codec.Decompress(value)
+
+  def _Compress(self, value, dictionary_id):
+    if self.data_class == str:
+      data = value.encode("utf-8")
+      if len(data) < self.codec.threshold:
+        return value
+      payload = self.codec.Compress(data, dictionary_id)
+      # text that did not shrink stays readable text
+      return value if payload[0] == TAG_RAW else payload
+    assert(isinstance(value, bytes))
+    return self.codec.Compress(value, dictionary_id)
+
+  def CoerceValue(self, value):
+    """ converts a loosely typed value (e.g. text read from csv) to
+        data_class, an empty string is NULL for non TEXT fields """
+    if value is None:
+      return None
+    if isinstance(value, str):
+      if self.data_class == str:
+        return value
+      value = value.strip()
+      if value == "":
+        return None
+      if self.data_class == bool:
+        return value.lower() in ("1", "true", "t", "yes", "y")
+      elif self.data_class == int:
+        try:
+          return int(value)
+        except ValueError:
+          return int(float(value))
+      elif self.data_class == bytes:
+        return value.encode("utf-8")
+    if isinstance(value, self.data_class) and not (self.data_class == int and isinstance(value, bool)):
+      return value
+    return self.data_class(value)
+
+  def GetEncoder(self, dictionary_id=None):
+    """ callable used on the insert / update hot path, None when
+        ParseToSQLTextData would hand the value back untouched.
+        dictionary_id selects the trained dictionary of a DICT codec """
+    if self.codec is None and self.data_class in (str, int, float, bool):
+      return None
+    if dictionary_id is not None:
+      return lambda value: self.ParseToSQLTextData(value, dictionary_id)
+    return self.ParseToSQLTextData
+
+  def GetDecoder(self):
+    """ callable used on the select path, None when ParseFromSQLTextData
+        would hand the value back untouched """
+    if self.codec is None:
+      return None
+    return self.ParseFromSQLTextData
 
   @staticmethod
   def GetClass(s):
@@ -109,21 +181,93 @@ class SQLField:
     else:
       return None
 
+class SQLIndex:
+  """ secondary index of a table, unique and partial (where) supported """
+  def __init__(self,
+               name: str,
+               table_name: str,
+               fields: list,
+               unique: bool = False,
+               where: str = None) -> None:
+    self.name = name
+    self.table_name = table_name
+    self.fields = list(fields)
+    self.unique = unique
+    self.where = where
+
+  def __repr__(self) -> str:
+    return "<SQLIndex: '{}' at {:016X}>".format(self.name, id(self))
+
+  def GetCreateStr(self):
+    s = "CREATE {}INDEX IF NOT EXISTS {} ON {} ({})".format(
+      "UNIQUE " if self.unique else "", self.name, self.table_name, ",".join(self.fields))
+    if self.where is not None:
+      s += " WHERE {}".format(self.where)
+    return s
+
+  def ToDict(self) -> dict:
+    return {"fields": list(self.fields), "unique": self.unique, "where": self.where}
+
+  @staticmethod
+  def CreateFromDict(name: str, table_name: str, definition):
+    """ definition is a field name, a list of field names or a dict
+        {"fields": [...], "unique": bool, "where": str} """
+    if isinstance(definition, str):
+      return SQLIndex(name, table_name, [definition])
+    elif isinstance(definition, (list, tuple)):
+      return SQLIndex(name, table_name, definition)
+    elif isinstance(definition, dict):
+      if "fields" not in definition:
+        raise ValueError("add fields to index: {}".format(name))
+      fields = definition["fields"]
+      if isinstance(fields, str):
+        fields = [fields]
+      return SQLIndex(name, table_name, fields, definition.get("unique", False), definition.get("where", None))
+    else:
+      raise ValueError("invalid index definition of {}: {}".format(name, definition))
+
 class SQLTable:
   def __init__(self, name: str) -> None:
     self.fields = []
     self.field_name_dict = {}
     self.name = name
     self.primary_keys = []
+    self.indexes = []
+    self.index_name_dict = {}
 
   def __repr__(self) -> str:
     return "<SQLTable: '{}' at {:016X}>".format(self.name, id(self))
 
+  def ToDict(self) -> dict:
+    """ inverse of CreateFromDict, the table part of an initiate dict """
+    d = {"field_definition": {field.name: field.GetDefinitionStr() for field in self.fields}}
+    if self.primary_keys is not None and len(self.primary_keys) > 0:
+      d["primary_keys"] = list(self.primary_keys)
+    if len(self.indexes) > 0:
+      d["indexes"] = {index.name: index.ToDict() for index in self.indexes}
+    return d
+
+  def GetPrimaryKeyFields(self) -> list:
+    """ names of the primary key columns, an AUTOINCREMENT field counts
+        as the primary key as well """
+    if self.primary_keys is not None and len(self.primary_keys) > 0:
+      return list(self.primary_keys)
+    return [field.name for field in self.fields if field.auto_increment]
+
+  def AddIndex(self, index: SQLIndex) -> None:
+    if index.name in self.index_name_dict:
+      raise ValueError("duplicated index {} in table: {}".format(index.name, self.name))
+    for field_name in index.fields:
+      if field_name not in self.field_name_dict:
+        raise ValueError("index {} uses unknown field {} of table: {}".format(index.name, field_name, self.name))
+    self.indexes.append(index)
+    self.index_name_dict[index.name] = index
+
   @staticmethod
-  def CreateFromDict(name: str, name_type_dict: dict, primary_keys: list or str=None):
+  def CreateFromDict(name: str, name_type_dict: dict, primary_keys: list or str=None, indexes: dict=None):
     table = SQLTable(name)
     for field_name, data_type in name_type_dict.items():
-      value = data_type
+      value, codec = SQLCodec.ExtractFromDefinition(data_type)
 
       # take out extra param
       value_up = value.upper()
@@ -148,7 +292,7 @@ class SQLTable:
         raise ValueError("invalid field type {}".format(field_type))
       field = SQLField(field_name, field_type[0],
                        test_result[SQLField.UNIQUE_TOKEN], test_result[SQLField.NOT_NULL_TOKEN], 
-                       test_result[SQLField.AUTO_INCREMENT_TOKEN], test_result[SQLField.DEFAULT_TOKEN])
+                       test_result[SQLField.AUTO_INCREMENT_TOKEN], test_result[SQLField.DEFAULT_TOKEN], codec)
       table.fields.append(field)
       table.field_name_dict[field_name] = field
 
@@ -169,6 +313,10 @@ class SQLTable:
         primary_key_count += 1
     if primary_key_count > 1:
       raise ValueError("multiple primary key found in table: {}".format(table.name))
+
+    if indexes is not None:
+      for index_name, definition in indexes.items():
+        table.AddIndex(SQLIndex.CreateFromDict(index_name, table.name, definition))
     
     return table
 
@@ -180,6 +328,20 @@ class SQLDatabase:
   def __repr__(self) -> str:
     return "<SQLDatabase at {:016X}>".format(id(self))
 
+  def ToDict(self) -> dict:
+    """ inverse of CreateFromDict """
+    return {table.name: table.ToDict() for table in self.tables}
+
+  def GetFingerprint(self) -> str:
+    """ digest of ToDict, equal structures give equal fingerprints. the
+        structure is read only once loaded so the digest is kept """
+    fingerprint = getattr(self, "_fingerprint", None)
+    if fingerprint is None:
+      text = json.dumps(self.ToDict(), sort_keys=True)
+      fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()
+      self._fingerprint = fingerprint
+    return fingerprint
+
   @staticmethod
   def CreateFromDict(table_name_initiate_dict: dict):
     db = SQLDatabase()
@@ -188,7 +350,8 @@ class SQLDatabase:
         raise ValueError("add field_definition to table: {}".format(table_name))
       table = SQLTable.CreateFromDict(table_name, 
                                       initiate_dict["field_definition"], 
-                                      initiate_dict.get("primary_keys", None))
+                                      initiate_dict.get("primary_keys", None),
+                                      initiate_dict.get("indexes", None))
       db.table_name_dict[table_name] = table
       db.tables.append(table)
     return db
@@ -201,7 +364,11 @@ if __name__ == "__main__":
         "name": "TEXT",
         "time": "REAL"
       },
-      "primary_keys": "id"
+      "primary_keys": "id",
+      "indexes": {
+        "idx_basic_name": "name",
+        "idx_basic_name_time": {"fields": ["name", "time"], "unique": True, "where": "time IS NOT NULL"}
+      }
     },
     "test_table": {
       "field_definition": {
@@ -0,0 +1,167 @@
+"""
+SQLWriteBehindQueue
+
+background write-behind for SQLite3Operator
+
+writes are queued into a bounded queue and a worker thread drains them
+into grouped transactions, one commit per group. a group is closed when
+it reaches max_batch_size, when its oldest write is older than max_delay
+seconds, or when Flush() is requested. callers get a
+concurrent.futures.Future per write, and block in Submit while the queue
+is full (backpressure)
+
+the worker shares the operator's connection, so the connector should be
+connected with check_same_thread=False
+"""
+
+import concurrent.futures
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+class _QueueItem:
+  __slots__ = ("func", "args", "kwargs", "future")
+
+  def __init__(self, func, args, kwargs, future) -> None:
+    self.func = func
+    self.args = args
+    self.kwargs = kwargs
+    self.future = future
+
+class SQLWriteBehindQueue:
+  _FLUSH = "flush"
+  _STOP = "stop"
+
+  def __init__(self, operator, max_queue_size: int=10000, max_batch_size: int=1000,
+               max_delay: float=0.05, put_timeout: float=None) -> None:
+    self.operator = operator
+    self.max_batch_size = max_batch_size
+    self.max_delay = max_delay
+    self.put_timeout = put_timeout
+    self.queue = queue.Queue(max_queue_size)
+    self.thread = None
+    self.logger = logging.getLogger("SQLWriteBehindQueue")
+    self.group_count = 0
+    self.write_count = 0
+
+  def __repr__(self) -> str:
+    return "<SQLWriteBehindQueue: {} queued at {:016X}>".format(self.queue.qsize(), id(self))
+
+  def Start(self) -> None:
+    if self.thread is not None:
+      return
+    self.thread = threading.Thread(target=self._Run, name="SQLWriteBehindQueue", daemon=True)
+    self.thread.start()
+
+  def Stop(self, flush: bool=True) -> None:
+    """ stops the worker, queued writes are still executed and committed
+        when flush is True, otherwise they are cancelled """
+    if self.thread is None:
+      return
+    if not flush:
+      self._CancelPending()
+    self._Put(_QueueItem(SQLWriteBehindQueue._STOP, None, None, concurrent.futures.Future()))
+    self.thread.join()
+    self.thread = None
+
+  def IsWorkerThread(self) -> bool:
+    return threading.current_thread() is self.thread
+
+  def Submit(self, func, *args, **kwargs):
+    if self.thread is None:
+      raise RuntimeError("write-behind queue is not running")
+    future = concurrent.futures.Future()
+    self._Put(_QueueItem(func, args, kwargs, future))
+    return future
+
+  def Flush(self, timeout: float=None) -> None:
+    """ blocks until every write queued before this call is committed """
+    if self.thread is None:
+      return
+    if self.IsWorkerThread():
+      raise RuntimeError("Flush can not be called from the write-behind worker")
+    future = concurrent.futures.Future()
+    self._Put(_QueueItem(SQLWriteBehindQueue._FLUSH, None, None, future))
+    future.result(timeout)
+
+  def _Put(self, item) -> None:
+    try:
+      self.queue.put(item, timeout=self.put_timeout)
+    except queue.Full:
+      raise TimeoutError("write-behind queue full for {}s".format(self.put_timeout))
+
+  def _CancelPending(self) -> None:
+    while True:
+      try:
+        item = self.queue.get_nowait()
+      except queue.Empty:
+        return
+      item.future.cancel()
+
+  def _Run(self) -> None:
+    running = True
+    while running:
+      group = [self.queue.get()]
+      deadline = time.monotonic() + self.max_delay
+      while group[-1].func not in (SQLWriteBehindQueue._FLUSH, SQLWriteBehindQueue._STOP) and \
+            len(group) < self.max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          break
+        try:
+          group.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+          break
+      running = group[-1].func != SQLWriteBehindQueue._STOP
+      self._RunGroup(group)
+
+  def _RunGroup(self, group) -> None:
+    results = []
+    conn = self.operator.connector.conn
+    self.operator._auto_save_suspended += 1
+    try:
+      # one transaction per group, every write in its own savepoint so a
+      # failing one leaves nothing behind
+      if not conn.in_transaction:
+        conn.execute("BEGIN")
+      for item in group:
+        if item.func in (SQLWriteBehindQueue._FLUSH, SQLWriteBehindQueue._STOP):
+          results.append((item.future, None, None))
+          continue
+        if not item.future.set_running_or_notify_cancel():
+          continue
+        try:
+          with self.operator.Savepoint():
+            result = item.func(*item.args, **item.kwargs)
+          results.append((item.future, result, None))
+        except BaseException as e:
+          results.append((item.future, None, e))
+      self.operator.Commit()
+    except BaseException as e:
+      self.logger.error("write-behind commit failed on {}: {}".format(self.operator.connector.path, e))
+      # the futures report the failure, the writes must not ride along
+      # with the next group
+      if conn.in_transaction:
+        try:
+          self.operator._RollbackConnection()
+        except sqlite3.Error as rollback_error:
+          self.logger.error("write-behind rollback failed on {}: {}".format(self.operator.connector.path, rollback_error))
+      results = [(future, None, e) for future, _, _ in results]
+    finally:
+      self.operator._auto_save_suspended -= 1
+    self.group_count += 1
+    self.write_count += len(results)
+    for future, result, error in results:
+      if error is not None:
+        future.set_exception(error)
+      else:
+        future.set_result(result)
+
+  def GetStats(self) -> dict:
+    return {
+      "queued": self.queue.qsize(),
+      "groups": self.group_count,
+      "writes": self.write_count,
+    }
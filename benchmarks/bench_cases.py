@@ -0,0 +1,245 @@
+"""
+benchmark cases, each one runs the same work through SQLite3Operator
+("wrapper") and through plain sqlite3 ("raw") on identical databases
+
+a case is BenchCase(setup, reset, wrapper, raw)
+- setup(ctx): once per (size, pragma profile), untimed
+- reset(ctx): before every timed run, untimed, may be None
+- wrapper(ctx) / raw(ctx): the timed part, returns the number of rows touched
+ctx is a dict holding size, pragma profile, work directory and both handles
+"""
+
+import os
+import sqlite3
+from SQLiteWrapper import SQLDatabase, SQLite3Connector, SQLite3Operator, SQLCondition
+from SQLiteWrapper.sqlite_pragma import ApplyPragmas, ResolvePragmaProfile
+
+C = SQLCondition
+
+WIDE_COLUMN_COUNT = 50
+SCHEMA_FILE_COUNT = 20
+SCHEMA_TABLE_COUNT = 10
+
+NARROW_STRUCTURE = {
+  "Item": {
+    "field_definition": {
+      "id": "INTEGER",
+      "name": "TEXT",
+      "value": "REAL",
+      "flag": "INTEGER"
+    },
+    "primary_keys": ["id"]
+  }
+}
+
+WIDE_STRUCTURE = {
+  "Wide": {
+    "field_definition": dict(
+      [("id", "INTEGER")] +
+      [("c{}".format(i), "REAL" if i % 2 == 0 else "TEXT") for i in range(WIDE_COLUMN_COUNT)]),
+    "primary_keys": ["id"]
+  }
+}
+
+class BenchCase:
+  def __init__(self, setup, reset, wrapper, raw) -> None:
+    self.setup = setup
+    self.reset = reset
+    self.wrapper = wrapper
+    self.raw = raw
+
+# ================ helpers ================
+def _OpenBoth(ctx, structure_dict, file_name):
+  """ one wrapper connection and one raw connection on the same file """
+  path = os.path.join(ctx["workdir"], file_name)
+  if os.path.exists(path):
+    os.remove(path)
+  connector = SQLite3Connector(path, SQLDatabase.CreateFromDict(structure_dict), verbose_level=0,
+                               pragma_profile=ctx["pragma"])
+  connector.Connect(do_check=False)
+  connector.TableValidation()
+  connector.conn.commit()
+  ctx["connector"] = connector
+  ctx["op"] = SQLite3Operator(connector)
+  ctx["raw_conn"] = _RawConnect(path, ctx["pragma"])
+  ctx["path"] = path
+
+def _CheckKeyLookup(ctx, table_name):
+  """ id lookups have to search the rowid, a scan would hide the wrapper
+      overhead the cases measure """
+  plan = ctx["raw_conn"].execute("EXPLAIN QUERY PLAN SELECT * FROM {} WHERE id = ?".format(table_name), (1,)).fetchall()
+  if not any("INTEGER PRIMARY KEY" in row[-1] for row in plan):
+    raise RuntimeError("{} is not keyed by id, query plan: {}".format(table_name, [row[-1] for row in plan]))
+
+def _RawConnect(path, pragma):
+  conn = sqlite3.connect(path)
+  ApplyPragmas(conn, ResolvePragmaProfile(pragma))
+  return conn
+
+def CloseContext(ctx):
+  if "connector" in ctx:
+    ctx["connector"].conn.close()
+    ctx["connector"].conn = None
+    del ctx["connector"]
+  if "raw_conn" in ctx:
+    ctx["raw_conn"].close()
+    del ctx["raw_conn"]
+
+def _NarrowRows(size):
+  return [(i, "name_{}".format(i), i * 0.5, i % 2) for i in range(1, size + 1)]
+
+def _NarrowDicts(size):
+  return [{"id": i, "name": "name_{}".format(i), "value": i * 0.5, "flag": i % 2} for i in range(1, size + 1)]
+
+def _FillNarrow(ctx):
+  ctx["raw_conn"].executemany("INSERT INTO Item VALUES (?,?,?,?)", _NarrowRows(ctx["size"]))
+  ctx["raw_conn"].commit()
+
+def _LookupIds(size):
+  step = max(1, size // 1000)
+  return list(range(1, size + 1, step))
+
+# ================ inserts ================
+def _SetupEmptyNarrow(ctx):
+  _OpenBoth(ctx, NARROW_STRUCTURE, "narrow.db")
+  ctx["dicts"] = _NarrowDicts(ctx["size"])
+  ctx["rows"] = _NarrowRows(ctx["size"])
+
+def _ResetEmptyNarrow(ctx):
+  ctx["raw_conn"].execute("DELETE FROM Item")
+  ctx["raw_conn"].commit()
+
+def _WrapperSingleInsert(ctx):
+  op = ctx["op"]
+  for d in ctx["dicts"]:
+    op.InsertDictToTable(d, "Item")
+  op.Commit()
+  return len(ctx["dicts"])
+
+def _RawSingleInsert(ctx):
+  conn = ctx["raw_conn"]
+  for row in ctx["rows"]:
+    conn.execute("INSERT INTO Item (id,name,value,flag) VALUES (?,?,?,?)", row)
+  conn.commit()
+  return len(ctx["rows"])
+
+def _WrapperBulkInsert(ctx):
+  inserted = ctx["op"].InsertDictsToTable(ctx["dicts"], "Item")
+  ctx["op"].Commit()
+  return inserted
+
+def _RawBulkInsert(ctx):
+  conn = ctx["raw_conn"]
+  conn.executemany("INSERT INTO Item (id,name,value,flag) VALUES (?,?,?,?)", ctx["rows"])
+  conn.commit()
+  return len(ctx["rows"])
+
+# ================ update / lookup / scan ================
+def _SetupFilledNarrow(ctx):
+  _OpenBoth(ctx, NARROW_STRUCTURE, "narrow.db")
+  _CheckKeyLookup(ctx, "Item")
+  _FillNarrow(ctx)
+  ctx["ids"] = _LookupIds(ctx["size"])
+
+def _WrapperUpdate(ctx):
+  op = ctx["op"]
+  for i in ctx["ids"]:
+    op.UpdateFieldFromTable({"value": i * 2.0, "flag": 1}, "Item", C.Eq("id", i))
+  op.Commit()
+  return len(ctx["ids"])
+
+def _RawUpdate(ctx):
+  conn = ctx["raw_conn"]
+  for i in ctx["ids"]:
+    conn.execute("UPDATE Item SET value=?,flag=? WHERE id = ?", (i * 2.0, 1, i))
+  conn.commit()
+  return len(ctx["ids"])
+
+def _WrapperPrimaryKeyLookup(ctx):
+  op = ctx["op"]
+  found = 0
+  for i in ctx["ids"]:
+    found += len(op.SelectFieldFromTable(["id", "name", "value", "flag"], "Item", C.Eq("id", i)))
+  return found
+
+def _RawPrimaryKeyLookup(ctx):
+  conn = ctx["raw_conn"]
+  found = 0
+  for i in ctx["ids"]:
+    found += len(conn.execute("SELECT id,name,value,flag FROM Item WHERE id = ?", (i,)).fetchall())
+  return found
+
+def _WrapperFullScan(ctx):
+  return len(ctx["op"].SelectFieldFromTable(["id", "name", "value", "flag"], "Item"))
+
+def _RawFullScan(ctx):
+  return len(ctx["raw_conn"].execute("SELECT id,name,value,flag FROM Item").fetchall())
+
+# ================ wide rows ================
+def _SetupFilledWide(ctx):
+  _OpenBoth(ctx, WIDE_STRUCTURE, "wide.db")
+  _CheckKeyLookup(ctx, "Wide")
+  row_count = max(1, ctx["size"] // 10)
+  rows = [tuple([i] + [float(c) if c % 2 == 0 else "t{}".format(c) for c in range(WIDE_COLUMN_COUNT)])
+          for i in range(1, row_count + 1)]
+  ctx["raw_conn"].executemany("INSERT INTO Wide VALUES ({})".format(",".join("?" * (WIDE_COLUMN_COUNT + 1))), rows)
+  ctx["raw_conn"].commit()
+  ctx["wide_fields"] = ["id"] + ["c{}".format(i) for i in range(WIDE_COLUMN_COUNT)]
+
+def _WrapperWideSelect(ctx):
+  return len(ctx["op"].SelectFieldFromTable(ctx["wide_fields"], "Wide"))
+
+def _RawWideSelect(ctx):
+  return len(ctx["raw_conn"].execute("SELECT {} FROM Wide".format(",".join(ctx["wide_fields"]))).fetchall())
+
+# ================ schema load ================
+def _SetupSchemaFiles(ctx):
+  paths = []
+  for file_index in range(SCHEMA_FILE_COUNT):
+    path = os.path.join(ctx["workdir"], "schema_{}.db".format(file_index))
+    if not os.path.exists(path):
+      conn = sqlite3.connect(path)
+      for table_index in range(SCHEMA_TABLE_COUNT):
+        conn.execute("CREATE TABLE T{0} (id INTEGER PRIMARY KEY, code TEXT NOT NULL, "
+                     "date TEXT, value REAL DEFAULT 0, note TEXT)".format(table_index))
+        conn.execute("CREATE INDEX T{0}_code ON T{0} (code, date)".format(table_index))
+      conn.commit()
+      conn.close()
+    paths.append(path)
+  ctx["schema_paths"] = paths
+
+def _WrapperSchemaLoad(ctx):
+  # the schema cache is off so both sides introspect every file
+  table_count = 0
+  for path in ctx["schema_paths"]:
+    connector = SQLite3Connector(path, SQLDatabase(), verbose_level=0, pragma_profile=ctx["pragma"],
+                                 use_schema_cache=False)
+    connector.Connect(do_check=False)
+    connector.LoadStructureFromDatabase()
+    table_count += len(connector.structure.tables)
+    connector.conn.close()
+    connector.conn = None
+  return table_count
+
+def _RawSchemaLoad(ctx):
+  table_count = 0
+  for path in ctx["schema_paths"]:
+    conn = _RawConnect(path, ctx["pragma"])
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+    for name in names:
+      conn.execute("PRAGMA table_info({})".format(name)).fetchall()
+      for index_row in conn.execute("PRAGMA index_list({})".format(name)).fetchall():
+        conn.execute("PRAGMA index_info({})".format(index_row[1])).fetchall()
+      table_count += 1
+    conn.close()
+  return table_count
+
+CASES = {
+  "single_insert": BenchCase(_SetupEmptyNarrow, _ResetEmptyNarrow, _WrapperSingleInsert, _RawSingleInsert),
+  "bulk_insert": BenchCase(_SetupEmptyNarrow, _ResetEmptyNarrow, _WrapperBulkInsert, _RawBulkInsert),
+  "update": BenchCase(_SetupFilledNarrow, None, _WrapperUpdate, _RawUpdate),
+  "pk_lookup": BenchCase(_SetupFilledNarrow, None, _WrapperPrimaryKeyLookup, _RawPrimaryKeyLookup),
+  "full_scan": BenchCase(_SetupFilledNarrow, None, _WrapperFullScan, _RawFullScan),
+  "wide_select": BenchCase(_SetupFilledWide, None, _WrapperWideSelect, _RawWideSelect),
+  "schema_load": BenchCase(_SetupSchemaFiles, None, _WrapperSchemaLoad, _RawSchemaLoad),
+}
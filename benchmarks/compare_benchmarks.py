@@ -0,0 +1,64 @@
+"""
+compares two run_benchmarks.py result files and flags regressions
+
+  python benchmarks/compare_benchmarks.py before.json after.json --threshold 1.15
+
+a regression is a wrapper / raw overhead ratio that grew by more than
+threshold, the raw baseline runs next to the wrapper so machine noise
+mostly cancels out. the plain wrapper median ratio is printed alongside.
+exits with 1 when anything regressed
+"""
+
+import argparse
+import json
+import sys
+
+def _Key(result):
+  return (result["case"], result["size"], result["pragma"], result["impl"])
+
+def LoadResults(path) -> dict:
+  with open(path) as f:
+    report = json.load(f)
+  return {_Key(result): result for result in report["results"]}
+
+def Compare(before: dict, after: dict, threshold: float) -> list:
+  """ returns [(case, size, pragma, before_median, after_median, ratio, overhead_before, overhead_after, flagged)] """
+  rows = []
+  for key, new in sorted(after.items()):
+    case, size, pragma, impl = key
+    if impl != "wrapper" or key not in before:
+      continue
+    old = before[key]
+    ratio = new["median"] / old["median"] if old["median"] > 0 else float("inf")
+    old_overhead = old.get("overhead") or 0.0
+    new_overhead = new.get("overhead") or 0.0
+    flagged = old_overhead > 0 and new_overhead / old_overhead > threshold
+    rows.append((case, size, pragma, old["median"], new["median"], ratio, old_overhead, new_overhead, flagged))
+  return rows
+
+def main(argv=None) -> int:
+  parser = argparse.ArgumentParser(description="compare two benchmark result files")
+  parser.add_argument("before")
+  parser.add_argument("after")
+  parser.add_argument("--threshold", type=float, default=1.10,
+                      help="slowdown ratio counted as a regression, 1.10 means 10%% slower")
+  args = parser.parse_args(argv)
+
+  before = LoadResults(args.before)
+  after = LoadResults(args.after)
+  rows = Compare(before, after, args.threshold)
+  print("{:<14} {:>8} {:<10} {:>10} {:>10} {:>7} {:>9} {:>9}".format(
+        "case", "size", "pragma", "before", "after", "ratio", "overhead", "was"))
+  for case, size, pragma, old_median, new_median, ratio, old_overhead, new_overhead, flagged in rows:
+    print("{:<14} {:>8} {:<10} {:>10.4f} {:>10.4f} {:>6.2f}x {:>8.2f}x {:>8.2f}x{}".format(
+          case, size, pragma, old_median, new_median, ratio, new_overhead, old_overhead,
+          "  REGRESSION" if flagged else ""))
+  missing = sorted(set(key for key in before if key[3] == "wrapper") - set(after))
+  for case, size, pragma, _ in missing:
+    print("{:<14} {:>8} {:<10} missing from {}".format(case, size, pragma, args.after))
+  regressions = sum(1 for row in rows if row[-1])
+  print("{} of {} benchmarks regressed".format(regressions, len(rows)))
+  return 1 if regressions > 0 else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+runs the benchmark cases at several data sizes and pragma profiles and
+writes the timings as JSON, compare two result files with
+compare_benchmarks.py
+
+  python benchmarks/run_benchmarks.py --sizes 1000 10000 --pragma none balanced -o after.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_cases import CASES, CloseContext
+
+def _GitRevision():
+  try:
+    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                   cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def _TimeOnce(case, impl, ctx):
+  if case.reset is not None:
+    case.reset(ctx)
+  func = case.wrapper if impl == "wrapper" else case.raw
+  start_time = time.perf_counter()
+  rows = func(ctx)
+  return time.perf_counter() - start_time, rows
+
+def RunCase(name, size, pragma, repeat, warmup, workdir) -> list:
+  case = CASES[name]
+  ctx = {"size": size, "pragma": pragma, "workdir": workdir}
+  case.setup(ctx)
+  try:
+    times = {"wrapper": [], "raw": []}
+    rows = {}
+    for run_index in range(warmup + repeat):
+      # alternate the order so neither side always runs on a warmer cache
+      order = ("wrapper", "raw") if run_index % 2 == 0 else ("raw", "wrapper")
+      for impl in order:
+        seconds, rows[impl] = _TimeOnce(case, impl, ctx)
+        if run_index >= warmup:
+          times[impl].append(seconds)
+  finally:
+    CloseContext(ctx)
+  if rows["wrapper"] != rows["raw"]:
+    raise RuntimeError("{} touched {} rows through the wrapper but {} raw".format(name, rows["wrapper"], rows["raw"]))
+  results = []
+  for impl in ("wrapper", "raw"):
+    results.append({
+      "case": name,
+      "size": size,
+      "pragma": pragma or "none",
+      "impl": impl,
+      "rows": rows[impl],
+      "times": times[impl],
+      "min": min(times[impl]),
+      "median": statistics.median(times[impl]),
+      "mean": statistics.mean(times[impl]),
+    })
+  overhead = results[0]["median"] / results[1]["median"] if results[1]["median"] > 0 else None
+  results[0]["overhead"] = overhead
+  return results
+
+def main(argv=None) -> int:
+  parser = argparse.ArgumentParser(description="SQLiteWrapper vs raw sqlite3 benchmarks")
+  parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+  parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+  parser.add_argument("--pragma", nargs="+", default=["none", "balanced"],
+                      help="pragma profile names, none leaves the sqlite defaults")
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--warmup", type=int, default=1)
+  parser.add_argument("-o", "--output", default=None, help="json file, printed to stdout when omitted")
+  args = parser.parse_args(argv)
+
+  workdir = tempfile.mkdtemp(prefix="sqlite_wrapper_bench_")
+  results = []
+  try:
+    for pragma in args.pragma:
+      for size in args.sizes:
+        for name in args.cases:
+          case_results = RunCase(name, size, None if pragma == "none" else pragma,
+                                 args.repeat, args.warmup, workdir)
+          results.extend(case_results)
+          print("{:<14} size={:<8} pragma={:<10} wrapper={:.4f}s raw={:.4f}s overhead={:.2f}x".format(
+                name, size, pragma, case_results[0]["median"], case_results[1]["median"],
+                case_results[0]["overhead"] or 0.0), file=sys.stderr)
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+  report = {
+    "meta": {
+      "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+      "revision": _GitRevision(),
+      "python": platform.python_version(),
+      "sqlite": sqlite3.sqlite_version,
+      "platform": platform.platform(),
+      "repeat": args.repeat,
+      "warmup": args.warmup,
+    },
+    "results": results,
+  }
+  text = json.dumps(report, indent=2)
+  if args.output is None:
+    print(text)
+  else:
+    with open(args.output, "w") as f:
+      f.write(text)
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
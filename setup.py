@@ -10,5 +10,5 @@ setup(
   install_requires=[],
   # packages=["python_general_lib"],
   packages=find_packages(),
-  python_requires='>=3.5'
+  python_requires='>=3.7'
 )
\ No newline at end of file
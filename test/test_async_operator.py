@@ -0,0 +1,37 @@
+import asyncio
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+async def Main():
+  conn = SQLite3Connector(":memory:", db)
+  async with AsyncSQLite3Operator(SQLite3Operator(conn)) as aop:
+    await aop.Connect()
+    await aop.Run(conn.TableValidation)
+    pending = [aop.InsertDictToTable({"name": "n{}".format(i)}, "BasicTable") for i in range(20)]
+    last_id = aop.GetLastInsertRowID()
+    await asyncio.gather(*pending)
+    assert await last_id == 20
+    await aop.InsertTuplesToTable([("a",), ("b",)], "BasicTable", fields=["name"])
+    await aop.Commit()
+
+    rows = await aop.SelectFieldFromTable("*", "BasicTable", "id > 20")
+    assert rows == [{"id": 21, "name": "a"}, {"id": 22, "name": "b"}]
+    count = 0
+    async for row in aop.IterSelectFieldFromTable("id", "BasicTable", batch_size=5, row_type="tuple"):
+      count += 1
+    assert count == 22
+    batches = [b async for b in aop.IterSelectFieldFromTable("id", "BasicTable", batch_size=10, yield_batches=True)]
+    assert [len(b) for b in batches] == [10, 10, 2]
+  assert conn.conn is None
+
+asyncio.run(Main())
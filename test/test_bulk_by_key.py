@@ -0,0 +1,87 @@
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "ItemTable": {
+    "field_definition": {
+      "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+      "name": "TEXT",
+      "value": "REAL"
+    }
+  },
+  "DailyTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "date": "TEXT NOT NULL",
+      "close": "REAL"
+    },
+    "primary_keys": ["code", "date"]
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+op = SQLite3Operator(conn)
+
+op.InsertDictsToTable([{"name": "n{}".format(i), "value": float(i)} for i in range(3000)], "ItemTable")
+op.InsertTuplesToTable([(c, "d{}".format(d), 1.0) for c in "abc" for d in range(100)], "DailyTable")
+op.EnableRowCache("ItemTable")
+op.EnableRowCache("DailyTable")
+assert op.SelectByPrimaryKey("ItemTable", (5,))["value"] == 4.0
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d5"))["close"] == 1.0
+
+# mixed column sets, a missing key only counts what exists
+updated = op.UpdateManyByPrimaryKey([{"id": i, "value": -1.0} for i in range(1, 2001)] +
+                                    [{"id": 5, "name": "five"}, {"id": 99999, "value": 0.0}], "ItemTable", chunk_size=300)
+assert updated == 2001
+assert op.SelectByPrimaryKey("ItemTable", (5,)) == {"id": 5, "name": "five", "value": -1.0}
+assert len(op.SelectFieldFromTable(["id"], "ItemTable", "value = -1.0")) == 2000
+
+assert op.UpdateManyByPrimaryKey([{"code": "a", "date": "d5", "close": 5.0}], "DailyTable") == 1
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d5"))["close"] == 5.0
+
+# single column keys go through chunked IN lists, plain values or 1-tuples
+deleted = op.DeleteByPrimaryKeys(list(range(1, 1501)) + [(1501,), 99999], "ItemTable", chunk_size=400)
+assert deleted == 1501
+assert op.SelectByPrimaryKey("ItemTable", (5,)) is None
+assert len(op.SelectFieldFromTable(["id"], "ItemTable")) == 1499
+
+# composite keys go through a temp table join
+keys = [("a", "d{}".format(d)) for d in range(50)] + [("b", "d0"), ("z", "d0")]
+assert op.DeleteByPrimaryKeys(keys, "DailyTable") == 51
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d5")) is None
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d50"))["close"] == 1.0
+assert conn.conn.execute("SELECT count(*) FROM temp.sqlite_master").fetchone()[0] == 0
+
+# both run in one transaction, a failure leaves nothing behind
+try:
+  op.UpdateManyByPrimaryKey([{"id": 2000, "value": 7.0}, {"value": 1.0}], "ItemTable")
+  assert False
+except ValueError:
+  pass
+assert op.SelectByPrimaryKey("ItemTable", (2000,))["value"] == -1.0
+try:
+  op.DeleteByPrimaryKeys([("a",)], "DailyTable")
+  assert False
+except ValueError:
+  pass
+
+# pending work of the caller is neither committed nor lost
+op.Commit()
+op.InsertDictToTable({"id": 9000, "name": "pending", "value": 0.0}, "ItemTable")
+assert op.UpdateManyByPrimaryKey([{"id": 9000, "value": 9.0}], "ItemTable") == 1
+assert op.DeleteByPrimaryKeys([("c", "d0")], "DailyTable") == 1
+assert conn.conn.in_transaction
+try:
+  op.UpdateManyByPrimaryKey([{"id": 2000, "value": 7.0}, {"value": 1.0}], "ItemTable")
+  assert False
+except ValueError:
+  pass
+assert op.SelectByPrimaryKey("ItemTable", (9000,))["value"] == 9.0
+assert op.SelectByPrimaryKey("ItemTable", (2000,))["value"] == -1.0
+op.Rollback()
+assert op.SelectByPrimaryKey("ItemTable", (9000,)) is None
+assert op.SelectByPrimaryKey("DailyTable", ("c", "d0"))["close"] == 1.0
+
+print("bulk by key test passed")
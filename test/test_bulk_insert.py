@@ -0,0 +1,36 @@
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT",
+      "score": "REAL"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.SetAutoSave(True)
+op.SetAutoSaveInterval(1000000)
+
+rows = ({"id": i, "name": "n{}".format(i)} if i % 2 else {"id": i, "name": "n{}".format(i), "score": i / 2}
+        for i in range(2500))
+inserted = op.InsertDictsToTable(rows, "BasicTable", chunk_size=300)
+print(inserted)
+assert inserted == 2500
+assert op.auto_save_counter == 2500
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 2500
+
+inserted = op.InsertTuplesToTable(((i, "t{}".format(i)) for i in range(2000, 3000)), "BasicTable",
+                                  fields=("id", "name"), or_condition="OR IGNORE", chunk_size=128)
+print(inserted)
+assert inserted == 500
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 3000
+op.Commit()
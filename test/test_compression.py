@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "PayloadTable": {
+    "field_definition": {
+      "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+      "raw": "BLOB COMPRESS zlib LEVEL 9",
+      "packed": "BLOB COMPRESS lzma THRESHOLD 128",
+      "note": "TEXT COMPRESS zlib",
+      "event": "TEXT COMPRESS zlib DICT"
+    }
+  }
+}
+
+def MakeEvent(i):
+  return json.dumps({"user_id": i * 7919 % 100003, "event": "page_view", "path": "/products/{}".format(i % 97),
+                     "agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36", "ok": True})
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+table = db.table_name_dict["PayloadTable"]
+assert table.field_name_dict["raw"].codec.GetSpec() == "COMPRESS zlib LEVEL 9"
+assert table.field_name_dict["raw"].GetCreateStr() == "BLOB"
+assert table.ToDict()["field_definition"]["packed"] == "BLOB COMPRESS lzma THRESHOLD 128"
+assert SQLDatabase.CreateFromDict(db.ToDict()).GetFingerprint() == db.GetFingerprint()
+try:
+  SQLDatabase.CreateFromDict({"T": {"field_definition": {"x": "REAL COMPRESS zlib"}}})
+  assert False
+except ValueError:
+  pass
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+  path = os.path.join(tmp_dir, "compression.db")
+  conn = SQLite3Connector(path, db, verbose_level=0)
+  conn.Connect(do_check=False)
+  conn.TableValidation()
+  op = SQLite3Operator(conn)
+
+  big = b"payload " * 1000
+  rows = [{"raw": big, "packed": big, "note": "x" * 500, "event": MakeEvent(0)},
+          {"raw": b"tiny", "packed": b"tiny", "note": "short", "event": None}]
+  op.InsertDictsToTable(rows, "PayloadTable")
+
+  # stored compressed, short text stays plain text
+  stored = conn.conn.execute("SELECT raw, packed, note, length(raw), typeof(note) FROM PayloadTable ORDER BY id").fetchall()
+  assert stored[0][3] < len(big) // 10 and stored[0][4] == "blob"
+  assert stored[1][0] == b"\x00tiny" and stored[1][2] == "short" and stored[1][4] == "text"
+
+  # decoded on every select path
+  selected = op.SelectFieldFromTable(["id", "raw", "packed", "note", "event"], "PayloadTable")
+  assert [{k: v for k, v in row.items() if k != "id"} for row in selected] == rows
+  assert op.SelectFieldFromTable("*", "PayloadTable", C.Eq("id", 2), row_type="namedtuple")[0].packed == b"tiny"
+  assert [row["raw"] for row in op.IterSelectFieldFromTable(["raw"], "PayloadTable", batch_size=1)] == [big, b"tiny"]
+  assert [row[0] for rows_page, _ in op.Paginate("PayloadTable", ["note"], 1, row_type="tuple") for row in rows_page] == \
+    ["x" * 500, "short"]
+  assert op.SelectColumns(["note"], "PayloadTable")["note"] == ["x" * 500, "short"]
+  # the raw selects decode like the others
+  assert [row[0] for row in op.RawSelectFieldFromTable(["raw"], "PayloadTable")] == [big, b"tiny"]
+  raw_rows, raw_names = op.RawSelectFieldFromTableWithReturnFieldName(["id", "note"], "PayloadTable")
+  assert raw_names == ["id", "note"] and [row[1] for row in raw_rows] == ["x" * 500, "short"]
+  assert [row[0] for row in op.IterRawSelectFieldFromTable(["raw"], "PayloadTable")] == [big, b"tiny"]
+  assert op.SelectByPrimaryKey("PayloadTable", 1)["raw"] == big
+  op.UpdateFieldFromTable({"note": "y" * 300}, "PayloadTable", C.Eq("id", 2))
+  assert op.SelectByPrimaryKey("PayloadTable", 2)["note"] == "y" * 300
+
+  # a trained dictionary shrinks small similar payloads further
+  op.InsertDictsToTable([{"event": MakeEvent(i)} for i in range(1, 400)], "PayloadTable")
+  size_before = conn.conn.execute("SELECT length(event) FROM PayloadTable WHERE id = 10").fetchone()[0]
+  dictionary_id = op.TrainCompressionDictionary("PayloadTable", "event", size=4096)
+  assert dictionary_id is not None
+  op.InsertDictsToTable([{"event": MakeEvent(i)} for i in range(400, 800)], "PayloadTable")
+  size_after = conn.conn.execute("SELECT length(event) FROM PayloadTable WHERE event = ?",
+                                 (table.field_name_dict["event"].ParseToSQLTextData(MakeEvent(407), dictionary_id),)
+                                 ).fetchone()[0]
+  print("event bytes without / with dictionary:", size_before, size_after)
+  assert size_after < size_before
+  conn.conn.commit()
+  try:
+    op.TrainCompressionDictionary("PayloadTable", "note")
+    assert False
+  except ValueError:
+    pass
+
+  # empty the process wide registry like a fresh process, the new
+  # connection finds the dictionary in the database
+  import sqlite_codec
+  sqlite_codec._dictionaries.clear()
+  conn2 = SQLite3Connector(path, db, verbose_level=0)
+  conn2.Connect(do_check=False)
+  events = SQLite3Operator(conn2).SelectFieldFromTable(["event"], "PayloadTable", "id > 1", row_type="tuple")
+  assert [row[0] for row in events[1:]] == [MakeEvent(i) for i in range(1, 800)]
+  conn2.conn.close()
+  conn2.conn = None
+
+print("compression test passed")
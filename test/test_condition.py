@@ -0,0 +1,49 @@
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT",
+      "score": "REAL"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable((("n{}".format(i), i * 1.5) for i in range(20)), "BasicTable", fields=["name", "score"])
+
+cond = C.Range("id", 3, 6) & ~C.Eq("name", "n3")
+print(cond)
+assert cond.Compile() == ("((id >= ?) AND (id < ?)) AND (NOT (name = ?))", (3, 6, "n3"))
+assert [r["id"] for r in op.SelectFieldFromTable("id", "BasicTable", cond)] == [3, 5]
+
+query = SQLQuery(C.In("name", ["n1", "n2", "n7", "'; DROP TABLE BasicTable; --"]) | C.Gt("score", 27),
+                 order_by="-id", limit=3, offset=1)
+assert [r["id"] for r in op.SelectFieldFromTable("id", "BasicTable", query)] == [8, 3, 2]
+assert op.SelectFieldFromTableAdvanced("id", "BasicTable", SQLQuery(order_by="id", limit=2), row_type="tuple") == [(1,), (2,)]
+assert [r[0] for r in op.IterRawSelectFieldFromTable("id", "BasicTable", C.Le("id", 2))] == [1, 2]
+
+op.UpdateFieldFromTable({"name": "changed"}, "BasicTable", C.Eq("id", 1))
+assert op.SelectFieldFromTable("name", "BasicTable", C.Eq("id", 1)) == [{"name": "changed"}]
+op.DeleteFromTableByCondition("BasicTable", C.In("id", [1, 2, 3]) | C.IsNull("score"))
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 17
+
+try:
+  C.Eq("id = 1 OR 1", 2)
+  raise AssertionError("invalid field should raise")
+except ValueError:
+  pass
+try:
+  op.DeleteFromTableByCondition("BasicTable", SQLQuery(C.Eq("id", 5), limit=1))
+  raise AssertionError("limit on delete should raise")
+except ValueError:
+  pass
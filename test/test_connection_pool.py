@@ -0,0 +1,79 @@
+import os
+import tempfile
+import threading
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+temp_dir = tempfile.TemporaryDirectory()
+
+conn = SQLite3Connector(os.path.join(temp_dir.name, "pool.db"), db, verbose_level=0)
+pool = SQLite3ConnectionPool(conn, max_readers=2, timeout=10)
+pool.Open()
+conn.TableValidation()
+
+def Write(start):
+  for i in range(start, start + 50):
+    with pool.Writer() as op:
+      op.InsertDictToTable({"name": "n{}".format(i)}, "BasicTable")
+
+def Read(results):
+  for _ in range(50):
+    with pool.Reader() as op:
+      results.append(op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"])
+
+results = []
+threads = [threading.Thread(target=Write, args=(i * 50,)) for i in range(2)]
+threads += [threading.Thread(target=Read, args=(results,)) for i in range(4)]
+for t in threads:
+  t.start()
+for t in threads:
+  t.join()
+
+with pool.Reader() as op:
+  assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 100
+assert len(results) == 200 and all(0 <= c <= 100 for c in results)
+
+stats = pool.GetStats()
+print(stats)
+assert stats["reader_count"] <= 2 and stats["reader_in_use"] == 0
+assert stats["writer_acquire_count"] == 100
+pool.Close()
+conn.conn.close()
+conn.conn = None
+
+# a connector connected the usual way is bound to its thread, the pool reopens it
+conn = SQLite3Connector(os.path.join(temp_dir.name, "pool.db"), db, verbose_level=0)
+conn.Connect(do_check=False)
+conn.TableValidation()
+pool = SQLite3ConnectionPool(conn, max_readers=2, timeout=10)
+pool.Open()
+assert not conn.check_same_thread
+thread = threading.Thread(target=Write, args=(1000,))
+thread.start()
+thread.join()
+with pool.Reader() as op:
+  assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 150
+pool.Close()
+conn.conn.close()
+conn.conn = None
+
+# pending work on a thread bound writer is not dropped by the reopen
+conn = SQLite3Connector(os.path.join(temp_dir.name, "pool.db"), db, verbose_level=0)
+conn.Connect(do_check=False)
+SQLite3Operator(conn).InsertDictToTable({"name": "pending"}, "BasicTable")
+try:
+  SQLite3ConnectionPool(conn, max_readers=2, timeout=10).Open()
+  assert False
+except RuntimeError:
+  pass
+conn.Close(commit=False)
+temp_dir.cleanup()
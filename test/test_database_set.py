@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "DailyTable": {
+    "field_definition": {
+      "date": "TEXT NOT NULL",
+      "close": "REAL"
+    },
+    "primary_keys": ["date"]
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+codes = ["sh.{}".format(600000 + i) for i in range(25)]
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+  dbs = SQLiteDatabaseSet(tmp_dir, db, max_open=4, workers=4)
+  for i, code in enumerate(codes):
+    with dbs.Handle(code, create=True) as op:
+      op.InsertTuplesToTable([("d{}".format(d), float(i * 10 + d)) for d in range(5)], "DailyTable")
+  stats = dbs.GetStats()
+  print(stats)
+  assert stats["open"] == 4 and stats["max_open_seen"] == 4
+  assert stats["evictions"] == len(codes) - 4
+  assert dbs.ListNames() == sorted(codes)
+
+  # evicted handles are closed without holding the set wide lock
+  dbs.Close()
+  dbs = SQLiteDatabaseSet(tmp_dir, db, max_open=1)
+  lock_free = []
+  close_operator = dbs._CloseOperator
+  def CheckedClose(operator):
+    def TryLock():
+      if dbs._cond.acquire(timeout=1):
+        lock_free.append(True)
+        dbs._cond.release()
+      else:
+        lock_free.append(False)
+    thread = threading.Thread(target=TryLock)
+    thread.start()
+    thread.join()
+    close_operator(operator)
+  dbs._CloseOperator = CheckedClose
+  for code in codes[:3]:
+    with dbs.Handle(code) as op:
+      op.SelectFieldFromTable(["date"], "DailyTable")
+  assert lock_free == [True, True]
+
+  # evicted handles were committed, a structure-less set loads it from the first file
+  dbs.Close()
+  dbs = SQLiteDatabaseSet(tmp_dir, max_open=3, workers=4)
+  counts = dbs.Map(lambda name, op: len(op.SelectFieldFromTable(["date"], "DailyTable")))
+  assert list(counts) == sorted(codes)
+  assert all(count == 5 for count in counts.values())
+  assert dbs.GetStats()["max_open_seen"] <= 3
+  assert dbs.structure.table_name_dict["DailyTable"].primary_keys == ["date"]
+
+  rows = dbs.Select(["close"], "DailyTable", C.Eq("date", "d3"), names=codes[:3], source_field="code")
+  assert rows == [{"close": float(i * 10 + 3), "code": codes[i]} for i in range(3)]
+  assert len(dbs.Select(["date", "close"], "DailyTable")) == 5 * len(codes)
+
+  # cross file query through ATTACH, batches of 4 files per statement
+  attached = dbs.AttachedQuery("SELECT {source}, close FROM {schema}.DailyTable WHERE date = ?",
+                               params=("d1",), batch_size=4)
+  assert sorted(attached) == sorted((code, float(i * 10 + 1)) for i, code in enumerate(sorted(codes)))
+  try:
+    dbs.AttachedQuery("SELECT 1 FROM {schema}.DailyTable", names=["missing"])
+    assert False
+  except KeyError:
+    pass
+
+  # concurrent checkouts never exceed max_open
+  def Worker():
+    for code in codes:
+      with dbs.Handle(code) as op:
+        op.SelectFieldFromTable(["close"], "DailyTable")
+  threads = [threading.Thread(target=Worker) for _ in range(6)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert dbs.GetStats()["max_open_seen"] <= 3
+  dbs.Close()
+
+print("database set test passed")
@@ -0,0 +1,81 @@
+import io
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "DailyTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "date": "TEXT NOT NULL",
+      "volume": "INTEGER",
+      "close": "REAL",
+      "suspended": "BOOLEAN"
+    },
+    "primary_keys": ["code", "date"],
+    "indexes": {
+      "idx_daily_date": "date"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+
+csv_text = "date,code,close,volume,suspended\n"
+csv_text += "".join("2020-01-{:02d},sh.600004,{},{},{}\n".format(i, i + 0.5, "" if i == 3 else i * 10, i % 2)
+                    for i in range(1, 31))
+progress = []
+stats = op.ImportFromCSV(io.StringIO(csv_text), "DailyTable", chunk_size=7, drop_indexes=True,
+                         progress_callback=lambda n, t, r: progress.append(n), progress_interval=10)
+print(stats, progress)
+assert stats["rows"] == 30 and stats["inserted"] == 30
+assert progress == [14, 28]
+assert "idx_daily_date" in conn._GetExistIndexNameForTable("DailyTable")
+assert conn.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+rows = op.SelectFieldFromTable("*", "DailyTable", SQLCondition.In("date", ["2020-01-02", "2020-01-03"]))
+assert rows == [
+  {"code": "sh.600004", "date": "2020-01-02", "volume": 20, "close": 2.5, "suspended": 0},
+  {"code": "sh.600004", "date": "2020-01-03", "volume": None, "close": 3.5, "suspended": 1},
+]
+
+# conflict policy on an iterable of dicts
+stats = op.ImportFromIterable(({"code": "sh.600004", "date": "2020-01-{:02d}".format(i), "close": "1"}
+                               for i in range(25, 35)), "DailyTable", or_condition="OR IGNORE", bulk_load=False)
+assert stats["rows"] == 10 and stats["inserted"] == 4
+assert op.SelectFieldFromTable("count(*) AS c", "DailyTable")[0]["c"] == 34
+
+# dict rows have to carry the same keys, nothing is dropped or left NULL silently
+for rows in ([{"code": "sz.1", "date": "d1"}, {"code": "sz.1", "date": "d2", "close": 5.0}],
+             [{"code": "sz.1", "date": "d1", "close": 5.0}, {"code": "sz.1", "date": "d2"}]):
+  try:
+    op.ImportFromIterable(rows, "DailyTable", bulk_load=False)
+    assert False
+  except ValueError:
+    pass
+  op.Rollback()
+stats = op.ImportFromIterable([{"code": "sz.1", "date": "d1", "close": 5.0, "note": "extra"}], "DailyTable",
+                              fields=["code", "date", "close"], bulk_load=False)
+assert stats["inserted"] == 1
+assert op.SelectFieldFromTable("count(*) AS c", "DailyTable", "code = 'sz.1'")[0]["c"] == 1
+
+# inside a transaction or with pending work the import neither commits it
+# nor switches pragmas
+op.InsertDictToTable({"code": "sz.2", "date": "d0"}, "DailyTable")
+stats = op.ImportFromIterable([("sz.2", "d{}".format(i)) for i in range(1, 4)], "DailyTable", fields=["code", "date"])
+assert stats["inserted"] == 3 and conn.conn.in_transaction
+op.Rollback()
+assert op.SelectFieldFromTable("count(*) AS c", "DailyTable", "code = 'sz.2'")[0]["c"] == 0
+try:
+  with op.Transaction():
+    op.InsertDictToTable({"code": "sz.3", "date": "d0"}, "DailyTable")
+    op.ImportFromIterable([("sz.3", "d1")], "DailyTable", fields=["code", "date"], drop_indexes=True)
+    raise RuntimeError("abort")
+except RuntimeError:
+  pass
+assert op.SelectFieldFromTable("count(*) AS c", "DailyTable", "code = 'sz.3'")[0]["c"] == 0
+assert "idx_daily_date" in conn._GetExistIndexNameForTable("DailyTable")
@@ -0,0 +1,56 @@
+import logging
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT",
+      "time": "REAL",
+      "code": "TEXT"
+    },
+    "indexes": {
+      "idx_basic_name": "name",
+      "idx_basic_code": {"fields": "code", "unique": True, "where": "code IS NOT NULL"},
+      "idx_basic_name_time": ["name", "time"]
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+assert set(conn._GetExistIndexNameForTable("BasicTable")) == {"idx_basic_name", "idx_basic_code", "idx_basic_name_time"}
+
+# drop one index, validation puts it back
+conn.conn.execute("DROP INDEX idx_basic_name")
+conn.TableValidation()
+assert "idx_basic_name" in conn._GetExistIndexNameForTable("BasicTable")
+
+conn.LoadStructureFromDatabase()
+table = conn.structure.table_name_dict["BasicTable"]
+code_index = table.index_name_dict["idx_basic_code"]
+assert code_index.fields == ["code"] and code_index.unique and code_index.where == "code IS NOT NULL"
+assert table.index_name_dict["idx_basic_name_time"].fields == ["name", "time"]
+
+class WarningCollector(logging.Handler):
+  def __init__(self):
+    super().__init__(logging.WARNING)
+    self.messages = []
+
+  def emit(self, record):
+    self.messages.append(record.getMessage())
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable(((i, "n{}".format(i)) for i in range(100)), "BasicTable", fields=["time", "name"])
+collector = WarningCollector()
+op.logger.addHandler(collector)
+op.SetQueryPlanAudit(large_table_rows=50)
+op.SelectFieldFromTable("*", "BasicTable", "name == 'n3'")
+assert len(collector.messages) == 0
+op.SelectFieldFromTable("*", "BasicTable", "time > 3")
+op.SelectFieldFromTable("*", "BasicTable", "time > 3")
+print(collector.messages)
+assert len(collector.messages) == 1 and "full scan of BasicTable" in collector.messages[0]
@@ -0,0 +1,32 @@
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable((("n{}".format(i),) for i in range(1050)), "BasicTable", fields=["name"])
+
+it = op.IterSelectFieldFromTable(["id", "name"], "BasicTable", batch_size=100)
+first = next(it)
+print(first)
+assert first == {"id": 1, "name": "n0"}
+assert sum(1 for _ in it) == 1049
+
+batches = list(op.IterRawSelectFieldFromTable("id", "BasicTable", "id > 50", batch_size=100, yield_batches=True))
+assert [len(b) for b in batches] == [100] * 10
+assert batches[0][0] == (51,)
+
+rows = list(op.IterSelectFieldFromTableAdvanced("name", "BasicTable", " ORDER BY id DESC LIMIT 3"))
+assert rows == [{"name": "n1049"}, {"name": "n1048"}, {"name": "n1047"}]
@@ -0,0 +1,84 @@
+import dataclasses
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+@dataclasses.dataclass
+class Daily:
+  code: str = ""
+  date: str = ""
+  close: float = 0.0
+  volume: int = 0
+
+@dataclasses.dataclass(frozen=True)
+class DailyClose:
+  code: str
+  close: float
+  note: str = dataclasses.field(default="", compare=False)
+  derived: float = dataclasses.field(init=False, default=0.0)
+
+class DailySlots:
+  __slots__ = ("code", "date", "close")
+
+  def __init__(self, code, date, close):
+    raise AssertionError("hydration should not run __init__")
+
+class DailyPlain:
+  code: str
+  date: str
+  volume: int
+
+table_dict = ClassAndPrimaryKeyToTableInitiateDict(Daily, "DailyTable", ["code", "date"])
+assert table_dict["DailyTable"]["field_definition"]["close"] == "REAL DEFAULT 0.0"
+db = SQLDatabase.CreateFromDict(table_dict)
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+op = SQLite3Operator(conn)
+
+objs = [Daily("c{}".format(i % 3), "d{:03d}".format(i), float(i), i * 10) for i in range(300)]
+assert op.InsertObjects(objs, "DailyTable", chunk_size=64) == 300
+assert op.InsertObjects([], "DailyTable") == 0
+
+# dataclass with every field selected goes through its constructor
+selected = op.SelectObjects(Daily, "DailyTable", C.Eq("code", "c1"))
+assert selected == [o for o in objs if o.code == "c1"]
+
+# frozen dataclass, init=False field forces construction without __init__
+closes = op.SelectObjects(DailyClose, "DailyTable", C.Eq("date", "d004"))
+assert closes == [DailyClose("c1", 4.0)]
+assert closes[0].derived == 0.0
+try:
+  closes[0].close = 1.0
+  assert False
+except dataclasses.FrozenInstanceError:
+  pass
+
+slots = op.SelectObjects(DailySlots, "DailyTable", C.Lt("date", "d002"))
+assert [(o.code, o.date, o.close) for o in slots] == [("c0", "d000", 0.0), ("c1", "d001", 1.0)]
+assert not hasattr(slots[0], "__dict__")
+
+plain = op.SelectObjects(DailyPlain, "DailyTable", "date = 'd010'")
+assert (plain[0].code, plain[0].date, plain[0].volume) == ("c1", "d010", 100)
+
+# objects of a partial class insert only the fields they declare
+op.InsertObjects([DailyClose("z", 1.5)], "DailyTable", fields=["code", "close"])
+assert op.SelectFieldFromTable(["date", "close", "volume"], "DailyTable", C.Eq("code", "z")) == \
+  [{"date": None, "close": 1.5, "volume": 0}]
+
+# a class declaring nothing needs the fields spelled out
+class Undeclared:
+  def __init__(self, code):
+    self.code = code
+
+for call in (lambda: op.InsertObjects([Undeclared("u")], "DailyTable"),
+             lambda: op.SelectObjects(Undeclared, "DailyTable")):
+  try:
+    call()
+    assert False
+  except ValueError as e:
+    assert "Undeclared" in str(e) and "fields=" in str(e)
+op.InsertObjects([Undeclared("u")], "DailyTable", fields=["code"])
+assert len(op.SelectFieldFromTable("code", "DailyTable", C.Eq("code", "u"))) == 1
+
+print("object mapping test passed")
@@ -0,0 +1,106 @@
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "ItemTable": {
+    "field_definition": {
+      "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+      "name": "TEXT",
+      "value": "REAL"
+    }
+  },
+  "DailyTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "date": "TEXT NOT NULL",
+      "close": "REAL"
+    },
+    "primary_keys": ["code", "date"]
+  },
+  "LogTable": {
+    "field_definition": {
+      "message": "TEXT"
+    }
+  },
+  "TagTable": {
+    "field_definition": {
+      "tag": "TEXT",
+      "part": "TEXT",
+      "blob_key": "BLOB"
+    },
+    "primary_keys": ["tag", "part"]
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+op = SQLite3Operator(conn)
+
+op.InsertDictsToTable([{"name": "n{}".format(i), "value": float(i % 7)} for i in range(1000)], "ItemTable")
+op.InsertTuplesToTable([(c, "d{:02d}".format(d), float(d)) for c in "abc" for d in range(30)], "DailyTable")
+op.InsertTuplesToTable([("m{}".format(i),) for i in range(25)], "LogTable")
+
+# the key is selected even when not asked for, and cut off again
+pages = list(op.Paginate("ItemTable", ["name"], page_size=300))
+assert [len(rows) for rows, _ in pages] == [300, 300, 300, 100]
+assert [row["name"] for rows, _ in pages for row in rows] == ["n{}".format(i) for i in range(1000)]
+assert all(list(row) == ["name"] for rows, _ in pages for row in rows)
+
+# resume from the token of any page
+rows, token = pages[1]
+rest = [row["name"] for rows, _ in op.Paginate("ItemTable", ["name"], page_size=300, cursor=token) for row in rows]
+assert rest == ["n{}".format(i) for i in range(600, 1000)]
+
+# filter with descending order
+names = [row.name for rows, _ in op.Paginate("ItemTable", ["id", "name"], 64, C.Eq("value", 3.0),
+                                             descending=True, row_type="namedtuple") for row in rows]
+assert names == ["n{}".format(i) for i in range(999, -1, -1) if i % 7 == 3]
+
+# composite primary key
+keys = [(row[0], row[1]) for rows, _ in op.Paginate("DailyTable", ["code", "date"], 7, row_type="tuple") for row in rows]
+assert keys == [(c, "d{:02d}".format(d)) for c in "abc" for d in range(30)]
+rows, token = next(iter(op.Paginate("DailyTable", ["close"], 40, "close > 5")))
+assert len(rows) == 40
+rest = [row for rows, _ in op.Paginate("DailyTable", ["close"], 40, "close > 5", cursor=token) for row in rows]
+assert len(rest) == 3 * 24 - 40
+
+# rowid without a primary key, "*" keeps the rowid hidden
+pages = list(op.Paginate("LogTable", "*", 10))
+assert [row["message"] for rows, _ in pages for row in rows] == ["m{}".format(i) for i in range(25)]
+assert all(list(row) == ["message"] for rows, _ in pages for row in rows)
+
+# NULL is allowed in a non INTEGER primary key, pages may end on it
+op.InsertTuplesToTable([(None, "p0", b"\x00"), (None, "p1", b"\x01"), ("a", None, b"\xff\x00"), ("a", "p0", b"\xfe"),
+                        ("b", "p0", b"\x02")], "TagTable")
+expected = [(None, "p0"), (None, "p1"), ("a", None), ("a", "p0"), ("b", "p0")]
+for page_size in (1, 2, 3):
+  keys = [tuple(row) for rows, _ in op.Paginate("TagTable", ["tag", "part"], page_size, row_type="tuple") for row in rows]
+  assert keys == expected
+  keys = [tuple(row) for rows, _ in op.Paginate("TagTable", ["tag", "part"], page_size, row_type="tuple",
+                                                descending=True) for row in rows]
+  assert keys == expected[::-1]
+  tags = [row[0] for rows, _ in op.Paginate("TagTable", ["tag"], page_size, order_by="tag", row_type="tuple",
+                                            descending=True, condition="part = 'p0'") for row in rows]
+  assert tags == ["b", "a", None]
+
+# BLOB keys survive the cursor token
+blobs = []
+token = None
+while True:
+  blob_pages = list(op.Paginate("TagTable", ["blob_key"], 2, order_by="blob_key", cursor=token, row_type="tuple"))
+  if len(blob_pages) == 0:
+    break
+  rows, token = blob_pages[0]
+  blobs.extend(row[0] for row in rows)
+assert blobs == sorted([b"\x00", b"\x01", b"\xff\x00", b"\xfe", b"\x02"])
+
+try:
+  list(op.Paginate("DailyTable", ["close"], 10, cursor=pages[0][1]))
+  assert False
+except ValueError:
+  pass
+
+print("paginate test passed")
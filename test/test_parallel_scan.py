@@ -0,0 +1,116 @@
+import os
+import tempfile
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "TestTable": {
+    "field_definition": {
+      "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+      "name": "TEXT",
+      "value": "REAL"
+    }
+  },
+  "CodeTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "value": "INTEGER"
+    },
+    "primary_keys": ["code"]
+  },
+  "TagTable": {
+    "field_definition": {
+      "tag": "TEXT",
+      "value": "INTEGER"
+    },
+    "primary_keys": ["tag"]
+  }
+}
+
+# worker functions have to be importable by the pool processes
+def SumAndCount(rows):
+  total = 0.0
+  count = 0
+  for row in rows:
+    total += row["value"]
+    count += 1
+  return (total, count)
+
+def AddPairs(a, b):
+  return (a[0] + b[0], a[1] + b[1])
+
+def CollectNames(rows):
+  return [row["name"] for row in rows]
+
+def CountRows(rows):
+  return sum(1 for _ in rows)
+
+if __name__ == "__main__":
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    db = SQLDatabase.CreateFromDict(test_default_dict)
+    conn = SQLite3Connector(os.path.join(tmp_dir, "parallel.db"), db, verbose_level=0)
+    conn.Connect(do_check=False)
+    conn.TableValidation()
+
+    op = SQLite3Operator(conn)
+    op.InsertDictsToTable([{"name": "n{}".format(i), "value": float(i)} for i in range(1000)], "TestTable")
+    op.InsertTuplesToTable([("c{:04d}".format(i), i) for i in range(300)], "CodeTable")
+    # pending writes are invisible to the workers, they are committed on request only
+    try:
+      op.ParallelScan("TestTable", ["id"], CountRows, workers=2)
+      assert False
+    except RuntimeError:
+      pass
+    assert conn.conn.in_transaction
+
+    total, count = op.ParallelScan("TestTable", ["id", "value"], SumAndCount, AddPairs, workers=3, commit=True)
+    assert count == 1000
+    assert total == sum(float(i) for i in range(1000))
+
+    # without a reducer the partials come back in key order
+    names = op.ParallelScan("TestTable", ["name"], CollectNames, workers=2, partitions=5, row_type="dict")
+    assert len(names) == 5
+    assert [n for part in names for n in part] == ["n{}".format(i) for i in range(1000)]
+
+    # a text primary key is split at ORDER BY offsets
+    counts = op.ParallelScan("CodeTable", ["code"], CountRows, workers=2, partitions=4)
+    assert sum(counts) == 300 and len(counts) == 4
+    assert op.ParallelScan("CodeTable", ["code"], CountRows, lambda a, b: a + b, initial=0, workers=2) == 300
+
+    # NULL is allowed in a non INTEGER primary key, those rows get their own partition
+    op.InsertTuplesToTable([("t{:02d}".format(i), i) for i in range(50)] + [(None, 100), (None, 200)], "TagTable")
+    counts = op.ParallelScan("TagTable", ["tag"], CountRows, workers=2, partitions=4, commit=True)
+    assert sum(counts) == 52 and len(counts) == 5
+    assert op.ParallelScan("TagTable", ["tag"], CountRows, lambda a, b: a + b, workers=2, partitions=1) == 52
+
+    # an explicit transaction is never committed behind the caller's back
+    try:
+      with op.Transaction():
+        op.InsertDictToTable({"name": "x", "value": 0.0}, "TestTable")
+        op.ParallelScan("TestTable", ["id"], CountRows, workers=2, commit=True)
+    except RuntimeError:
+      pass
+    assert op.SelectFieldFromTable("count(*) AS c", "TestTable")[0]["c"] == 1000
+
+    op.DeleteFromTableByCondition("TestTable", "1")
+    assert op.ParallelScan("TestTable", ["id"], CountRows, workers=2, commit=True) == []
+
+    # an in memory working copy is flushed for the workers, even when it
+    # would only flush periodically
+    wc_conn = SQLite3Connector(os.path.join(tmp_dir, "working_copy.db"), SQLDatabase.CreateFromDict(test_default_dict),
+                               verbose_level=0, in_memory=True, flush_on_commit=False)
+    wc_conn.Connect(do_check=False)
+    wc_conn.TableValidation()
+    wc_op = SQLite3Operator(wc_conn)
+    wc_op.InsertTuplesToTable([("c{:04d}".format(i), i) for i in range(100)], "CodeTable")
+    wc_op.Commit()
+    assert wc_op.ParallelScan("CodeTable", ["code"], CountRows, lambda a, b: a + b, workers=2) == 100
+    wc_conn.Close()
+
+  try:
+    SQLite3Operator(SQLite3Connector(":memory:", SQLDatabase.CreateFromDict(test_default_dict))).ParallelScan(
+      "TestTable", ["id"], CountRows)
+    assert False
+  except ValueError:
+    pass
+
+  print("parallel scan test passed")
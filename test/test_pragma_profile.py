@@ -0,0 +1,79 @@
+import os
+import tempfile
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+temp_dir = tempfile.TemporaryDirectory()
+
+conn = SQLite3Connector(os.path.join(temp_dir.name, "pragma.db"), db, verbose_level=0, pragma_profile="balanced")
+conn.Connect(do_check=False)
+print(conn.applied_pragmas)
+assert conn.applied_pragmas["journal_mode"] == "wal"
+assert conn.applied_pragmas["synchronous"] == 1
+assert conn.applied_pragmas["cache_size"] == -64000
+
+conn.ApplyPragmaProfile({"base": "durable", "busy_timeout": 1234})
+assert conn.applied_pragmas["synchronous"] == 2 and conn.applied_pragmas["busy_timeout"] == 1234
+
+conn.TableValidation()
+op = SQLite3Operator(conn)
+with conn.BulkLoadMode():
+  assert conn.conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+  op.InsertTuplesToTable(((i, "n{}".format(i)) for i in range(1000)), "BasicTable")
+  op.Commit()
+assert conn.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+assert conn.conn.execute("PRAGMA cache_size").fetchone()[0] == -8000
+
+try:
+  SQLite3Connector(":memory:", db, pragma_profile="fastest")
+  raise AssertionError("unknown profile should raise")
+except ValueError:
+  pass
+
+memory_conn = SQLite3Connector(":memory:", db, pragma_profile="bulk-load")
+memory_conn.Connect()
+assert memory_conn.applied_pragmas["synchronous"] == 0
+# an error inside the block rolls the import back
+rollback_conn = SQLite3Connector(os.path.join(temp_dir.name, "rollback.db"), db, verbose_level=0)
+rollback_conn.Connect(do_check=False)
+rollback_conn.TableValidation()
+rollback_op = SQLite3Operator(rollback_conn)
+try:
+  with rollback_conn.BulkLoadMode():
+    assert rollback_conn.conn.execute("PRAGMA journal_mode").fetchone()[0] == "memory"
+    rollback_op.InsertDictToTable({"id": 1, "name": "partial"}, "BasicTable")
+    raise RuntimeError("import failed")
+except RuntimeError:
+  pass
+assert rollback_conn.conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+assert rollback_op.SelectFieldFromTable("id", "BasicTable") == []
+
+# pending writes keep their transaction, synchronous stays as it is
+rollback_op.InsertDictToTable({"id": 2, "name": "pending"}, "BasicTable")
+with rollback_conn.BulkLoadMode():
+  assert rollback_conn.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+  assert rollback_conn.conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+  rollback_op.InsertDictToTable({"id": 3, "name": "bulk"}, "BasicTable")
+assert rollback_conn.conn.in_transaction
+rollback_op.Rollback()
+assert rollback_op.SelectFieldFromTable("id", "BasicTable") == []
+
+# work left pending in a WAL database is committed before synchronous is restored
+with conn.BulkLoadMode():
+  op.InsertDictToTable({"id": 5000, "name": "wal"}, "BasicTable")
+assert not conn.conn.in_transaction
+assert conn.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+for c in (conn, rollback_conn):
+  c.conn.close()
+  c.conn = None
+temp_dir.cleanup()
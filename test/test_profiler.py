@@ -0,0 +1,64 @@
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "TestTable": {
+    "field_definition": {
+      "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+      "name": "TEXT",
+      "value": "REAL"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+profiler = op.EnableProfiling(slow_query_threshold=0.0)
+
+op.InsertDictsToTable([{"name": "n{}".format(i), "value": float(i)} for i in range(100)], "TestTable")
+for i in range(5):
+  op.SelectFieldFromTable(["name"], "TestTable", "id > {}".format(i * 10))
+list(op.IterSelectFieldFromTable(["id"], "TestTable", C.Lt("id", 50)))
+op.UpdateFieldFromTable({"value": 0.0}, "TestTable", C.Lt("id", 11))
+
+snapshot = op.GetProfileSnapshot()
+statements = snapshot["statements"]
+print(statements.keys())
+
+# raw conditions with different literals fold into one shape
+raw_shape = [shape for shape in statements if "id > ?" in shape]
+assert len(raw_shape) == 1
+assert statements[raw_shape[0]]["count"] == 5
+assert statements[raw_shape[0]]["rows_returned"] == sum(100 - i * 10 for i in range(5))
+assert statements[raw_shape[0]]["p99_time"] >= statements[raw_shape[0]]["p50_time"]
+
+iter_shape = [shape for shape in statements if "id < ?" in shape and shape.startswith("SELECT")]
+assert statements[iter_shape[0]]["rows_returned"] == 49
+
+insert_shape = [shape for shape in statements if shape.startswith("INSERT")]
+assert statements[insert_shape[0]]["rows_affected"] == 100
+update_shape = [shape for shape in statements if shape.startswith("UPDATE")]
+assert statements[update_shape[0]]["rows_affected"] == 10
+
+# threshold 0 marks everything slow, selects carry their query plan
+assert len(snapshot["slow_queries"]) > 0
+assert any(len(q["plan"]) > 0 for q in snapshot["slow_queries"])
+assert sum(snapshot["traced"].values()) > 0
+
+text = profiler.ToPrometheusText()
+assert "# TYPE sqlite_wrapper_statements_total counter" in text
+assert 'quantile="0.99"' in text
+print(text.splitlines()[:6])
+
+op.DisableProfiling()
+assert op.GetProfileSnapshot() is None
+op.SelectFieldFromTable(["name"], "TestTable")
+assert len(profiler.Snapshot()["statements"]) == len(statements)
+
+print("profiler test passed")
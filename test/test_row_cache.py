@@ -0,0 +1,64 @@
+import time
+from SQLiteWrapper import *
+
+C = SQLCondition
+
+test_default_dict = {
+  "DailyTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "date": "TEXT NOT NULL",
+      "close": "REAL"
+    },
+    "primary_keys": ["code", "date"]
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable([("a", "d{}".format(i), float(i)) for i in range(10)], "DailyTable")
+op.EnableRowCache("DailyTable", max_size=4)
+
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d1")) == {"code": "a", "date": "d1", "close": 1.0}
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d1"))["close"] == 1.0
+assert op.SelectByPrimaryKey("DailyTable", ("a", "missing")) is None
+stats = op.GetRowCacheStats()["DailyTable"]
+assert stats["hits"] == 1 and stats["misses"] == 2
+
+# key based update only drops that key
+op.SelectByPrimaryKey("DailyTable", ("a", "d2"))
+op.UpdateFieldFromTable({"close": 100.0}, "DailyTable", C.Eq("code", "a") & C.Eq("date", "d1"))
+assert len(op.row_caches["DailyTable"]) == 1
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d1"))["close"] == 100.0
+
+# In on the key drops the listed keys, a string condition flushes everything
+op.DeleteFromTableByCondition("DailyTable", C.Eq("code", "a") & C.In("date", ["d1", "d9"]))
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d1")) is None
+op.SelectByPrimaryKey("DailyTable", ("a", "d3"))
+op.UpdateFieldFromTable({"close": -1.0}, "DailyTable", "close > 2")
+assert len(op.row_caches["DailyTable"]) == 0
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d3"))["close"] == -1.0
+
+# OR REPLACE invalidates the replaced key, rollback flushes
+op.InsertDictToTable({"code": "a", "date": "d3", "close": 3.5}, "DailyTable", or_condition="OR REPLACE")
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d3"))["close"] == 3.5
+try:
+  with op.Transaction():
+    op.UpdateFieldFromTable({"close": 0.0}, "DailyTable", C.Eq("code", "a") & C.Eq("date", "d3"))
+    assert op.SelectByPrimaryKey("DailyTable", ("a", "d3"))["close"] == 0.0
+    raise KeyError("abort")
+except KeyError:
+  pass
+assert op.SelectByPrimaryKey("DailyTable", ("a", "d3"))["close"] == 3.5
+
+op.EnableRowCache("DailyTable", ttl=0.01)
+op.SelectByPrimaryKey("DailyTable", ("a", "d4"))
+time.sleep(0.02)
+op.SelectByPrimaryKey("DailyTable", ("a", "d4"))
+print(op.GetRowCacheStats())
+assert op.GetRowCacheStats()["DailyTable"]["expirations"] == 1
@@ -0,0 +1,42 @@
+import sqlite3
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable([(1, "a"), (2, "b")], "BasicTable")
+
+r = op.SelectFieldFromTable("*", "BasicTable", row_type="namedtuple")
+print(r)
+assert r[0].id == 1 and r[1].name == "b" and type(r[0]).__name__ == "BasicTableRow"
+
+r = op.SelectFieldFromTable(["max(name) AS name", "count(*)"], "BasicTable", row_type="slots")
+print(r)
+assert r[0].name == "b" and r[0]._1 == 2
+assert not hasattr(r[0], "__dict__")
+
+# names clashing with the generated class are renamed to their position
+for row_type in ("slots", "namedtuple"):
+  r = op.SelectFieldFromTable(["id AS self", "name AS _fields", "name AS _asdict"], "BasicTable", "id == 1", row_type=row_type)
+  assert r[0].self == 1 and r[0]._1 == "a" and r[0]._2 == "a"
+  assert r[0]._fields == ("self", "_1", "_2") and r[0]._asdict()["_1"] == "a"
+
+r = op.SelectFieldFromTable("*", "BasicTable", "id == 2", row_type="row")
+assert isinstance(r[0], sqlite3.Row) and r[0]["name"] == "b"
+
+op.SetRowType("tuple")
+assert op.SelectFieldFromTableAdvanced("id", "BasicTable", " ORDER BY id") == [(1,), (2,)]
+assert list(op.IterSelectFieldFromTable("id", "BasicTable", row_type="dict")) == [{"id": 1}, {"id": 2}]
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import sys
+import tempfile
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INTEGER AUTOINCREMENT",
+      "name": "TEXT"
+    },
+    "indexes": {"idx_basic_name": "name"}
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+temp_dir = tempfile.TemporaryDirectory()
+db_path = os.path.join(temp_dir.name, "schema.db")
+
+def Open(structure, **kwargs):
+  conn = SQLite3Connector(db_path, structure, verbose_level=0, **kwargs)
+  conn.Connect(do_check=False)
+  statements = []
+  conn.conn.set_trace_callback(statements.append)
+  return conn, statements
+
+conn, statements = Open(db, schema_sidecar=True)
+conn.TableValidation()
+assert any(s.startswith("CREATE TABLE") for s in statements)
+assert conn.structure is db
+
+# same structure and schema, nothing but the schema check runs
+SCHEMA_CHECK = ["PRAGMA schema_version", "SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name"]
+conn2, statements = Open(db, schema_sidecar=True)
+conn2.TableValidation()
+assert statements == SCHEMA_CHECK
+conn2.LoadStructureFromDatabase()
+assert any("table_info" in s for s in statements)
+del statements[:]
+conn2.LoadStructureFromDatabase()
+assert statements == SCHEMA_CHECK
+assert "idx_basic_name" in conn2.structure.table_name_dict["BasicTable"].index_name_dict
+
+# a fresh process only has the sidecar
+connector_module = sys.modules["sqlite_connector"]
+connector_module._loaded_structure_cache.clear()
+connector_module._validated_structure_cache.clear()
+conn3, statements = Open(SQLDatabase.CreateFromDict(test_default_dict), schema_sidecar=True)
+conn3.TableValidation()
+conn3.LoadStructureFromDatabase()
+assert statements == SCHEMA_CHECK * 2
+assert sorted(conn3.structure.table_name_dict) == ["BasicTable"]
+
+# copy-on-write, the shared structure is left untouched
+conn2.AddTable(SQLTable.CreateFromDict("OtherTable", {"key": "TEXT"}))
+assert "OtherTable" not in db.table_name_dict and "OtherTable" in conn2.structure.table_name_dict
+
+# the connector that loaded and published a structure copies it as well
+connector_module._loaded_structure_cache.clear()
+loader, _ = Open(None)
+loader.LoadStructureFromDatabase()
+reader, _ = Open(None)
+reader.LoadStructureFromDatabase()
+assert reader.structure is loader.structure
+loader.AddTable(SQLTable.CreateFromDict("LoaderTable", {"key": "TEXT"}))
+loader.AddIndex(SQLIndex("idx_basic_id", "BasicTable", ["id"]))
+assert "LoaderTable" not in reader.structure.table_name_dict
+assert "idx_basic_id" not in reader.structure.table_name_dict["BasicTable"].index_name_dict
+
+for c in (conn, conn2, conn3, loader, reader):
+  c.conn.close()
+  c.conn = None
+
+# a recreated file counts schema_version from 1 again, with another schema
+recreated_path = os.path.join(temp_dir.name, "recreated.db")
+for table_name in ("FirstTable", "SecondTable"):
+  if os.path.exists(recreated_path):
+    os.remove(recreated_path)
+  raw = sqlite3.connect(recreated_path)
+  raw.execute("CREATE TABLE {} (value TEXT)".format(table_name))
+  raw.close()
+  recreated = SQLite3Connector(recreated_path, None, verbose_level=0, schema_sidecar=True)
+  recreated.Connect(do_check=False)
+  assert recreated.GetSchemaVersion() == 1
+  recreated.LoadStructureFromDatabase()
+  assert list(recreated.structure.table_name_dict) == [table_name]
+  recreated.conn.close()
+  recreated.conn = None
+
+validated = SQLDatabase.CreateFromDict({"ValidatedTable": {"field_definition": {"value": "TEXT"}}})
+for table_name in ("ValidatedTable", "OtherTable"):
+  os.remove(recreated_path)
+  raw = sqlite3.connect(recreated_path)
+  raw.execute("CREATE TABLE {} (value TEXT)".format(table_name))
+  raw.close()
+  recreated = SQLite3Connector(recreated_path, validated, verbose_level=0, schema_sidecar=True)
+  recreated.Connect(do_check=False)
+  recreated.TableValidation()
+  SQLite3Operator(recreated).InsertDictToTable({"value": "v"}, "ValidatedTable")
+  recreated.conn.close()
+  recreated.conn = None
+temp_dir.cleanup()
@@ -0,0 +1,45 @@
+import array
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "DailyTable": {
+    "field_definition": {
+      "date": "TEXT",
+      "volume": "INTEGER",
+      "close": "REAL",
+      "suspended": "BOOLEAN"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.InsertTuplesToTable((("2020-01-{:02d}".format(i), None if i == 5 else i * 100, i + 0.5, i % 7 == 0)
+                        for i in range(1, 31)), "DailyTable")
+
+columns, masks = op.SelectColumns(["date", "volume", "close", "suspended", "close * 2 AS double_close"], "DailyTable",
+                                  SQLCondition.Le("date", "2020-01-10"), chunk_size=4,
+                                  use_numpy=False, return_masks=True)
+print(columns)
+assert isinstance(columns["volume"], array.array) and columns["volume"].typecode == "q"
+assert list(columns["volume"]) == [100, 200, 300, 400, 0, 600, 700, 800, 900, 1000]
+assert list(masks["volume"]) == [0, 0, 0, 0, 1, 0, 0, 0, 0, 0]
+assert list(columns["close"])[:2] == [1.5, 2.5]
+assert list(columns["suspended"]) == [0, 0, 0, 0, 0, 0, 1, 0, 0, 0]
+assert columns["date"][0] == "2020-01-01" and isinstance(columns["date"], list)
+assert list(masks) == ["volume"] and columns["double_close"][0] == 3.0
+
+columns = op.SelectColumns("*", "DailyTable", use_numpy=False)
+assert len(columns["date"]) == 30
+
+# a typed column degrading to objects keeps every value once, NULL as None
+op.InsertTuplesToTable([("2020-02-01", None, 1.0, False), ("2020-02-02", 40, 1.0, False),
+                        ("2020-02-03", "text", 1.0, False)], "DailyTable")
+columns = op.SelectColumns(["volume"], "DailyTable", SQLCondition.Ge("date", "2020-01-29"), chunk_size=2,
+                           use_numpy=False)
+assert columns["volume"] == [2900, 3000, None, 40, "text"]
@@ -0,0 +1,33 @@
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT",
+      "data": "BLOB"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect()
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+for i in range(10):
+  op.InsertDictToTable({"id": i, "name": "n{}".format(i), "data": b"x"}, "BasicTable")
+op.UpdateFieldFromTable({"name": "changed"}, "BasicTable", "id == 3")
+op.UpdateFieldFromTable({"name": "changed"}, "BasicTable", "id == 4")
+stats = op.GetStatementCacheStats()
+print(stats)
+assert stats["misses"] == 2 and stats["hits"] == 10
+
+conn.AddTable(SQLTable.CreateFromDict("OtherTable", {"key": "TEXT"}))
+op.InsertDictToTable({"key": "k"}, "OtherTable")
+assert len(op.statement_cache) == 1
+
+r = op.SelectFieldFromTable(["name", "data"], "BasicTable", "id == 3")
+assert r == [{"name": "changed", "data": b"x"}]
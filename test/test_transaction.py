@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+temp_dir = tempfile.TemporaryDirectory()
+db_path = os.path.join(temp_dir.name, "transaction.db")
+
+conn = SQLite3Connector(db_path, db, verbose_level=0)
+conn.Connect(do_check=False)
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.SetAutoSave(True)
+op.SetAutoSaveInterval(1)
+
+with op.Transaction("immediate"):
+  for i in range(10):
+    op.InsertDictToTable({"id": i, "name": "n{}".format(i)}, "BasicTable")
+  assert conn.conn.in_transaction
+  with op.Savepoint():
+    op.InsertDictToTable({"id": 100, "name": "kept"}, "BasicTable")
+  try:
+    with op.Transaction():
+      op.InsertDictToTable({"id": 200, "name": "dropped"}, "BasicTable")
+      raise KeyError("abort nested")
+  except KeyError:
+    pass
+assert not conn.conn.in_transaction
+assert [r["id"] for r in op.SelectFieldFromTable("id", "BasicTable", "id >= 100")] == [100]
+
+try:
+  with op.Transaction():
+    op.InsertDictToTable({"id": 300, "name": "rolled back"}, "BasicTable")
+    op.InsertDictToTable({"id": 1, "name": "duplicate"}, "BasicTable")
+except sqlite3.IntegrityError:
+  pass
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 11
+
+# a second writer holds the lock, the busy retry gives up after its attempts
+other = sqlite3.connect(db_path)
+other.execute("BEGIN IMMEDIATE")
+op.SetBusyTimeout(0)
+op.SetBusyRetry(2, delay=0.01)
+try:
+  with op.Transaction("immediate"):
+    pass
+  raise AssertionError("expected database is locked")
+except sqlite3.OperationalError:
+  pass
+other.rollback()
+other.close()
+with op.Transaction("immediate"):
+  op.InsertDictToTable({"id": 400, "name": "after lock"}, "BasicTable")
+conn.conn.close()
+conn.conn = None
+temp_dir.cleanup()
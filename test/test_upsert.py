@@ -0,0 +1,74 @@
+import sqlite3
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "DailyTable": {
+    "field_definition": {
+      "code": "TEXT NOT NULL",
+      "date": "TEXT NOT NULL",
+      "close": "REAL",
+      "volume": "INTEGER",
+      "note": "TEXT"
+    },
+    "primary_keys": ["code", "date"]
+  }
+}
+
+def Check(native_upsert):
+  db = SQLDatabase.CreateFromDict(test_default_dict)
+  conn = SQLite3Connector(":memory:", db)
+  conn.Connect()
+  conn.TableValidation()
+  op = SQLite3Operator(conn)
+  op.native_upsert = native_upsert
+
+  op.InsertDictsToTable([{"code": "a", "date": "d{}".format(i), "close": 1.0, "volume": 10, "note": "keep"}
+                         for i in range(5)], "DailyTable")
+  op.EnableRowCache("DailyTable")
+  assert op.SelectByPrimaryKey("DailyTable", ("a", "d1"))["close"] == 1.0
+
+  # columns missing from the rows keep their values, unlike OR REPLACE
+  written = op.UpsertDictsToTable([{"code": "a", "date": "d{}".format(i), "close": 2.0, "volume": 20}
+                                   for i in range(3, 8)], "DailyTable", chunk_size=2)
+  assert written == 5
+  rows = op.SelectFieldFromTable(["date", "close", "volume", "note"], "DailyTable", row_type="tuple")
+  assert sorted(rows) == sorted([("d{}".format(i), 1.0, 10, "keep") for i in range(3)] +
+                                [("d3", 2.0, 20, "keep"), ("d4", 2.0, 20, "keep"),
+                                 ("d5", 2.0, 20, None), ("d6", 2.0, 20, None), ("d7", 2.0, 20, None)])
+
+  # only update_fields change on conflict
+  op.UpsertDictsToTable([{"code": "a", "date": "d1", "close": 3.0, "volume": 30}], "DailyTable", update_fields=["close"])
+  assert op.SelectByPrimaryKey("DailyTable", ("a", "d1")) == {"code": "a", "date": "d1", "close": 3.0, "volume": 10, "note": "keep"}
+
+  # an empty update_fields only inserts new keys
+  assert op.UpsertDictsToTable([{"code": "a", "date": "d1", "close": 9.0}, {"code": "b", "date": "d1", "close": 9.0}],
+                               "DailyTable", update_fields=[]) == 1
+  assert op.SelectByPrimaryKey("DailyTable", ("a", "d1"))["close"] == 3.0
+  assert op.SelectByPrimaryKey("DailyTable", ("b", "d1"))["close"] == 9.0
+
+  # a key repeated in one chunk ends with its last row in both modes
+  assert op.UpsertDictsToTable([{"code": "c", "date": "d1", "note": "first"},
+                                {"code": "c", "date": "d1", "note": "second"}], "DailyTable") == 2
+  assert op.SelectByPrimaryKey("DailyTable", ("c", "d1"))["note"] == "second"
+
+  # constraint violations raise instead of being skipped
+  try:
+    op.UpsertDictsToTable([{"code": None, "date": "d1", "close": 1.0}], "DailyTable")
+    assert False
+  except sqlite3.IntegrityError:
+    pass
+
+  try:
+    op.UpsertDictsToTable([{"code": "a", "close": 1.0}], "DailyTable")
+    assert False
+  except ValueError:
+    pass
+  try:
+    op.UpsertDictsToTable([{"code": "a", "date": "d1"}], "DailyTable", update_fields=["close"])
+    assert False
+  except ValueError:
+    pass
+
+Check(True)
+Check(False)
+print("upsert test passed")
@@ -0,0 +1,125 @@
+from SQLiteWrapper import *
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+test_default_dict = {
+  "ItemTable": {
+    "field_definition": {
+      "id": "INTEGER",
+      "name": "TEXT NOT NULL",
+      "value": "REAL"
+    },
+    "primary_keys": ["id"]
+  }
+}
+
+def CountOnDisk(path):
+  conn = sqlite3.connect(path)
+  count = conn.execute("SELECT COUNT(*) FROM ItemTable").fetchone()[0]
+  conn.close()
+  return count
+
+tmp_dir = tempfile.TemporaryDirectory()
+path = os.path.join(tmp_dir.name, "work.db")
+
+# an existing file with some rows
+conn = SQLite3Connector(path, SQLDatabase.CreateFromDict(test_default_dict), verbose_level=0)
+conn.Connect(do_check=False)
+conn.TableValidation()
+op = SQLite3Operator(conn)
+op.InsertDictsToTable([{"id": i, "name": "n{}".format(i), "value": i * 1.5} for i in range(100)], "ItemTable")
+conn.Close()
+assert conn.conn is None
+
+# loaded into memory, the file only changes on flush
+conn = SQLite3Connector(path, SQLDatabase.CreateFromDict(test_default_dict), verbose_level=0, in_memory=True, flush_pages=4)
+conn.Connect(do_check=False)
+assert conn.IsWorkingCopy()
+assert conn.conn.execute("PRAGMA database_list").fetchone()[2] == ""
+conn.TableValidation()
+op = SQLite3Operator(conn)
+assert len(op.SelectFieldFromTable("id", "ItemTable")) == 100
+op.InsertDictsToTable([{"id": i, "name": "n{}".format(i), "value": 0.0} for i in range(100, 1100)], "ItemTable")
+assert CountOnDisk(path) == 100
+op.Commit()
+assert CountOnDisk(path) == 1100
+assert conn.flush_count == 1
+
+# a transaction writes through on commit as well
+with op.Transaction():
+  op.DeleteFromTableByCondition("ItemTable", "id >= 1000")
+assert CountOnDisk(path) == 1000
+assert conn.flush_count == 2
+
+# flushing needs the pending transaction committed
+op.InsertDictToTable({"id": 5000, "name": "pending", "value": 1.0}, "ItemTable")
+try:
+  conn.FlushToDisk()
+  assert False
+except RuntimeError:
+  pass
+conn.Close()
+assert CountOnDisk(path) == 1001
+
+# periodic flush from the background thread
+conn = SQLite3Connector(path, SQLDatabase.CreateFromDict(test_default_dict), verbose_level=0, in_memory=True,
+                        flush_interval=0.05, flush_on_commit=False)
+conn.Connect(do_check=False)
+op = SQLite3Operator(conn)
+op.InsertDictToTable({"id": 6000, "name": "periodic", "value": 2.0}, "ItemTable")
+op.Commit()
+deadline = time.time() + 5
+while CountOnDisk(path) != 1002 and time.time() < deadline:
+  time.sleep(0.02)
+assert CountOnDisk(path) == 1002
+assert conn.flush_count >= 1
+
+# uncommitted work is dropped on close without commit
+with conn:
+  op.InsertDictToTable({"id": 7000, "name": "dropped", "value": 3.0}, "ItemTable")
+  conn.commit_when_leave = False
+assert conn.conn is None and conn._flush_thread is None
+assert CountOnDisk(path) == 1002
+
+# a write landing while the background copy runs interrupts it instead of
+# stalling it, and Close does not wait on that copy
+conn = SQLite3Connector(path, SQLDatabase.CreateFromDict(test_default_dict), verbose_level=0, in_memory=True,
+                        flush_interval=0.01, flush_pages=1, flush_on_commit=False)
+conn.Connect(do_check=False)
+op = SQLite3Operator(conn)
+op.InsertDictsToTable([{"id": i, "name": "x" * 200, "value": 0.0} for i in range(10000, 12000)], "ItemTable")
+op.Commit()
+copying = threading.Event()
+written = threading.Event()
+check_periodic_flush = conn._CheckPeriodicFlush
+def PausingCheck(status, remaining, total):
+  # hold the first copy after one page until the write went in
+  if not written.is_set():
+    copying.set()
+    written.wait(5)
+  check_periodic_flush(status, remaining, total)
+conn._CheckPeriodicFlush = PausingCheck
+assert copying.wait(5)
+op.InsertDictToTable({"id": 8000, "name": "during flush", "value": 4.0}, "ItemTable")
+written.set()
+# the copy gives up while the transaction stays open
+assert conn._flush_lock.acquire(timeout=5)
+conn._flush_lock.release()
+assert conn.conn.in_transaction
+closer = threading.Thread(target=conn.Close)
+closer.start()
+closer.join(timeout=10)
+assert not closer.is_alive()
+assert CountOnDisk(path) == 1002 + 2000 + 1
+
+try:
+  SQLite3ConnectionPool(SQLite3Connector(path, None, in_memory=True))
+  assert False
+except ValueError:
+  pass
+
+tmp_dir.cleanup()
+print("working copy test passed")
@@ -0,0 +1,68 @@
+import sqlite3
+from SQLiteWrapper import *
+
+test_default_dict = {
+  "BasicTable": {
+    "field_definition": {
+      "id": "INT UNIQUE",
+      "name": "TEXT"
+    }
+  }
+}
+
+db = SQLDatabase.CreateFromDict(test_default_dict)
+
+conn = SQLite3Connector(":memory:", db)
+conn.Connect(check_same_thread=False)
+conn.TableValidation()
+
+op = SQLite3Operator(conn)
+op.SetAutoSave(True)
+op.SetAutoSaveInterval(1)
+op.EnableWriteBehind(max_queue_size=16, max_batch_size=50, max_delay=0.01)
+
+futures = [op.InsertDictToTable({"id": i, "name": "n{}".format(i)}, "BasicTable") for i in range(200)]
+duplicate = op.InsertDictToTable({"id": 3, "name": "dup"}, "BasicTable")
+bulk = op.InsertTuplesToTable([(1000, "a"), (1001, "b")], "BasicTable")
+update = op.UpdateFieldFromTable({"name": "changed"}, "BasicTable", "id == 5")
+op.Flush()
+
+assert all(f.done() and f.exception() is None for f in futures)
+assert isinstance(duplicate.exception(), sqlite3.IntegrityError)
+assert bulk.result() == 2
+update.result()
+assert not conn.conn.in_transaction
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 202
+assert op.SelectFieldFromTable("name", "BasicTable", "id == 5") == [{"name": "changed"}]
+print(op.write_behind.GetStats())
+
+# a write failing part way leaves none of its rows behind
+partial = op.InsertTuplesToTable([(2000, "a"), (2001, "b"), (1, "dup"), (2002, "c")], "BasicTable", chunk_size=1)
+after = op.InsertDictToTable({"id": 2003, "name": "after"}, "BasicTable")
+op.Flush()
+assert isinstance(partial.exception(), sqlite3.IntegrityError)
+after.result()
+assert op.SelectFieldFromTable("id", "BasicTable", "id >= 2000") == [{"id": 2003}]
+
+op.DeleteFromTableByCondition("BasicTable", "id >= 1000")
+op.DisableWriteBehind()
+assert op.SelectFieldFromTable("count(*) AS c", "BasicTable")[0]["c"] == 200
+
+# a failed group commit is rolled back instead of joining the next group
+op.SetBusyRetry(3, 0.2)
+op.EnableWriteBehind(max_delay=0.01)
+commit = op.Commit
+def FailingCommit():
+  op.Commit = commit
+  raise sqlite3.OperationalError("disk I/O error")
+op.Commit = FailingCommit
+failed = op.InsertDictToTable({"id": 3000, "name": "lost"}, "BasicTable")
+try:
+  op.Flush()
+except sqlite3.OperationalError:
+  pass
+assert isinstance(failed.exception(), sqlite3.OperationalError)
+assert not conn.conn.in_transaction
+assert op.SelectFieldFromTable("id", "BasicTable", "id == 3000") == []
+op.DisableWriteBehind()
+assert op.busy_retries == 3 and op.busy_retry_delay == 0.2